@@ -0,0 +1,181 @@
+"""
+Benchmark run list throughput under ASGI (async views) against WSGI (sync views).
+
+Starts gunicorn (sync workers, mrc_runs.wsgi) and uvicorn (mrc_runs.asgi,
+which routes to the async views) with the same number of worker processes,
+so both get the same memory budget, then drives each with concurrent
+keep-alive clients for a fixed time. Reports requests/second, latency and the
+resident memory of the worker processes.
+
+Requires gunicorn and uvicorn (pip install gunicorn uvicorn). The servers
+use a temporary copy of the database, never db.sqlite3.
+"""
+import http.client
+import os
+import shutil
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import textwrap
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WORKERS = 2
+CONCURRENCY = 16
+DURATION = 10
+RUNS = 200
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def write_settings(tmpdir):
+    """Settings module pointing the project at a temporary database."""
+    db_path = os.path.join(tmpdir, 'bench.sqlite3')
+    with open(os.path.join(tmpdir, 'bench_settings.py'), 'w') as f:
+        f.write(textwrap.dedent(f"""
+            from mrc_runs.settings import *  # noqa: F401,F403
+            DEBUG = False
+            ALLOWED_HOSTS = ['127.0.0.1', 'localhost']
+            DATABASES = {{'default': {{'ENGINE': 'django.db.backends.sqlite3', 'NAME': {db_path!r}}}}}
+        """))
+    return db_path
+
+
+def seed(env):
+    """Migrate the temporary database and create runs, members and sign-ups."""
+    script = textwrap.dedent(f"""
+        import django
+        django.setup()
+        from datetime import date, time, timedelta
+        from django.contrib.auth.models import User
+        from django.contrib.sessions.backends.db import SessionStore
+        from django.core.management import call_command
+        from runs.models import Run, SignUp
+        call_command('migrate', verbosity=0)
+        members = [User.objects.create_user(username=f'member{{i}}', password='x') for i in range(20)]
+        runs = Run.objects.bulk_create([
+            Run(date=date.today() + timedelta(days=i // 2), time=time(7, 30), meeting_place=f'Meeting point {{i}}',
+                venue=f'Venue {{i % 15}}', length_km=5 + i % 10, max_capacity=10 + i % 5)
+            for i in range({RUNS})
+        ])
+        SignUp.objects.bulk_create([SignUp(user=m, run=r) for n, r in enumerate(runs) for m in members[: n % 12]])
+        session = SessionStore()
+        session['_auth_user_id'] = str(members[0].pk)
+        session['_auth_user_backend'] = 'django.contrib.auth.backends.ModelBackend'
+        session['_auth_user_hash'] = members[0].get_session_auth_hash()
+        session.create()
+        print(session.session_key)
+    """)
+    out = subprocess.run([sys.executable, '-c', script], env=env, cwd=ROOT, check=True,
+                         capture_output=True, text=True)
+    return out.stdout.strip().splitlines()[-1]
+
+
+def worker_rss_mb(master_pid):
+    """Total resident memory of a server's worker processes in MB."""
+    children = subprocess.run(['pgrep', '-P', str(master_pid)], capture_output=True, text=True).stdout.split()
+    total_kb = 0
+    for pid in children:
+        try:
+            with open(f'/proc/{pid}/status') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        total_kb += int(line.split()[1])
+        except FileNotFoundError:
+            pass
+    return total_kb / 1024
+
+
+def wait_for(port, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+            conn.request('GET', '/')
+            conn.getresponse().read()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError('server did not start')
+
+
+def load(port, cookie):
+    """Drive the server with CONCURRENCY clients for DURATION seconds."""
+    latencies = []
+    errors = []
+    stop = time.time() + DURATION
+    headers = {'Cookie': f'sessionid={cookie}'} if cookie else {}
+
+    def client():
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        while time.time() < stop:
+            start = time.perf_counter()
+            try:
+                conn.request('GET', '/', headers=headers)
+                response = conn.getresponse()
+                response.read()
+                if response.status != 200:
+                    errors.append(response.status)
+            except (OSError, http.client.HTTPException) as exc:
+                errors.append(exc)
+                conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+                continue
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    threads = [threading.Thread(target=client) for _ in range(CONCURRENCY)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return latencies, errors
+
+
+def bench(label, command, env, session_key):
+    port = free_port()
+    server = subprocess.Popen(
+        [part.format(port=port) for part in command], env=env, cwd=ROOT,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True,
+    )
+    try:
+        wait_for(port)
+        for who, cookie in (('anonymous', None), ('member', session_key)):
+            latencies, errors = load(port, cookie)
+            latencies.sort()
+            print(
+                f'{label:<6} {who:<9} {len(latencies) / DURATION:7.1f} req/s   '
+                f'median {statistics.median(latencies):7.1f} ms   '
+                f'p95 {latencies[int(len(latencies) * 0.95)]:7.1f} ms   '
+                f'errors {len(errors)}   workers RSS {worker_rss_mb(server.pid):6.1f} MB'
+            )
+    finally:
+        os.killpg(server.pid, signal.SIGTERM)
+        server.wait()
+
+
+def main():
+    for tool in ('gunicorn', 'uvicorn'):
+        if shutil.which(tool) is None:
+            sys.exit(f'{tool} is not installed; pip install gunicorn uvicorn')
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        write_settings(tmpdir)
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE='bench_settings',
+                   PYTHONPATH=os.pathsep.join([tmpdir, ROOT]))
+        session_key = seed(env)
+        print(f'{RUNS} runs, {WORKERS} workers each, {CONCURRENCY} concurrent clients, {DURATION}s per case')
+        bench('WSGI', ['gunicorn', '-w', str(WORKERS), '-b', '127.0.0.1:{port}', 'mrc_runs.wsgi'],
+              env, session_key)
+        bench('ASGI', ['uvicorn', '--workers', str(WORKERS), '--port', '{port}', '--no-access-log',
+                       'mrc_runs.asgi:application'], env, session_key)
+
+
+if __name__ == '__main__':
+    main()
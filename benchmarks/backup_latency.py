@@ -0,0 +1,173 @@
+"""
+Benchmark sign-up latency while the database is being backed up.
+
+A writer process signs members up at a steady rate (a busy opening time)
+while ``manage.py backup_db`` copies the database. This is done with no
+backup, with a one-step copy (holding the database for the whole copy, as a
+locked file copy would), with the default stepped backup, and with the
+database in WAL mode. Reports sign-up latency (median, p99, max), sign-ups
+that failed with "database is locked", how long each backup took, and how
+long ``restore_db`` takes to put the compressed backup back. Backup times
+include starting the command, the integrity check and compression.
+
+The processes use a temporary database, never db.sqlite3.
+"""
+import json
+import os
+import re
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import textwrap
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MEMBERS = 20000
+# Padding rows in the sign-up event log, to give the database a realistic size.
+EVENTS = 400000
+WRITE_INTERVAL = 0.02
+DURATION = 6
+BACKUP_AFTER = 1
+
+MODES = [
+    # (label, journal mode, extra backup_db arguments or None for no backup)
+    ('no backup', 'delete', None),
+    ('one-step copy', 'delete', ['--pages', '-1']),
+    ('stepped backup', 'delete', []),
+    ('WAL, backup', 'wal', []),
+]
+
+# Signs members up until told to stop; prints latencies (ms) and lock errors as JSON.
+WRITER = textwrap.dedent("""
+    import json, sys, time
+    import django
+    django.setup()
+    from django.contrib.auth.models import User
+    from django.db import OperationalError
+    from runs import services
+    from runs.models import Run
+
+    first, duration, interval = int(sys.argv[1]), float(sys.argv[2]), float(sys.argv[3])
+    run = Run.objects.get()
+    users = list(User.objects.filter(pk__gte=first).order_by('pk')[:int(duration / interval) + 10])
+    latencies, errors = [], 0
+    end = time.perf_counter() + duration
+    for user in users:
+        if time.perf_counter() >= end:
+            break
+        began = time.perf_counter()
+        try:
+            services.sign_up(user, run)
+            latencies.append((time.perf_counter() - began) * 1000)
+        except OperationalError:
+            errors += 1
+        time.sleep(max(0, interval - (time.perf_counter() - began)))
+    print(json.dumps({'latencies': latencies, 'errors': errors}))
+""")
+
+
+def write_settings(tmpdir):
+    """Settings module pointing the project at a temporary database."""
+    db_path = os.path.join(tmpdir, 'bench.sqlite3')
+    with open(os.path.join(tmpdir, 'bench_settings.py'), 'w') as f:
+        f.write(textwrap.dedent(f"""
+            from mrc_runs.settings import *  # noqa: F401,F403
+            DEBUG = False
+            DATABASES = {{'default': {{'ENGINE': 'django.db.backends.sqlite3', 'NAME': {db_path!r}}}}}
+        """))
+    return db_path
+
+
+def seed(env):
+    """Migrate the temporary database and create members, one big run and a long event log."""
+    script = textwrap.dedent(f"""
+        import django
+        django.setup()
+        from datetime import date, time, timedelta
+        from django.contrib.auth.models import User
+        from django.core.management import call_command
+        from runs.models import Run, SignUpEvent
+        call_command('migrate', verbosity=0)
+        User.objects.bulk_create(
+            [User(username=f'member{{i}}', email=f'member{{i}}@example.com') for i in range({MEMBERS})],
+            batch_size=2000,
+        )
+        Run.objects.create(date=date.today() + timedelta(days=7), time=time(9, 0), meeting_place='Gate',
+                           venue='Park', length_km=5, max_capacity={MEMBERS})
+        SignUpEvent.objects.bulk_create(
+            [SignUpEvent(run_id=i % 500, user_id=i % {MEMBERS}, change=1) for i in range({EVENTS})],
+            batch_size=5000,
+        )
+    """)
+    subprocess.run([sys.executable, '-c', script], env=env, cwd=ROOT, check=True)
+
+
+def manage(env, *args):
+    """Run a management command; return (seconds taken, output)."""
+    start = time.perf_counter()
+    out = subprocess.run([sys.executable, 'manage.py', *args], env=env, cwd=ROOT,
+                         check=True, capture_output=True, text=True)
+    return time.perf_counter() - start, out.stdout.strip()
+
+
+def set_journal_mode(db_path, mode):
+    db = sqlite3.connect(db_path)
+    db.execute(f'PRAGMA journal_mode={mode}')
+    db.close()
+
+
+def measure(env, first_member, backup_args, backup_path):
+    """Sign members up for DURATION seconds, starting a backup after BACKUP_AFTER; return the results."""
+    writer = subprocess.Popen(
+        [sys.executable, '-c', WRITER, str(first_member), str(DURATION), str(WRITE_INTERVAL)],
+        env=env, cwd=ROOT, stdout=subprocess.PIPE, text=True,
+    )
+    backup_time = restarts = None
+    if backup_args is not None:
+        time.sleep(BACKUP_AFTER)
+        backup_time, output = manage(env, 'backup_db', backup_path, *backup_args)
+        restarts = int(re.search(r'\((\d+) restarts', output).group(1))
+    out, _ = writer.communicate()
+    return json.loads(out.strip().splitlines()[-1]), backup_time, restarts
+
+
+def report(label, result, backup_time, restarts):
+    timings = sorted(result['latencies'])
+    p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+    backup = f'{backup_time:5.2f} s, {restarts:2d} restarts' if backup_time is not None else '-'
+    print(
+        f'{label:<16} sign-ups {len(timings):4d}  median {statistics.median(timings):6.1f} ms  '
+        f'p99 {p99:7.1f} ms  max {timings[-1]:7.1f} ms  locked {result["errors"]:3d}  backup {backup}'
+    )
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        db_path = write_settings(tmpdir)
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE='bench_settings',
+                   PYTHONPATH=os.pathsep.join([tmpdir, ROOT]))
+        seed(env)
+        pristine = os.path.join(tmpdir, 'pristine.sqlite3')
+        shutil.copy(db_path, pristine)
+        print(f'Database {os.path.getsize(db_path) / 1024 / 1024:.0f} MiB; '
+              f'one sign-up every {WRITE_INTERVAL * 1000:.0f} ms for {DURATION} s, backup starting after {BACKUP_AFTER} s')
+
+        backup_path = os.path.join(tmpdir, 'backup.sqlite3.gz')
+        first_member = 1
+        for label, journal_mode, backup_args in MODES:
+            shutil.copy(pristine, db_path)
+            set_journal_mode(db_path, journal_mode)
+            result, backup_time, restarts = measure(env, first_member, backup_args, backup_path)
+            first_member += len(result['latencies']) + result['errors']
+            report(label, result, backup_time, restarts)
+
+        restore_time, _ = manage(env, 'restore_db', backup_path, '--no-input')
+        print(f'\nrestore_db of the compressed backup: {restore_time:.2f} s '
+              f'({os.path.getsize(backup_path) / 1024 / 1024:.1f} MiB compressed)')
+
+
+if __name__ == '__main__':
+    main()
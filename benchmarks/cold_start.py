@@ -0,0 +1,134 @@
+"""
+Profile cold start: process boot, first request and the imports behind them.
+
+Each sample is a fresh Python process, as after a scale-to-zero deployment
+wakes up, that imports ``mrc_runs.wsgi`` and then serves the run list twice
+through the WSGI application. It is run once as configured and once with
+``MRC_FAST_START=1``. Reports boot time, first and second request latency,
+and (from ``python -X importtime``) where the import time went, grouped by
+package.
+
+The processes use a temporary database, never db.sqlite3.
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import textwrap
+from collections import Counter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SAMPLES = 5
+TOP_PACKAGES = 15
+RUNS = 50
+
+# Runs in each sample process; prints its timings as JSON.
+CHILD = textwrap.dedent("""
+    import json, time
+    start = time.perf_counter()
+    from mrc_runs.wsgi import application
+    booted = time.perf_counter()
+
+    from wsgiref.util import setup_testing_defaults
+
+    def request():
+        environ = {'PATH_INFO': '/', 'HTTP_HOST': 'localhost'}
+        setup_testing_defaults(environ)
+        began = time.perf_counter()
+        statuses = []
+        body = b''.join(application(environ, lambda status, headers: statuses.append(status)))
+        assert statuses[0].startswith('200'), statuses[0]
+        return (time.perf_counter() - began) * 1000
+
+    first = request()
+    second = request()
+    print(json.dumps({'boot': (booted - start) * 1000, 'first': first, 'second': second}))
+""")
+
+
+def write_settings(tmpdir):
+    """Settings module pointing the project at a temporary database."""
+    db_path = os.path.join(tmpdir, 'bench.sqlite3')
+    with open(os.path.join(tmpdir, 'bench_settings.py'), 'w') as f:
+        f.write(textwrap.dedent(f"""
+            from mrc_runs.settings import *  # noqa: F401,F403
+            DEBUG = False
+            ALLOWED_HOSTS = ['localhost']
+            DATABASES['default']['NAME'] = {db_path!r}
+            DATABASES.pop('replica', None)
+        """))
+
+
+def seed(env):
+    """Migrate the temporary database and create some upcoming runs."""
+    script = textwrap.dedent(f"""
+        import django
+        django.setup()
+        from datetime import date, time, timedelta
+        from django.core.management import call_command
+        from runs.models import Run
+        call_command('migrate', verbosity=0)
+        Run.objects.bulk_create([
+            Run(date=date.today() + timedelta(days=i // 2), time=time(7, 30), meeting_place=f'Meeting point {{i}}',
+                venue=f'Venue {{i % 15}}', length_km=5 + i % 10, max_capacity=10 + i % 5)
+            for i in range({RUNS})
+        ])
+    """)
+    subprocess.run([sys.executable, '-c', script], env=env, cwd=ROOT, check=True)
+
+
+def package(module):
+    """Group a module under its top-level package, or its app for django.contrib and runs."""
+    parts = module.split('.')
+    if parts[:2] == ['django', 'contrib']:
+        return '.'.join(parts[:3])
+    if parts[0] in ('django', 'runs'):
+        return '.'.join(parts[:2])
+    return parts[0]
+
+
+def sample(env):
+    """Start one fresh process; return its timings and self import time per package (ms)."""
+    out = subprocess.run([sys.executable, '-X', 'importtime', '-c', CHILD], env=env, cwd=ROOT,
+                         check=True, capture_output=True, text=True)
+    imports = Counter()
+    for line in out.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, _, module = line[len('import time:'):].split('|')
+        imports[package(module.strip())] += int(self_us) / 1000
+    return json.loads(out.stdout.strip().splitlines()[-1]), imports
+
+
+def profile(label, env):
+    samples = [sample(env) for _ in range(SAMPLES)]
+    timings = {key: statistics.median(s[0][key] for s in samples) for key in ('boot', 'first', 'second')}
+    imports = samples[-1][1]
+    print(
+        f'{label:<10} boot {timings["boot"]:7.1f} ms   first request {timings["first"]:7.1f} ms   '
+        f'second request {timings["second"]:6.1f} ms   imports {sum(imports.values()):6.1f} ms'
+    )
+    return imports
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        write_settings(tmpdir)
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE='bench_settings',
+                   PYTHONPATH=os.pathsep.join([tmpdir, ROOT]))
+        env.pop('MRC_FAST_START', None)
+        seed(env)
+        print(f'Median of {SAMPLES} fresh processes each')
+        default = profile('default', env)
+        fast = profile('fast start', dict(env, MRC_FAST_START='1'))
+
+        print(f'\nImport time by package (ms), top {TOP_PACKAGES}:')
+        print(f'{"package":<32} {"default":>8} {"fast":>8}')
+        for name, ms in default.most_common(TOP_PACKAGES):
+            print(f'{name:<32} {ms:8.1f} {fast.get(name, 0):8.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+"""
+Shared setup for the benchmark scripts in this directory.
+
+Each script is run from the project root, e.g.::
+
+    python benchmarks/run_list.py
+
+and works against a throwaway test database, never db.sqlite3.
+"""
+import os
+import statistics
+import sys
+import time
+from contextlib import contextmanager
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mrc_runs.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.test.utils import (  # noqa: E402
+    setup_databases, setup_test_environment, teardown_databases, teardown_test_environment,
+)
+
+
+@contextmanager
+def test_database():
+    """Create (and afterwards destroy) a migrated test database."""
+    setup_test_environment(debug=False)
+    old_config = setup_databases(verbosity=0, interactive=False)
+    try:
+        yield
+    finally:
+        teardown_databases(old_config, verbosity=0)
+        teardown_test_environment()
+
+
+def timed(func, repeat):
+    """Call ``func`` ``repeat`` times and return the per-call timings in ms."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def report(label, timings):
+    """Print median and p95 of a list of timings in ms."""
+    timings = sorted(timings)
+    p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+    print(f'{label:<40} median {statistics.median(timings):8.2f} ms   p95 {p95:8.2f} ms')
@@ -0,0 +1,70 @@
+"""
+Benchmark run list payload size and render time.
+
+Renders the run list for an anonymous visitor and for a signed-in member with
+200 upcoming runs and reports the response size, query count and render time.
+"""
+import gzip
+from datetime import date, time, timedelta
+
+from common import report, test_database, timed
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from runs.models import Run, SignUp
+
+RUNS = 200
+REPEAT = 30
+
+
+def create_runs():
+    members = [
+        User.objects.create_user(username=f'member{i}', password='x') for i in range(20)
+    ]
+    start = date.today()
+    runs = Run.objects.bulk_create([
+        Run(
+            date=start + timedelta(days=i // 2),
+            time=time(7 if i % 2 else 18, 30),
+            meeting_place=f'Meeting point {i}',
+            venue=f'Venue {i % 15}',
+            length_km=5 + i % 10,
+            max_capacity=10 + i % 5,
+        )
+        for i in range(RUNS)
+    ])
+    SignUp.objects.bulk_create([
+        SignUp(user=member, run=run)
+        for n, run in enumerate(runs)
+        for member in members[: n % 12]
+    ])
+    return members[0]
+
+
+def measure(label, client):
+    url = reverse('run_list')
+    response = client.get(url)
+    with CaptureQueriesContext(connection) as queries:
+        client.get(url)
+    print(
+        f'{label}: {len(response.content):,} bytes '
+        f'({len(gzip.compress(response.content)):,} gzipped), {len(queries)} queries'
+    )
+    report(f'  render {label}', timed(lambda: client.get(url), REPEAT))
+
+
+def main():
+    with test_database():
+        member = create_runs()
+        measure('anonymous', Client())
+        client = Client()
+        client.force_login(member)
+        measure('member', client)
+
+
+if __name__ == '__main__':
+    main()
@@ -9,8 +9,17 @@ https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
 
 import os
 
+from django.conf import settings
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mrc_runs.settings')
+# Serve the run views with their async ORM implementations under ASGI.
+os.environ.setdefault('MRC_ASYNC_VIEWS', '1')
 
 application = get_asgi_application()
+
+if settings.FAST_START:
+    from runs.warmup import warm_up
+
+    # Async views reach the database from a worker thread, so a connection opened here wouldn't be used.
+    warm_up(database=False)
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -28,10 +29,16 @@ DEBUG = True
 ALLOWED_HOSTS = []
 
 
+# Scale-to-zero deployments set MRC_FAST_START=1: the admin's ModelAdmins are
+# only loaded when /admin/ is first visited, and each worker warms its URL,
+# template and database caches at boot (see runs/warmup.py).
+FAST_START = os.environ.get('MRC_FAST_START') == '1'
+
 # Application definition
 
 INSTALLED_APPS = [
-    'django.contrib.admin',
+    # SimpleAdminConfig skips autodiscovery at startup; mrc_runs/urls.py runs it lazily.
+    'django.contrib.admin.apps.SimpleAdminConfig' if FAST_START else 'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
     'django.contrib.sessions',
@@ -42,6 +49,9 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    # Compresses what the middleware below it returns; precompressed static files pass through.
+    'runs.middleware.CompressionMiddleware',
+    'runs.middleware.PrecompressedStaticMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -70,17 +80,64 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'mrc_runs.wsgi.application'
 
+# Route the run list, sign-up and cancel URLs to their async ORM views.
+# mrc_runs/asgi.py switches this on; WSGI deployments keep the sync views.
+ASYNC_VIEWS = os.environ.get('MRC_ASYNC_VIEWS') == '1'
+
 
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
+# Keep connections open between requests (seconds; 0 closes them after each
+# request). Health checks replace a connection that died while idle.
+CONN_MAX_AGE = int(os.environ.get('DB_CONN_MAX_AGE', 600 if FAST_START else 0))
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'CONN_MAX_AGE': CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# Optional read replica for run browsing traffic. Point DATABASE_REPLICA_NAME
+# at a copy of the primary database file to split reads across two files.
+if os.environ.get('DATABASE_REPLICA_NAME'):
+    DATABASES['replica'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ['DATABASE_REPLICA_NAME'],
+        'CONN_MAX_AGE': CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': True,
+    }
+
+DATABASE_ROUTERS = ['runs.routers.PrimaryReplicaRouter']
+
+# Seconds a member keeps reading from the primary after their own sign-up or
+# cancellation, so they never see a stale run list from a lagging replica.
+REPLICA_PIN_SECONDS = 10
+
+# Cache
+# Holds sessions (cached_db engine) and each logged-in member's user, profile
+# and sign-up IDs, so authenticated page views make no auth queries. Set
+# REDIS_URL whenever more than one server process runs: local-memory caches
+# are per process, so a logout or profile change would not reach the others.
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -130,7 +187,54 @@ STATICFILES_DIRS = [
 ]
 STATIC_ROOT = BASE_DIR / "staticfiles"
 
+# In production collectstatic writes content-hashed file names plus gzip/brotli
+# variants, which PrecompressedStaticMiddleware (or nginx) serves with
+# far-future cache headers.
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': (
+            'django.contrib.staticfiles.storage.StaticFilesStorage' if DEBUG
+            else 'runs.storage.CompressedManifestStaticFilesStorage'
+        ),
+    },
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# Email
+# Notifications are queued in the database and sent by
+# `python manage.py send_notifications`. Without SMTP settings the console
+# backend just prints them.
+
+EMAIL_BACKEND = os.environ.get('EMAIL_BACKEND', 'django.core.mail.backends.console.EmailBackend')
+EMAIL_HOST = os.environ.get('EMAIL_HOST', 'localhost')
+EMAIL_PORT = int(os.environ.get('EMAIL_PORT', 25))
+EMAIL_HOST_USER = os.environ.get('EMAIL_HOST_USER', '')
+EMAIL_HOST_PASSWORD = os.environ.get('EMAIL_HOST_PASSWORD', '')
+EMAIL_USE_TLS = os.environ.get('EMAIL_USE_TLS') == '1'
+DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL', 'MRC Runs <runs@localhost>')
+
+# Absolute base URL used for links in emails.
+SITE_URL = os.environ.get('SITE_URL', 'http://localhost:8000')
+
+# Runs older than this many days are moved to the archive tables by
+# `python manage.py archive_runs`.
+ARCHIVE_AFTER_DAYS = 365
+
+# Retention periods applied by `python manage.py purge_old_data`: members with
+# no login or run for this long are deleted (or anonymised), and archived
+# sign-ups older than this are deleted.
+RETAIN_INACTIVE_MEMBERS_DAYS = 730
+RETAIN_SIGNUPS_DAYS = 365 * 5
+
+# How long a place tapped on stays held for the member while they confirm.
+# Run `python manage.py release_expired_holds` every minute or so to tell
+# watching members about places whose holds lapsed.
+SPOT_HOLD_SECONDS = 120
@@ -16,9 +16,26 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
+from django.utils.functional import cached_property
+
+
+class LazyAdminURLConf:
+    """
+    The admin site's URLconf, registering the ModelAdmins on first use.
+
+    Under MRC_FAST_START the admin app doesn't autodiscover at startup, so
+    member requests never import the admin modules; resolving or reversing
+    an admin URL loads them.
+    """
+
+    @cached_property
+    def urlpatterns(self):
+        admin.autodiscover()
+        return admin.site.get_urls()
+
 
 urlpatterns = [
-    path('admin/', admin.site.urls),
+    path('admin/', (LazyAdminURLConf(), 'admin', admin.site.name)),
     path('', include('runs.urls')),
     path('accounts/', include('django.contrib.auth.urls')),
 ]
@@ -1,7 +1,46 @@
-from django.contrib import admin
+from collections import Counter
+
+from django.contrib import admin, messages
+from django.contrib.admin import helpers
 from django.contrib.auth.admin import UserAdmin
 from django.contrib.auth.models import User
-from .models import Run, SignUp, UserProfile
+from django.core.exceptions import ValidationError
+from django.db.models import Count
+from django.template.response import TemplateResponse
+from django.urls import reverse
+from django.utils.html import format_html
+from . import analytics, bulk_edit, services
+from .forms import RunCapacityForm, RunChoiceForm, RunCloneForm, RunVenueForm
+from .models import (
+    ArchivedRun, ArchivedSignUp, BallotEntry, MemberStats, Notification, Run, RunRollup, SignUp, SignUpEvent,
+    SpotAlert, SpotHold, UserProfile, Venue, VenueMonthRollup,
+)
+from .search import IndexedSearchMixin
+
+
+class BulkActionMixin:
+    """Admin actions that ask for a value on an intermediate page, then apply it to the whole selection."""
+
+    def bulk_action(self, request, queryset, form_class, title, apply):
+        """Show ``form_class`` for the selection; once valid, ``apply(cleaned_data)`` returns a message."""
+        form = form_class(request.POST if 'apply' in request.POST else None)
+        if form.is_bound and form.is_valid():
+            try:
+                message = apply(form.cleaned_data)
+            except ValidationError as e:
+                form.add_error(None, e)
+            else:
+                self.message_user(request, message, messages.SUCCESS)
+                return None
+        return TemplateResponse(request, 'admin/runs/bulk_action.html', {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': title,
+            'form': form,
+            'objects': queryset,
+            'action': request.POST['action'],
+            'action_checkbox_name': helpers.ACTION_CHECKBOX_NAME,
+        })
 
 
 class UserProfileInline(admin.StackedInline):
@@ -12,9 +51,27 @@ class UserProfileInline(admin.StackedInline):
     fields = ['phone_number', 'emergency_contact_name', 'emergency_contact_phone', 'date_of_birth']
 
 
-class CustomUserAdmin(UserAdmin):
+class CustomUserAdmin(BulkActionMixin, IndexedSearchMixin, UserAdmin):
     """Extended User admin with UserProfile inline."""
     inlines = [UserProfileInline]
+    search_indexes = {'pk': 'members'}
+    actions = ['sign_up_for_run']
+
+    @admin.action(description='Sign selected members up for a run', permissions=['sign_up_for_run'])
+    def sign_up_for_run(self, request, queryset):
+        def apply(data):
+            results = services.bulk_sign_up(data['run'].pk, queryset.order_by('pk').values_list('pk', flat=True))
+            counts = Counter(results.values())
+            message = f'Signed up {counts[services.SIGNED_UP]} members for {data["run"]}.'
+            if counts[services.ALREADY_SIGNED_UP]:
+                message += f' {counts[services.ALREADY_SIGNED_UP]} were already signed up.'
+            if counts[services.RUN_FULL]:
+                message += f' {counts[services.RUN_FULL]} did not get a place: the run is full.'
+            return message
+        return self.bulk_action(request, queryset, RunChoiceForm, 'Sign up for run', apply)
+
+    def has_sign_up_for_run_permission(self, request):
+        return request.user.has_perm('runs.add_signup')
 
 
 # Unregister the default User admin and register our custom one
@@ -30,13 +87,31 @@ class SignUpInline(admin.TabularInline):
     readonly_fields = ['signed_up_at']
 
 
+@admin.register(Venue)
+class VenueAdmin(admin.ModelAdmin):
+    """Admin interface for Venue model."""
+    list_display = ['name', 'latitude', 'longitude', 'run_count']
+    search_fields = ['name']
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(run_count=Count('runs'))
+
+    def run_count(self, obj):
+        return obj.run_count
+    run_count.short_description = 'Runs'
+    run_count.admin_order_field = 'run_count'
+
+
 @admin.register(Run)
-class RunAdmin(admin.ModelAdmin):
+class RunAdmin(BulkActionMixin, IndexedSearchMixin, admin.ModelAdmin):
     """Admin interface for Run model."""
-    list_display = ['venue', 'date', 'time', 'length_km', 'meeting_place', 'get_signups_count', 'max_capacity', 'is_full']
-    list_filter = ['date', 'venue']
+    list_display = ['venue', 'date', 'time', 'length_km', 'meeting_place', 'get_signups_count', 'max_capacity', 'is_full', 'allocation', 'roster_link']
+    list_filter = ['date', 'location', 'allocation']
     search_fields = ['venue', 'meeting_place']
+    search_indexes = {'pk': 'runs'}
+    autocomplete_fields = ['location']
     inlines = [SignUpInline]
+    actions = ['change_capacity', 'move_to_venue', 'clone_runs']
     
     def get_signups_count(self, obj):
         return obj.get_signups_count()
@@ -47,22 +122,50 @@ class RunAdmin(admin.ModelAdmin):
     is_full.boolean = True
     is_full.short_description = 'Full'
 
+    def roster_link(self, obj):
+        return format_html('<a href="{}">Roster</a>', reverse('run_roster', args=[obj.pk]))
+    roster_link.short_description = 'Roster'
+
+    @admin.action(description='Change capacity of selected runs', permissions=['change'])
+    def change_capacity(self, request, queryset):
+        def apply(data):
+            relative = data['mode'] == RunCapacityForm.CHANGE
+            updated = bulk_edit.set_capacity(queryset, data['capacity'], relative=relative)
+            return f'Changed the capacity of {updated} runs.'
+        return self.bulk_action(request, queryset, RunCapacityForm, 'Change capacity', apply)
+
+    @admin.action(description='Move selected runs to another venue', permissions=['change'])
+    def move_to_venue(self, request, queryset):
+        def apply(data):
+            updated = bulk_edit.move_to_venue(queryset, data['venue'])
+            return f'Moved {updated} runs to {data["venue"]}.'
+        return self.bulk_action(request, queryset, RunVenueForm, 'Move to venue', apply)
+
+    @admin.action(description='Copy selected runs to later weeks', permissions=['add'])
+    def clone_runs(self, request, queryset):
+        def apply(data):
+            clones = bulk_edit.clone_runs(queryset, data['weeks'] * 7)
+            return f'Created {len(clones)} runs, {data["weeks"]} weeks on.'
+        return self.bulk_action(request, queryset, RunCloneForm, 'Copy runs', apply)
+
 
 @admin.register(SignUp)
-class SignUpAdmin(admin.ModelAdmin):
+class SignUpAdmin(IndexedSearchMixin, admin.ModelAdmin):
     """Admin interface for SignUp model."""
     list_display = ['user', 'run', 'signed_up_at', 'attended']
     list_filter = ['attended', 'run__date']
     search_fields = ['user__username', 'user__email', 'run__venue']
+    search_indexes = {'user': 'members', 'run': 'runs'}
     readonly_fields = ['signed_up_at']
 
 
 @admin.register(UserProfile)
-class UserProfileAdmin(admin.ModelAdmin):
+class UserProfileAdmin(IndexedSearchMixin, admin.ModelAdmin):
     """Admin interface for UserProfile model."""
     list_display = ['user', 'emergency_contact_name', 'emergency_contact_phone', 'phone_number', 'created_at']
     list_filter = ['created_at']
     search_fields = ['user__username', 'user__email', 'emergency_contact_name', 'phone_number']
+    search_indexes = {'user': 'members'}
     readonly_fields = ['created_at', 'updated_at']
     fieldsets = (
         ('User', {
@@ -79,3 +182,153 @@ class UserProfileAdmin(admin.ModelAdmin):
             'classes': ('collapse',)
         }),
     )
+
+
+class ArchivedSignUpInline(admin.TabularInline):
+    """Read-only inline listing the sign-ups of an archived run."""
+    model = ArchivedSignUp
+    extra = 0
+    fields = ['user', 'signed_up_at', 'attended']
+    readonly_fields = fields
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(ArchivedRun)
+class ArchivedRunAdmin(admin.ModelAdmin):
+    """Read-only admin interface for archived runs."""
+    list_display = ['venue', 'date', 'time', 'length_km', 'max_capacity', 'archived_at']
+    list_filter = ['date']
+    search_fields = ['venue', 'meeting_place']
+    date_hierarchy = 'date'
+    inlines = [ArchivedSignUpInline]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(MemberStats)
+class MemberStatsAdmin(IndexedSearchMixin, admin.ModelAdmin):
+    """Read-only admin interface for MemberStats model."""
+    list_display = ['user', 'runs_attended', 'km_attended', 'current_streak', 'last_attended_on', 'updated_at']
+    list_select_related = ['user']
+    search_fields = ['user__username', 'user__first_name', 'user__last_name']
+    search_indexes = {'user': 'members'}
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(SignUpEvent)
+class SignUpEventAdmin(admin.ModelAdmin):
+    """Read-only admin interface for the append-only SignUpEvent log."""
+    list_display = ['at', 'run_id', 'user_id', 'change', 'timeline_link']
+    list_filter = ['change']
+    search_fields = ['=run_id', '=user_id']
+    date_hierarchy = 'at'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+    def timeline_link(self, obj):
+        return format_html('<a href="{}">Timeline</a>', reverse('run_timeline', args=[obj.run_id]))
+    timeline_link.short_description = 'Run timeline'
+
+
+class RollupAdmin(admin.ModelAdmin):
+    """Read-only base for the analytics rollups, which refresh_rollups maintains."""
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(VenueMonthRollup)
+class VenueMonthRollupAdmin(RollupAdmin):
+    """Club analytics: turnout charts over the venue-month rollups."""
+    list_display = ['month', 'venue', 'runs', 'places', 'signups', 'attended', 'km_attended']
+    list_filter = ['month', 'venue']
+    date_hierarchy = 'month'
+
+    def changelist_view(self, request, extra_context=None):
+        extra_context = {
+            'monthly_turnout': analytics.monthly_turnout(),
+            'venue_summary': analytics.venue_summary(),
+            'cohort_retention': analytics.cohort_retention(),
+            **(extra_context or {}),
+        }
+        return super().changelist_view(request, extra_context=extra_context)
+
+
+@admin.register(RunRollup)
+class RunRollupAdmin(RollupAdmin):
+    """Admin interface for RunRollup model."""
+    list_display = ['date', 'venue', 'length_km', 'max_capacity', 'signups', 'attended', 'fill_rate_display']
+    list_filter = ['month', 'venue']
+    date_hierarchy = 'date'
+
+    def fill_rate_display(self, obj):
+        return f'{obj.fill_rate():.0%}'
+    fill_rate_display.short_description = 'Fill rate'
+
+
+@admin.register(BallotEntry)
+class BallotEntryAdmin(IndexedSearchMixin, admin.ModelAdmin):
+    """Admin interface for BallotEntry model."""
+    list_display = ['user', 'run', 'entered_at', 'reserve_position']
+    list_filter = ['run__date']
+    search_fields = ['user__username', 'run__venue']
+    search_indexes = {'user': 'members', 'run': 'runs'}
+    readonly_fields = ['entered_at']
+    list_select_related = ['user', 'run']
+
+
+@admin.register(SpotAlert)
+class SpotAlertAdmin(IndexedSearchMixin, admin.ModelAdmin):
+    """Admin interface for SpotAlert model."""
+    list_display = ['user', 'run', 'created_at']
+    list_filter = ['run__date']
+    search_fields = ['user__username', 'run__venue']
+    search_indexes = {'user': 'members', 'run': 'runs'}
+    readonly_fields = ['created_at']
+
+
+@admin.register(SpotHold)
+class SpotHoldAdmin(IndexedSearchMixin, admin.ModelAdmin):
+    """Admin interface for SpotHold model."""
+    list_display = ['user', 'run', 'created_at', 'expires_at']
+    list_filter = ['run__date']
+    search_fields = ['user__username', 'run__venue']
+    search_indexes = {'user': 'members', 'run': 'runs'}
+    readonly_fields = ['created_at']
+    list_select_related = ['user', 'run']
+
+
+@admin.register(Notification)
+class NotificationAdmin(IndexedSearchMixin, admin.ModelAdmin):
+    """Admin interface for Notification model."""
+    list_display = ['kind', 'user', 'run', 'status', 'attempts', 'next_attempt_at', 'sent_at']
+    list_filter = ['kind', 'status']
+    search_fields = ['user__username', 'user__email', 'run__venue']
+    search_indexes = {'user': 'members', 'run': 'runs'}
+    readonly_fields = ['dedup_key', 'created_at', 'sent_at', 'last_error']
+    list_select_related = ['user', 'run']
@@ -0,0 +1,246 @@
+"""
+Precomputed rollups for the admin's club analytics.
+
+Turnout, fill and no-show figures come from three small tables rather than
+from ``SignUp``:
+
+- ``RunRollup``: sign-ups and attendance per run, live or archived.
+- ``VenueMonthRollup``: those totals summed per venue per month.
+- ``CohortRollup``: per join-month cohort, how many members ran each month.
+
+``refresh_rollups`` is incremental. ``Run.updated_at`` is bumped whenever a
+run or its sign-ups change, so each pass only recomputes the runs changed (or
+archived) since the stored watermark, then re-sums the venue months and cohort
+months those runs fall in. The watermark is rewound by ``WATERMARK_OVERLAP``
+so changes committed late by a slow transaction are still picked up.
+"""
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Count, DateField, DecimalField, Exists, ExpressionWrapper, F, OuterRef, Q, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from .models import (
+    ArchivedRun, ArchivedSignUp, CohortRollup, RollupWatermark, Run, RunRollup, SignUp, VenueMonthRollup,
+)
+
+WATERMARK = 'analytics'
+WATERMARK_OVERLAP = timedelta(minutes=5)
+
+VENUE_MONTH_FIELDS = ['runs', 'places', 'signups', 'attended', 'km_attended']
+
+
+def month_start(day):
+    """Return the first day of ``day``'s month."""
+    return day.replace(day=1)
+
+
+def _run_rollups(queryset, signups):
+    """Build ``RunRollup`` rows for a live or archived run queryset; ``signups`` names the reverse relation."""
+    rows = queryset.order_by().annotate(
+        signups=Count(signups),
+        attended=Count(signups, filter=Q(**{f'{signups}__attended': True})),
+    ).values('pk', 'date', 'venue', 'length_km', 'max_capacity', 'signups', 'attended')
+    return [RunRollup(run_id=row.pop('pk'), month=month_start(row['date']), **row) for row in rows]
+
+
+def _refresh_run_rollups(since):
+    """
+    Recompute the rollups of runs changed or archived since ``since`` (all runs if None).
+
+    Returns the set of ``(venue, month)`` pairs touched, before and after.
+    """
+    live, archived = Run.objects.all(), ArchivedRun.objects.all()
+    if since is not None:
+        live, archived = live.filter(updated_at__gt=since), archived.filter(archived_at__gt=since)
+    rows = _run_rollups(live, 'signup') + _run_rollups(archived, 'archivedsignup')
+
+    # Runs deleted outright leave rollups behind with nothing to match.
+    orphans = RunRollup.objects.exclude(
+        Exists(Run.objects.filter(pk=OuterRef('run_id')))
+    ).exclude(
+        Exists(ArchivedRun.objects.filter(pk=OuterRef('run_id')))
+    )
+    # A run may have moved venue or month, so its old pair needs re-summing too.
+    previous = RunRollup.objects.filter(Q(run_id__in=[row.run_id for row in rows]) | Q(pk__in=orphans.values('pk')))
+    touched = set(previous.values_list('venue', 'month'))
+    touched |= {(row.venue, row.month) for row in rows}
+
+    orphans.delete()
+    RunRollup.objects.bulk_create(
+        rows, batch_size=500, update_conflicts=True, unique_fields=['run_id'],
+        update_fields=['date', 'month', 'venue', 'length_km', 'max_capacity', 'signups', 'attended'],
+    )
+    return len(rows), touched
+
+
+def _refresh_venue_months(keys):
+    """Re-sum ``VenueMonthRollup`` for the given ``(venue, month)`` pairs."""
+    if not keys:
+        return 0
+    km = ExpressionWrapper(F('length_km') * F('attended'), output_field=DecimalField(max_digits=12, decimal_places=2))
+    totals = (
+        RunRollup.objects
+        .filter(month__in={month for venue, month in keys}, venue__in={venue for venue, month in keys})
+        .order_by().values('venue', 'month')
+        # km_attended first, while F('attended') still means the column.
+        .annotate(
+            km_attended=Sum(km), runs=Count('pk'), places=Sum('max_capacity'),
+            signups=Sum('signups'), attended=Sum('attended'),
+        )
+    )
+    rows = [VenueMonthRollup(**row) for row in totals if (row['venue'], row['month']) in keys]
+
+    emptied = Q()
+    for venue, month in keys - {(row.venue, row.month) for row in rows}:
+        emptied |= Q(venue=venue, month=month)
+    if emptied:
+        VenueMonthRollup.objects.filter(emptied).delete()
+    VenueMonthRollup.objects.bulk_create(
+        rows, update_conflicts=True, unique_fields=['venue', 'month'], update_fields=VENUE_MONTH_FIELDS,
+    )
+    return len(rows)
+
+
+def _next_month(month):
+    return (month + timedelta(days=32)).replace(day=1)
+
+
+def _refresh_cohorts(months):
+    """Recompute ``CohortRollup`` for every join-month cohort in the given run months."""
+    if not months:
+        return 0
+    totals = {}
+    for model in (SignUp, ArchivedSignUp):
+        rows = (
+            model.objects
+            .filter(attended=True, run__date__gte=min(months), run__date__lt=_next_month(max(months)))
+            .order_by()
+            .values(
+                'user_id',
+                cohort=TruncMonth('user__date_joined', output_field=DateField()),
+                month=TruncMonth('run__date'),
+            )
+            .annotate(runs_attended=Count('pk'))
+        )
+        for row in rows:
+            if row['month'] not in months:
+                continue
+            members, runs_attended = totals.setdefault((row['cohort'], row['month']), (set(), [0]))
+            members.add(row['user_id'])
+            runs_attended[0] += row['runs_attended']
+
+    CohortRollup.objects.filter(month__in=months).delete()
+    CohortRollup.objects.bulk_create([
+        CohortRollup(cohort=cohort, month=month, members=len(members), runs_attended=runs_attended[0])
+        for (cohort, month), (members, runs_attended) in totals.items()
+    ])
+    return len(totals)
+
+
+def refresh_rollups(full=False):
+    """
+    Bring the rollup tables up to date.
+
+    Only runs changed since the last pass are reprocessed, unless ``full``.
+    Returns a dict of how many rows of each rollup were written.
+    """
+    started = timezone.now()
+    with transaction.atomic():
+        watermark = RollupWatermark.objects.select_for_update().filter(name=WATERMARK).first()
+        since = None if full or watermark is None else watermark.processed_until - WATERMARK_OVERLAP
+        if since is None:
+            RunRollup.objects.all().delete()
+            VenueMonthRollup.objects.all().delete()
+            CohortRollup.objects.all().delete()
+        runs, touched = _refresh_run_rollups(since)
+        venue_months = _refresh_venue_months(touched)
+        cohorts = _refresh_cohorts({month for venue, month in touched})
+        RollupWatermark.objects.update_or_create(name=WATERMARK, defaults={'processed_until': started})
+    return {'runs': runs, 'venue_months': venue_months, 'cohorts': cohorts}
+
+
+def _rate(part, whole):
+    return part / whole if whole else 0
+
+
+def _recent_months(months, today=None):
+    """Return ``(first, end)`` bounding the last ``months`` complete months."""
+    end = month_start(today or timezone.localdate())
+    first = end
+    for _ in range(months):
+        first = month_start(first - timedelta(days=1))
+    return first, end
+
+
+def monthly_turnout(months=12, today=None):
+    """
+    Return club-wide totals for each of the last ``months`` complete months.
+
+    Each row has ``month``, ``runs``, ``signups``, ``attended``, ``fill_rate``,
+    ``no_show_rate`` and ``bar`` (attendance as a percentage of the busiest month).
+    """
+    first, end = _recent_months(months, today)
+    rows = list(
+        VenueMonthRollup.objects.filter(month__gte=first, month__lt=end)
+        .order_by('month').values('month')
+        .annotate(runs=Sum('runs'), places=Sum('places'), signups=Sum('signups'), attended=Sum('attended'))
+    )
+    busiest = max((row['attended'] for row in rows), default=0)
+    for row in rows:
+        row['fill_rate'] = _rate(row['signups'], row['places'])
+        row['no_show_rate'] = _rate(row['signups'] - row['attended'], row['signups'])
+        row['bar'] = round(100 * _rate(row['attended'], busiest))
+    return rows
+
+
+def venue_summary(months=12, today=None):
+    """Return per-venue totals over the last ``months`` complete months, busiest first."""
+    first, end = _recent_months(months, today)
+    rows = list(
+        VenueMonthRollup.objects.filter(month__gte=first, month__lt=end)
+        .values('venue')
+        .annotate(
+            runs=Sum('runs'), places=Sum('places'), signups=Sum('signups'),
+            attended=Sum('attended'), km_attended=Sum('km_attended'),
+        )
+        .order_by('-attended', 'venue')
+    )
+    for row in rows:
+        row['fill_rate'] = _rate(row['signups'], row['places'])
+        row['no_show_rate'] = _rate(row['signups'] - row['attended'], row['signups'])
+    return rows
+
+
+def cohort_retention(cohorts=6, today=None):
+    """
+    Return the last ``cohorts`` join-month cohorts with their monthly retention.
+
+    Each row has ``cohort``, ``size`` (members who joined that month) and
+    ``cells``: for each month since joining up to now, the share of the
+    cohort that attended a run.
+    """
+    first, end = _recent_months(cohorts - 1, today)
+    sizes = dict(
+        User.objects.filter(date_joined__date__gte=first)
+        .annotate(cohort=TruncMonth('date_joined', output_field=DateField()))
+        .order_by().values('cohort').annotate(size=Count('pk')).values_list('cohort', 'size')
+    )
+    active = {
+        (row.cohort, row.month): row.members
+        for row in CohortRollup.objects.filter(cohort__gte=first)
+    }
+    rows = []
+    cohort = first
+    while cohort <= end:
+        size = sizes.get(cohort, 0)
+        cells, month = [], cohort
+        while month <= end:
+            members = active.get((cohort, month), 0)
+            cells.append({'month': month, 'members': members, 'rate': _rate(members, size)})
+            month = _next_month(month)
+        rows.append({'cohort': cohort, 'size': size, 'cells': cells})
+        cohort = _next_month(cohort)
+    return rows
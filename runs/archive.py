@@ -0,0 +1,84 @@
+"""
+Archive storage for past runs.
+
+``archive_runs`` moves runs older than ``ARCHIVE_AFTER_DAYS`` and their
+sign-ups into ``ArchivedRun``/``ArchivedSignUp`` in chunked transactions, so
+the live tables that the run list, sign-ups and capacity checks hit stay small.
+Reads that span all of history (member history, exports, stats) go through the
+helpers below, which combine the live and archive tables.
+"""
+from contextvars import ContextVar
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ArchivedRun, ArchivedSignUp, Run, SignUp
+
+RUN_FIELDS = ['id', 'date', 'time', 'meeting_place', 'venue', 'length_km', 'max_capacity', 'allocation']
+SIGNUP_FIELDS = ['id', 'user_id', 'run_id', 'signed_up_at', 'attended']
+
+# Columns returned by member_history(), identical for live and archived rows.
+HISTORY_FIELDS = ['run_id', 'run__date', 'run__time', 'run__venue', 'run__meeting_place',
+                  'run__length_km', 'signed_up_at', 'attended']
+
+# Set while sign-ups are being moved (or purged), so handlers can tell that from a cancellation.
+archiving = ContextVar('archiving', default=False)
+
+
+def archive_horizon(days=None):
+    """Return the date before which runs are archived."""
+    if days is None:
+        days = settings.ARCHIVE_AFTER_DAYS
+    return timezone.localdate() - timedelta(days=days)
+
+
+def archive_runs(before, chunk_size=500):
+    """
+    Move runs dated before ``before``, with their sign-ups, into the archive.
+
+    Each chunk of runs is copied and deleted in its own transaction, so a
+    long backlog never holds locks for long and can be interrupted safely.
+    Yields ``(runs, signups)`` counts for each chunk.
+    """
+    while True:
+        with transaction.atomic():
+            run_ids = list(
+                Run.objects.filter(date__lt=before).order_by('date', 'pk')
+                .values_list('pk', flat=True)[:chunk_size]
+            )
+            if not run_ids:
+                return
+            runs = [ArchivedRun(**row) for row in Run.objects.filter(pk__in=run_ids).values(*RUN_FIELDS)]
+            signups = [
+                ArchivedSignUp(**row)
+                for row in SignUp.objects.filter(run_id__in=run_ids).values(*SIGNUP_FIELDS)
+            ]
+            ArchivedRun.objects.bulk_create(runs)
+            ArchivedSignUp.objects.bulk_create(signups, batch_size=chunk_size)
+            # The runs go in the same transaction, so the sign-up post_delete
+            # handlers find nothing to promote or notify.
+            token = archiving.set(True)
+            try:
+                Run.objects.filter(pk__in=run_ids).delete()
+            finally:
+                archiving.reset(token)
+        yield len(runs), len(signups)
+
+
+def member_history(user, before=None):
+    """
+    Return ``user``'s sign-ups, live and archived, newest run first, as dicts.
+
+    ``before`` limits it to runs dated before that day.
+    """
+    live = SignUp.objects.filter(user=user)
+    archived = ArchivedSignUp.objects.filter(user=user)
+    if before is not None:
+        live, archived = live.filter(run__date__lt=before), archived.filter(run__date__lt=before)
+    # Clear the models' default ordering; compound queries can only be ordered as a whole.
+    live = live.order_by().values(*HISTORY_FIELDS)
+    archived = archived.order_by().values(*HISTORY_FIELDS)
+    return live.union(archived, all=True).order_by('-run__date', '-run__time')
+
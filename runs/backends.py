@@ -3,6 +3,8 @@ from django.contrib.auth.backends import ModelBackend
 from django.contrib.auth.models import User
 from django.db.models import Q
 
+from . import member_cache
+
 logger = logging.getLogger(__name__)
 
 
@@ -13,8 +15,16 @@ class EmailOrUsernameBackend(ModelBackend):
 
     This provides flexibility for both legacy users (with separate usernames)
     and new users (where email is the username).
+
+    Users for logged-in sessions are served from the member cache, so
+    authenticated requests don't query the user table.
     """
 
+    def get_user(self, user_id):
+        """Return the active user with this ID from the member cache, or None."""
+        user = member_cache.get_member(user_id)
+        return user if user is not None and self.user_can_authenticate(user) else None
+
     def authenticate(self, request, username=None, password=None, **kwargs):
         """
         Authenticate user using either username or email.
@@ -0,0 +1,253 @@
+"""
+Online database backup and restore.
+
+Copying ``db.sqlite3`` while the site is running either has to lock out
+writers for the whole copy or risks catching a transaction half-written.
+
+- SQLite: ``backup_sqlite`` uses SQLite's online backup API, copying
+  ``pages`` pages per step and releasing the database between steps, so
+  sign-ups keep committing while a backup is taken. A write from another
+  connection makes SQLite start the copy again; after ``max_restarts`` of
+  those it finishes in one step rather than chase a busy database forever.
+  In WAL mode readers never block writers, so there it always copies in one
+  step.
+- Other databases (PostgreSQL): ``export_rows`` writes a logical export of
+  every model, one JSON object per line, from a single read-only
+  ``REPEATABLE READ`` transaction. That is a consistent snapshot, and MVCC
+  means it blocks nobody. No ``pg_dump`` is needed on the app servers.
+  (On SQLite an export holds a read lock throughout, so it is only for
+  moving data between databases.)
+
+Backups are checked before they are kept or restored: ``PRAGMA
+integrity_check`` for SQLite files, and row counts against the snapshot for
+exports. A name ending in ``.gz`` is gzip-compressed; restores recognise
+compressed files by their contents.
+"""
+import gzip
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+from collections import Counter
+
+from django.apps import apps
+from django.core import serializers
+from django.core.management.color import no_style
+from django.db import connections, transaction
+
+# Pages copied per backup step: 1024 pages is 4 MiB at SQLite's default page size.
+BACKUP_PAGES = 1024
+# Seconds to leave the database to writers between steps.
+BACKUP_PAUSE = 0.01
+# Restarts caused by concurrent writes before the copy is finished in one step.
+BACKUP_MAX_RESTARTS = 5
+# Rows read, and objects inserted, per query when exporting and restoring.
+EXPORT_CHUNK_SIZE = 2000
+
+GZIP_MAGIC = b'\x1f\x8b'
+SQLITE_MAGIC = b'SQLite format 3\x00'
+
+
+class BackupError(Exception):
+    """A backup failed its integrity check, or a file is not a backup we can restore."""
+
+
+class _TooManyRestarts(Exception):
+    pass
+
+
+def is_sqlite(using='default'):
+    return connections[using].vendor == 'sqlite'
+
+
+def _open(path, mode):
+    """Open ``path``, through gzip if it is named ``.gz`` or (when reading) starts like gzip."""
+    if 'r' in mode:
+        with open(path, 'rb') as f:
+            compressed = f.read(2) == GZIP_MAGIC
+    else:
+        compressed = str(path).endswith('.gz')
+    return gzip.open(path, mode) if compressed else open(path, mode)
+
+
+def backup_format(path):
+    """Return ``'sqlite'`` for a database file backup and ``'json'`` for an export, compressed or not."""
+    with _open(path, 'rb') as f:
+        return 'sqlite' if f.read(len(SQLITE_MAGIC)) == SQLITE_MAGIC else 'json'
+
+
+def check_sqlite_file(path):
+    """Raise BackupError unless ``path`` is an SQLite database that passes ``PRAGMA integrity_check``."""
+    with open(path, 'rb') as f:
+        if f.read(len(SQLITE_MAGIC)) != SQLITE_MAGIC:
+            raise BackupError(f'{path} is not an SQLite database.')
+    db = sqlite3.connect(path)
+    try:
+        problems = [row[0] for row in db.execute('PRAGMA integrity_check')]
+    except sqlite3.DatabaseError as e:
+        problems = [str(e)]
+    finally:
+        db.close()
+    if problems != ['ok']:
+        raise BackupError(f'{path} failed its integrity check: {"; ".join(problems[:5])}')
+
+
+def backup_sqlite(path, using='default', pages=BACKUP_PAGES, pause=BACKUP_PAUSE,
+                  max_restarts=BACKUP_MAX_RESTARTS, progress=None):
+    """
+    Copy the live SQLite database to ``path`` without holding up writers, and check the copy.
+
+    ``progress(copied, total)`` is called after each step. Returns the
+    number of times writes made SQLite restart the copy.
+    """
+    connection = connections[using]
+    connection.ensure_connection()
+    source = connection.connection
+    if source.execute('PRAGMA journal_mode').fetchone()[0] == 'wal':
+        pages = -1
+    restarts = 0
+    remaining_before = None
+
+    def step(status, remaining, total):
+        nonlocal restarts, remaining_before
+        if remaining_before is not None and remaining > remaining_before:
+            restarts += 1
+            if restarts > max_restarts:
+                raise _TooManyRestarts
+        remaining_before = remaining
+        if progress:
+            progress(total - remaining, total)
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, copy_path = tempfile.mkstemp(suffix='.sqlite3', dir=directory)
+    os.close(fd)
+    try:
+        target = sqlite3.connect(copy_path)
+        try:
+            try:
+                source.backup(target, pages=pages, progress=step, sleep=pause)
+            except _TooManyRestarts:
+                source.backup(target)
+        finally:
+            target.close()
+        check_sqlite_file(copy_path)
+        if str(path).endswith('.gz'):
+            with open(copy_path, 'rb') as src, gzip.open(path, 'wb', compresslevel=6) as dst:
+                shutil.copyfileobj(src, dst, 1024 * 1024)
+        else:
+            os.replace(copy_path, path)
+    finally:
+        if os.path.exists(copy_path):
+            os.remove(copy_path)
+    return restarts
+
+
+def restore_sqlite(path, using='default'):
+    """Replace the live SQLite database with the (checked) backup at ``path``, in one step."""
+    with _open(path, 'rb') as src, tempfile.NamedTemporaryFile(suffix='.sqlite3', delete=False) as copy:
+        shutil.copyfileobj(src, copy, 1024 * 1024)
+    try:
+        check_sqlite_file(copy.name)
+        connection = connections[using]
+        connection.ensure_connection()
+        source = sqlite3.connect(copy.name)
+        try:
+            # One step: writers wait for the restore rather than see half of it.
+            source.backup(connection.connection)
+        finally:
+            source.close()
+    finally:
+        os.remove(copy.name)
+
+
+def _export_models():
+    """Concrete models with tables, ordered so rows are restored before rows that refer to them."""
+    app_list = [(app_config, None) for app_config in apps.get_app_configs()]
+    return [
+        model for model in serializers.sort_dependencies(app_list, allow_cycles=True)
+        if model._meta.managed and not model._meta.proxy
+    ]
+
+
+def export_rows(path, using='default', progress=None):
+    """
+    Write every model's rows to ``path`` from one consistent snapshot, then check the file.
+
+    ``progress(model, rows)`` is called after each model. Returns
+    ``{model label: rows}``.
+    """
+    connection = connections[using]
+    counts = {}
+    with _open(path, 'wt') as out, transaction.atomic(using=using):
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY')
+        for model in _export_models():
+            rows = model._base_manager.using(using).order_by(model._meta.pk.name)
+            counts[model._meta.label_lower] = rows.count()
+            serializers.serialize('jsonl', rows.iterator(chunk_size=EXPORT_CHUNK_SIZE), stream=out)
+            if progress:
+                progress(model, counts[model._meta.label_lower])
+    check_export(path, counts)
+    return counts
+
+
+def check_export(path, expected=None):
+    """Raise BackupError unless every line of the export parses (and, given ``expected``, the counts match)."""
+    found = Counter()
+    with _open(path, 'rt') as f:
+        for number, line in enumerate(f, start=1):
+            try:
+                found[json.loads(line)['model']] += 1
+            except (ValueError, KeyError, TypeError):
+                raise BackupError(f'{path} line {number} is not an exported row.')
+    if expected is not None:
+        mismatched = [label for label, rows in expected.items() if found[label] != rows]
+        if mismatched:
+            raise BackupError(f'{path} is missing rows for {", ".join(mismatched)}.')
+    return dict(found)
+
+
+def import_rows(path, using='default'):
+    """
+    Replace every model's rows with those in the export at ``path``, in one transaction.
+
+    Rows go in with one ``bulk_create`` per model chunk and no signals, as
+    they were when exported. Returns ``{model label: rows}``.
+    """
+    check_export(path)
+    connection = connections[using]
+    counts = Counter()
+    with transaction.atomic(using=using):
+        tables = connection.introspection.django_table_names(only_existing=True, include_views=False)
+        connection.ops.execute_sql_flush(connection.ops.sql_flush(no_style(), tables, reset_sequences=True))
+        with connection.constraint_checks_disabled(), _open(path, 'rt') as f:
+            batch, model, m2m = [], None, []
+
+            def flush_batch():
+                if batch:
+                    model._base_manager.using(using).bulk_create(batch)
+                    counts[model._meta.label_lower] += len(batch)
+                    batch.clear()
+
+            for row in serializers.deserialize('jsonl', f, using=using):
+                if type(row.object) is not model or len(batch) >= EXPORT_CHUNK_SIZE:
+                    flush_batch()
+                    model = type(row.object)
+                batch.append(row.object)
+                if row.m2m_data:
+                    m2m.append(row)
+            flush_batch()
+            for row in m2m:
+                for name, values in row.m2m_data.items():
+                    getattr(row.object, name).set(values)
+        models = [apps.get_model(label) for label in counts]
+        connection.check_constraints(table_names=[model._meta.db_table for model in models])
+        sequence_sql = connection.ops.sequence_reset_sql(no_style(), models)
+        if sequence_sql:
+            with connection.cursor() as cursor:
+                for sql in sequence_sql:
+                    cursor.execute(sql)
+    return dict(counts)
+
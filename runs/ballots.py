@@ -0,0 +1,112 @@
+"""
+Ballot allocation for oversubscribed runs.
+
+While a ballot is open, entering is a single insert with no capacity check,
+so opening time does not turn into a rush on ``run_signup``. When the ballot
+closes, ``draw`` allocates the free places by seeded random draw in one
+transaction. Winners get ``SignUp`` rows, and everyone else is kept in order
+as a reserve, promoted automatically as places are given up.
+"""
+import random
+import secrets
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import events, member_cache, stats
+from .models import BallotEntry, MemberStats, Run, SignUp
+
+
+def _draw_order(entries, rng, weights=None):
+    """
+    Return ``entries`` in random draw order.
+
+    With ``weights``, entries are drawn without replacement with probability
+    proportional to their weight (Efraimidis-Spirakis keys).
+    """
+    if weights is None:
+        entries = list(entries)
+        rng.shuffle(entries)
+        return entries
+    return sorted(entries, key=lambda e: rng.random() ** (1 / weights[e.user_id]), reverse=True)
+
+
+def _attendance_weights(user_ids):
+    """Weight members by ``1 / (1 + runs attended)`` to favour newer runners."""
+    attended = dict(
+        MemberStats.objects.filter(user_id__in=user_ids).values_list('user_id', 'runs_attended')
+    )
+    for user_id in set(user_ids) - attended.keys():
+        attended[user_id] = stats.refresh(user_id).runs_attended
+    return {user_id: 1 / (1 + attended.get(user_id, 0)) for user_id in user_ids}
+
+
+def draw(run, seed=None):
+    """
+    Draw ``run``'s ballot. Returns ``(winners, reserves)`` as lists of entries.
+
+    The seed is stored on the run so the draw can be reproduced. Drawing a
+    ballot that has already been drawn does nothing.
+    """
+    with transaction.atomic():
+        # Lock the run (counts are taken afterwards; FOR UPDATE can't be combined with GROUP BY).
+        run = Run.objects.select_for_update().get(pk=run.pk)
+        if not run.ballot_pending():
+            return [], []
+
+        run.ballot_seed = seed if seed is not None else secrets.token_hex(16)
+        rng = random.Random(f'{run.pk}:{run.ballot_seed}')
+
+        signed_up = SignUp.objects.filter(run=run).values_list('user_id', flat=True)
+        entries = list(run.ballotentry_set.exclude(user_id__in=signed_up).order_by('pk'))
+        weights = _attendance_weights([e.user_id for e in entries]) if run.ballot_priority else None
+        order = _draw_order(entries, rng, weights)
+
+        places = run.available_spots()
+        winners, reserves = order[:places], order[places:]
+
+        SignUp.objects.bulk_create([SignUp(run=run, user_id=e.user_id) for e in winners])
+        stats.signups_added(e.user_id for e in winners)
+        events.signups_created(run.pk, [e.user_id for e in winners])
+        member_cache.invalidate(*(e.user_id for e in winners))
+        BallotEntry.objects.filter(pk__in=[e.pk for e in winners]).delete()
+        for position, entry in enumerate(reserves, start=1):
+            entry.reserve_position = position
+        BallotEntry.objects.bulk_update(reserves, ['reserve_position'])
+        # Entries from members who signed up some other way are no longer needed.
+        run.ballotentry_set.filter(user_id__in=signed_up).delete()
+
+        run.ballot_drawn_at = timezone.now()
+        run.save(update_fields=['ballot_seed', 'ballot_drawn_at', 'updated_at'])
+    return winners, reserves
+
+
+def due_ballots(now=None):
+    """Return ballot runs whose entry window has closed but which are not drawn yet."""
+    return Run.objects.filter(
+        allocation=Run.BALLOT, ballot_drawn_at__isnull=True, ballot_closes_at__lte=now or timezone.now(),
+    )
+
+
+def promote_reserves(run_id):
+    """Give any free places on a drawn ballot run to the next reserves, in order."""
+    with transaction.atomic():
+        run = Run.objects.select_for_update().filter(
+            pk=run_id, allocation=Run.BALLOT, ballot_drawn_at__isnull=False,
+        ).first()
+        if run is None:
+            return []
+        signed_up = SignUp.objects.filter(run=run).values_list('user_id', flat=True)
+        run.ballotentry_set.filter(user_id__in=signed_up).delete()
+        promoted = list(
+            run.ballotentry_set.filter(reserve_position__isnull=False)
+            .order_by('reserve_position')[:run.available_spots()]
+        )
+        SignUp.objects.bulk_create([SignUp(run=run, user_id=e.user_id) for e in promoted])
+        stats.signups_added(e.user_id for e in promoted)
+        events.signups_created(run.pk, [e.user_id for e in promoted])
+        member_cache.invalidate(*(e.user_id for e in promoted))
+        if promoted:
+            Run.objects.filter(pk=run.pk).update(updated_at=timezone.now())
+        BallotEntry.objects.filter(pk__in=[e.pk for e in promoted]).delete()
+    return promoted
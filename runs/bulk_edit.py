@@ -0,0 +1,113 @@
+"""
+Changes applied to many runs at once, behind the ``RunAdmin`` bulk actions.
+
+Raising capacity for a season, moving runs to another venue or cloning a
+month's schedule would otherwise mean saving each run in turn. Each function
+here checks the whole selection with one query, raises ``ValidationError``
+naming the runs that fail, and then makes the change with a single
+``update`` or ``bulk_create``.
+
+``update`` skips ``Run.save`` and its signals, so these functions also do
+what those would: bump ``updated_at`` (which the rollups, rosters and run
+list ETags watch), drop cached waiting rooms, and offer newly added places
+to reserves and watching members.
+"""
+from datetime import timedelta
+from functools import partial
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import F, Q, Value
+from django.utils import timezone
+
+from . import waiting_room
+from .models import Run
+from .signals import place_freed
+
+# Runs named in a validation error before it gives a count of the rest.
+ERROR_RUNS_SHOWN = 5
+
+# Copied as they are onto cloned runs; dates and opening times are shifted.
+CLONED_FIELDS = [
+    'time', 'meeting_place', 'location_id', 'venue', 'length_km', 'max_capacity',
+    'allocation', 'ballot_priority', 'admission_rate',
+]
+
+
+def _rejected(message, runs):
+    """Return a ValidationError naming the first few ``runs``."""
+    named = '; '.join(str(run) for run in runs[:ERROR_RUNS_SHOWN])
+    if len(runs) > ERROR_RUNS_SHOWN:
+        named += f' and {len(runs) - ERROR_RUNS_SHOWN} more'
+    return ValidationError(f'{message}: {named}.')
+
+
+def _forget_rooms(run_ids):
+    for run_id in run_ids:
+        waiting_room.forget(run_id)
+
+
+def set_capacity(queryset, capacity, relative=False):
+    """
+    Set the selected runs' capacity to ``capacity``, or change it by that much with ``relative``.
+
+    Refuses the whole change if any run would end up with fewer places than
+    it has sign-ups (or fewer than none). Returns the number of runs updated.
+    """
+    new_capacity = F('max_capacity') + capacity if relative else Value(capacity)
+    with transaction.atomic():
+        runs = list(
+            queryset.with_signup_counts().annotate(new_capacity=new_capacity)
+            .filter(Q(signup_count__gt=F('new_capacity')) | Q(max_capacity__lt=F('new_capacity')))
+        )
+        too_small = [run for run in runs if run.signup_count > run.new_capacity]
+        if too_small:
+            raise _rejected('Capacity would fall below the current sign-ups for', too_small)
+        run_ids = list(queryset.values_list('pk', flat=True))
+        updated = Run.objects.filter(pk__in=run_ids).update(max_capacity=new_capacity, updated_at=timezone.now())
+        transaction.on_commit(partial(_forget_rooms, run_ids))
+        # Runs with more places than before may have reserves or alerts waiting.
+        for run in runs:
+            transaction.on_commit(partial(place_freed, run.pk))
+    return updated
+
+
+def move_to_venue(queryset, venue):
+    """Move the selected runs to ``venue``. Returns the number of runs moved."""
+    with transaction.atomic():
+        run_ids = list(queryset.values_list('pk', flat=True))
+        updated = Run.objects.filter(pk__in=run_ids).update(
+            location=venue, venue=venue.name, updated_at=timezone.now(),
+        )
+        transaction.on_commit(partial(_forget_rooms, run_ids))
+    return updated
+
+
+def clone_runs(queryset, days):
+    """
+    Copy the selected runs ``days`` later, with no sign-ups and any ballot undrawn.
+
+    Refuses the whole copy if a run already exists at the same venue, date
+    and time as any of the copies. Returns the new runs.
+    """
+    offset = timedelta(days=days)
+    clones = []
+    for run in queryset.order_by('date', 'time'):
+        clone = Run(date=run.date + offset, **{field: getattr(run, field) for field in CLONED_FIELDS})
+        clone.opens_at = run.opens_at and run.opens_at + offset
+        clone.ballot_closes_at = run.ballot_closes_at and run.ballot_closes_at + offset
+        clones.append(clone)
+    if not clones:
+        return []
+
+    slots = {(clone.venue, clone.date, clone.time) for clone in clones}
+    existing = {
+        (run.venue, run.date, run.time): run
+        for run in Run.objects.filter(
+            date__in={date for _, date, _ in slots}, venue__in={venue for venue, _, _ in slots},
+        )
+    }
+    clashes = [existing[slot] for slot in sorted(slots & existing.keys(), key=lambda slot: slot[1:])]
+    if clashes:
+        raise _rejected('These runs already exist', clashes)
+    return Run.objects.bulk_create(clones)
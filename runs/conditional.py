@@ -0,0 +1,132 @@
+"""
+Conditional GET for the run list and rosters.
+
+Members refresh the run list constantly. Instead of rendering it every time,
+``conditional_page`` works out a validator from a couple of cheap aggregate
+queries and answers ``304 Not Modified`` when the browser's copy still
+matches.
+
+The run list's ETag is built from ``runs_watermark``: the newest
+``Run.updated_at`` (bumped whenever a run or its sign-ups change), the number
+of runs (which catches deletions and archiving), and how many runs have
+passed their opening or ballot closing time (which catches buttons changing
+with the clock). For members it also covers their name, staff flag, roster
+permission, ballot entries and CSRF secret, so a copy is never reused
+across accounts or logins. Pages with a flash message waiting are always
+rendered in full.
+"""
+import hashlib
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.contrib import messages
+from django.db.models import Count, Max, Q
+from django.middleware.csrf import get_token
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+from .models import BallotEntry, Run
+
+
+def runs_watermark(now=None):
+    """Return a tuple that changes whenever anything the run list shows about runs does."""
+    now = now or timezone.now()
+    totals = Run.objects.order_by().aggregate(
+        changed=Max('updated_at'),
+        runs=Count('pk'),
+        opened=Count('pk', filter=Q(opens_at__lte=now)),
+        closed=Count('pk', filter=Q(ballot_closes_at__lte=now)),
+        ballots=Count('pk', filter=Q(allocation=Run.BALLOT)),
+    )
+    return (timezone.localdate(now), *totals.values())
+
+
+def _etag(*parts):
+    return quote_etag(hashlib.sha256(repr(parts).encode()).hexdigest()[:32])
+
+
+def run_list_validators(request):
+    """Return the run list's ``(etag, last_modified)``; None while a flash message is waiting."""
+    if messages.get_messages(request):
+        return None
+    watermark = runs_watermark()
+    # The page's forms embed a CSRF token; settle the secret (and its cookie)
+    # now, so a first visit and its refresh agree on it.
+    get_token(request)
+    parts = [watermark, request.META['CSRF_COOKIE']]
+    user = request.user
+    if user.is_authenticated:
+        # The menu shows Admin to staff and Rosters to leaders.
+        parts += [user.pk, user.username, user.is_staff, user.has_perm('runs.view_roster')]
+        if watermark[-1]:
+            # Ballot entries don't touch their run, so add the member's own.
+            entries = BallotEntry.objects.filter(user=user).aggregate(count=Count('pk'), latest=Max('pk'))
+            parts += [entries['count'], entries['latest']]
+    # No Last-Modified: a deleted run or a button changing with the clock
+    # doesn't advance any timestamp, so only the ETag is safe to trust.
+    return _etag(*parts), None
+
+
+def roster_validators(request, run_id):
+    """Return a roster's ``(etag, last_modified)``, both from the run's ``updated_at``."""
+    updated_at = Run.objects.filter(pk=run_id).values_list('updated_at', flat=True).first()
+    if updated_at is None:
+        return None
+    return _etag(run_id, updated_at.timestamp()), updated_at
+
+
+def _not_modified(request, validators):
+    if validators is None or request.method not in ('GET', 'HEAD'):
+        return None
+    etag, last_modified = validators
+    return get_conditional_response(
+        request, etag=etag, last_modified=last_modified and int(last_modified.timestamp()),
+    )
+
+
+def _add_validators(request, response, validators):
+    if validators is None or request.method not in ('GET', 'HEAD') or response.status_code not in (200, 304):
+        return response
+    etag, last_modified = validators
+    if etag and not response.has_header('ETag'):
+        response.headers['ETag'] = etag
+    if last_modified and not response.has_header('Last-Modified'):
+        response.headers['Last-Modified'] = http_date(last_modified.timestamp())
+    # Always revalidate; pages for members stay in their own browser.
+    if request.user.is_authenticated:
+        patch_cache_control(response, no_cache=True, private=True)
+    else:
+        patch_cache_control(response, no_cache=True)
+    return response
+
+
+def conditional_page(validators_func):
+    """
+    Decorator answering conditional GETs for a view with ``304 Not Modified``.
+
+    ``validators_func(request, *args, **kwargs)`` returns the page's
+    ``(etag, last_modified)``, either of which may be None, or None to always
+    serve the page. Like Django's ``condition``, but it works on async views
+    too and looks both validators up at once.
+    """
+    def decorator(view_func):
+        if iscoroutinefunction(view_func):
+            @wraps(view_func)
+            async def _wrapped_async(request, *args, **kwargs):
+                validators = await sync_to_async(validators_func)(request, *args, **kwargs)
+                not_modified = _not_modified(request, validators)
+                if not_modified is not None:
+                    return _add_validators(request, not_modified, validators)
+                return _add_validators(request, await view_func(request, *args, **kwargs), validators)
+            return _wrapped_async
+
+        @wraps(view_func)
+        def _wrapped(request, *args, **kwargs):
+            validators = validators_func(request, *args, **kwargs)
+            not_modified = _not_modified(request, validators)
+            if not_modified is not None:
+                return _add_validators(request, not_modified, validators)
+            return _add_validators(request, view_func(request, *args, **kwargs), validators)
+        return _wrapped
+    return decorator
@@ -0,0 +1,69 @@
+"""
+Append-only log of sign-ups and cancellations.
+
+Every ``SignUp`` created or deleted adds one ``SignUpEvent`` row, in the same
+transaction as the change: the signal handlers in ``signals.py`` cover views,
+services and the admin, and paths that ``bulk_create`` sign-ups call
+``signups_created`` themselves. Rows are never updated, and they hold plain
+run and user IDs rather than foreign keys, so a run's history outlives
+archiving and deletion.
+
+``timeline`` replays a run's events in order to give its sign-up count over
+time, reading only the ``(run_id, at)`` index of the log.
+"""
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+from .models import SignUpEvent
+
+# Rows fetched per round trip while streaming a timeline.
+TIMELINE_CHUNK_SIZE = 2000
+
+
+def signup_created(signup):
+    """Log a new sign-up."""
+    SignUpEvent.objects.create(
+        run_id=signup.run_id, user_id=signup.user_id, change=SignUpEvent.SIGNED_UP, at=signup.signed_up_at,
+    )
+
+
+def signup_deleted(signup):
+    """Log a cancelled (deleted) sign-up."""
+    SignUpEvent.objects.create(run_id=signup.run_id, user_id=signup.user_id, change=SignUpEvent.CANCELLED)
+
+
+def signups_created(run_id, user_ids):
+    """Log sign-ups created in bulk for one run."""
+    at = timezone.now()
+    SignUpEvent.objects.bulk_create([
+        SignUpEvent(run_id=run_id, user_id=user_id, change=SignUpEvent.SIGNED_UP, at=at) for user_id in user_ids
+    ])
+
+
+def timeline(run_id):
+    """
+    Yield a run's sign-up count after each event, oldest first.
+
+    Each point is a dict of ``at``, ``change`` (+1 or -1), ``user`` (the
+    member's ID) and ``signups``, the running total.
+    """
+    signups = 0
+    events = (
+        SignUpEvent.objects.filter(run_id=run_id).order_by('at', 'pk')
+        .values_list('at', 'change', 'user_id').iterator(chunk_size=TIMELINE_CHUNK_SIZE)
+    )
+    for at, change, user_id in events:
+        signups += change
+        yield {'at': at, 'change': change, 'user': user_id, 'signups': signups}
+
+
+def timeline_json(run_id):
+    """Yield ``{"run": ..., "points": [...]}`` for ``timeline`` in chunks, for streaming responses."""
+    yield f'{{"run": {int(run_id)}, "points": ['
+    separator = ''
+    for point in timeline(run_id):
+        yield separator + json.dumps(point, cls=DjangoJSONEncoder)
+        separator = ', '
+    yield ']}'
@@ -0,0 +1,127 @@
+"""
+Faceted filtering of the run list.
+
+Each facet (distance band, day of week, time of day, has spaces) is a set of
+named ``Q`` conditions. Choices within a facet are OR'd and facets are AND'd.
+Counts follow the usual faceted-search rule: a facet's counts apply every
+*other* active filter, so ticking "Saturday" doesn't zero out "Sunday".
+
+Counts come from conditional ``Count`` aggregates, one query for all facets
+without a selection plus one per facet that has one.
+"""
+from datetime import time
+
+from django.db.models import Count, F, Q
+
+DISTANCE_BANDS = {
+    'under-5': ('Under 5 km', Q(length_km__lt=5)),
+    '5-10': ('5-10 km', Q(length_km__gte=5, length_km__lt=10)),
+    '10-21': ('10-21 km', Q(length_km__gte=10, length_km__lt=21.1)),
+    'half-plus': ('Half marathon +', Q(length_km__gte=21.1)),
+}
+
+# Django's week_day lookup numbers days from Sunday (1) to Saturday (7).
+DAYS = {
+    'mon': ('Mon', Q(date__week_day=2)),
+    'tue': ('Tue', Q(date__week_day=3)),
+    'wed': ('Wed', Q(date__week_day=4)),
+    'thu': ('Thu', Q(date__week_day=5)),
+    'fri': ('Fri', Q(date__week_day=6)),
+    'sat': ('Sat', Q(date__week_day=7)),
+    'sun': ('Sun', Q(date__week_day=1)),
+}
+
+TIMES_OF_DAY = {
+    'morning': ('Morning', Q(time__lt=time(12))),
+    'afternoon': ('Afternoon', Q(time__gte=time(12), time__lt=time(17))),
+    'evening': ('Evening', Q(time__gte=time(17))),
+}
+
+# Needs the signup_count and hold_count annotations from RunQuerySet.with_signup_counts().
+SPACES = {
+    'yes': ('Has spaces', Q(max_capacity__gt=F('signup_count') + F('hold_count'))),
+}
+
+FACETS = {
+    'distance': DISTANCE_BANDS,
+    'day': DAYS,
+    'time': TIMES_OF_DAY,
+    'spaces': SPACES,
+}
+
+
+def _facet_condition(facet, values):
+    condition = Q()
+    for value in values:
+        condition |= FACETS[facet][value][1]
+    return condition
+
+
+def filter_runs(queryset, selected, date_from=None, date_to=None, exclude=None):
+    """
+    Apply the date range and selected facet values to a run queryset.
+
+    ``selected`` maps facet names to lists of chosen values. ``exclude``
+    leaves one facet out, for counting that facet's choices.
+    """
+    if date_from:
+        queryset = queryset.filter(date__gte=date_from)
+    if date_to:
+        queryset = queryset.filter(date__lte=date_to)
+    for facet, values in selected.items():
+        if values and facet != exclude:
+            queryset = queryset.filter(_facet_condition(facet, values))
+    return queryset
+
+
+def _count_queries(queryset, selected, date_from, date_to):
+    """Yield ``(facet names, queryset)`` pairs, one per aggregate query needed."""
+    unselected = [facet for facet in FACETS if not selected.get(facet)]
+    if unselected:
+        yield unselected, filter_runs(queryset, selected, date_from, date_to)
+    for facet in FACETS:
+        if selected.get(facet):
+            yield [facet], filter_runs(queryset, selected, date_from, date_to, exclude=facet)
+
+
+def _aggregates(facets):
+    return {
+        f'{facet}__{value}': Count('pk', filter=condition)
+        for facet in facets
+        for value, (label, condition) in FACETS[facet].items()
+    }
+
+
+def _unpack(selected, totals):
+    return {
+        facet: [
+            {
+                'value': value,
+                'label': label,
+                'count': totals[f'{facet}__{value}'],
+                'selected': value in selected.get(facet, ()),
+            }
+            for value, (label, condition) in choices.items()
+        ]
+        for facet, choices in FACETS.items()
+    }
+
+
+def facet_counts(queryset, selected, date_from=None, date_to=None):
+    """
+    Return ``{facet: [{'value', 'label', 'count', 'selected'}, ...]}``.
+
+    ``queryset`` must carry ``with_signup_counts()`` for the spaces facet.
+    """
+    totals = {}
+    for facets, facet_queryset in _count_queries(queryset, selected, date_from, date_to):
+        totals.update(facet_queryset.order_by().aggregate(**_aggregates(facets)))
+    return _unpack(selected, totals)
+
+
+async def afacet_counts(queryset, selected, date_from=None, date_to=None):
+    """Async version of ``facet_counts``."""
+    totals = {}
+    for facets, facet_queryset in _count_queries(queryset, selected, date_from, date_to):
+        totals.update(await facet_queryset.order_by().aaggregate(**_aggregates(facets)))
+    return _unpack(selected, totals)
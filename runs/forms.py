@@ -2,7 +2,9 @@ from django import forms
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.models import User
 from django.core.exceptions import ValidationError
-from .models import UserProfile
+from django.utils import timezone
+from . import facets
+from .models import Run, UserProfile, Venue
 
 
 class RegistrationForm(UserCreationForm):
@@ -100,3 +102,115 @@ class RegistrationForm(UserCreationForm):
                 date_of_birth=self.cleaned_data.get('date_of_birth')
             )
         return user
+
+
+class RunFilterForm(forms.Form):
+    """Facet filters for the run list and the run filter API."""
+    date_from = forms.DateField(
+        required=False,
+        widget=forms.DateInput(attrs={'class': 'form-control form-control-sm', 'type': 'date'})
+    )
+    date_to = forms.DateField(
+        required=False,
+        widget=forms.DateInput(attrs={'class': 'form-control form-control-sm', 'type': 'date'})
+    )
+    distance = forms.MultipleChoiceField(
+        required=False,
+        choices=[(value, label) for value, (label, condition) in facets.DISTANCE_BANDS.items()]
+    )
+    day = forms.MultipleChoiceField(
+        required=False,
+        choices=[(value, label) for value, (label, condition) in facets.DAYS.items()]
+    )
+    time = forms.MultipleChoiceField(
+        required=False,
+        choices=[(value, label) for value, (label, condition) in facets.TIMES_OF_DAY.items()]
+    )
+    spaces = forms.MultipleChoiceField(
+        required=False,
+        choices=[(value, label) for value, (label, condition) in facets.SPACES.items()]
+    )
+
+    def clean(self):
+        cleaned_data = super().clean()
+        date_from, date_to = cleaned_data.get('date_from'), cleaned_data.get('date_to')
+        if date_from and date_to and date_from > date_to:
+            raise ValidationError('The start date must be on or before the end date.')
+        return cleaned_data
+
+    def _valid_data(self):
+        # Invalid fields are left out of cleaned_data, so the rest still apply.
+        self.is_valid()
+        return self.cleaned_data
+
+    def selected(self):
+        """Return ``{facet: [values]}`` for the valid facet choices."""
+        data = self._valid_data()
+        return {facet: data.get(facet, []) for facet in facets.FACETS}
+
+    def date_range(self):
+        """Return ``(date_from, date_to)``, either of which may be None."""
+        data = self._valid_data()
+        return data.get('date_from'), data.get('date_to')
+
+    def is_active(self):
+        """True if any filter is applied."""
+        return any(self.selected().values()) or any(self.date_range())
+
+
+class RunCapacityForm(forms.Form):
+    """Capacity change for the selected runs, from the run admin."""
+    SET = 'set'
+    CHANGE = 'change'
+
+    mode = forms.ChoiceField(
+        choices=[(SET, 'Set capacity to'), (CHANGE, 'Change capacity by')],
+        initial=SET,
+        widget=forms.RadioSelect,
+    )
+    capacity = forms.IntegerField(help_text="Places per run, or places to add (negative to remove)")
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if cleaned_data.get('mode') == self.SET and cleaned_data.get('capacity', 0) < 0:
+            raise ValidationError('Capacity cannot be negative.')
+        return cleaned_data
+
+
+class RunVenueForm(forms.Form):
+    """New location for the selected runs, from the run admin."""
+    venue = forms.ModelChoiceField(queryset=Venue.objects.all())
+
+
+class RunCloneForm(forms.Form):
+    """How far ahead to copy the selected runs, from the run admin."""
+    weeks = forms.IntegerField(
+        min_value=1, max_value=104, initial=4,
+        help_text="Copies fall on the same weekday, this many weeks later"
+    )
+
+
+class RunChoiceForm(forms.Form):
+    """Upcoming run to sign the selected members up for, from the user admin."""
+    run = forms.ModelChoiceField(queryset=Run.objects.none())
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['run'].queryset = Run.objects.filter(date__gte=timezone.localdate())
+
+
+class GroupSignUpForm(forms.Form):
+    """Members to sign up for a run together, one per line."""
+    # Upper bound on members signed up in one go.
+    MAX_MEMBERS = 200
+
+    members = forms.CharField(
+        widget=forms.Textarea(attrs={'class': 'form-control', 'rows': 10, 'placeholder': 'e.g., jane.smith@example.com'}),
+        help_text="One member per line: email address, username or member ID. Places go in this order."
+    )
+
+    def clean_members(self):
+        members = [line.strip() for line in self.cleaned_data['members'].splitlines() if line.strip()]
+        if len(members) > self.MAX_MEMBERS:
+            raise ValidationError(f'Sign up at most {self.MAX_MEMBERS} members at a time.')
+        return members
@@ -0,0 +1,35 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from runs.archive import archive_horizon, archive_runs
+from runs.models import Run, SignUp
+
+
+class Command(BaseCommand):
+    help = 'Moves past runs and their sign-ups into the archive tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.ARCHIVE_AFTER_DAYS,
+                            help='Archive runs more than this many days old')
+        parser.add_argument('--chunk-size', type=int, default=500,
+                            help='Number of runs to move per transaction')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Report what would be archived without changing anything')
+
+    def handle(self, *args, **options):
+        before = archive_horizon(options['days'])
+
+        if options['dry_run']:
+            runs = Run.objects.filter(date__lt=before).count()
+            signups = SignUp.objects.filter(run__date__lt=before).count()
+            self.stdout.write(f'Would archive {runs} runs and {signups} sign-ups dated before {before}')
+            return
+
+        total_runs = total_signups = 0
+        for runs, signups in archive_runs(before, chunk_size=options['chunk_size']):
+            total_runs += runs
+            total_signups += signups
+            self.stdout.write(f'Archived {total_runs} runs and {total_signups} sign-ups so far')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Archived {total_runs} runs and {total_signups} sign-ups dated before {before}'
+        ))
@@ -0,0 +1,54 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from runs.backup import BACKUP_MAX_RESTARTS, BACKUP_PAGES, BACKUP_PAUSE, BackupError, backup_sqlite, export_rows, is_sqlite
+
+
+class Command(BaseCommand):
+    help = 'Backs up the database while the site keeps running, and checks the backup'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File to write; a name ending in .gz is compressed')
+        parser.add_argument('--database', default='default', help='Database alias to back up')
+        parser.add_argument('--format', choices=['auto', 'sqlite', 'json'], default='auto',
+                            help='sqlite: copy of the database file (SQLite only); json: logical export. '
+                                 'auto picks sqlite for SQLite and json otherwise')
+        parser.add_argument('--pages', type=int, default=BACKUP_PAGES,
+                            help='SQLite pages copied per step; writers get the database between steps')
+        parser.add_argument('--pause', type=float, default=BACKUP_PAUSE,
+                            help='Seconds to wait between SQLite backup steps')
+        parser.add_argument('--max-restarts', type=int, default=BACKUP_MAX_RESTARTS,
+                            help='Concurrent writes tolerated before the SQLite copy finishes in one step')
+
+    def handle(self, *args, **options):
+        using, path = options['database'], options['path']
+        self.verbosity = options['verbosity']
+        file_copy = options['format'] == 'sqlite' or options['format'] == 'auto' and is_sqlite(using)
+        if file_copy and not is_sqlite(using):
+            raise CommandError('--format sqlite needs an SQLite database; use --format json.')
+        if options['pages'] == 0 or options['pages'] < -1:
+            raise CommandError('--pages must be at least 1, or -1 to copy everything in one step.')
+
+        start = time.perf_counter()
+        try:
+            if file_copy:
+                restarts = backup_sqlite(path, using=using, pages=options['pages'], pause=options['pause'],
+                                         max_restarts=options['max_restarts'], progress=self.report_pages)
+                summary = f'copied the database file ({restarts} restarts after concurrent writes)'
+            else:
+                counts = export_rows(path, using=using, progress=self.report_rows)
+                summary = f'exported {sum(counts.values())} rows from {len(counts)} tables'
+        except BackupError as e:
+            raise CommandError(f'Backup failed its check and was not kept: {e}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Backed up to {path}: {summary} in {time.perf_counter() - start:.1f}s; integrity checked'
+        ))
+
+    def report_pages(self, copied, total):
+        if self.verbosity >= 2:
+            self.stdout.write(f'Copied {copied} of {total} pages')
+
+    def report_rows(self, model, rows):
+        if self.verbosity >= 2:
+            self.stdout.write(f'Exported {rows} rows of {model._meta.label}')
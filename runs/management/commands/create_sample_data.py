@@ -1,6 +1,6 @@
 from django.core.management.base import BaseCommand
 from django.contrib.auth.models import User
-from runs.models import Run
+from runs.models import Run, Venue
 from datetime import date, time
 
 
@@ -22,6 +22,17 @@ class Command(BaseCommand):
         
         self.stdout.write(self.style.SUCCESS(f'Created {users_created} test users'))
         
+        # Create the venues the runs start from
+        venues = {}
+        for name, latitude, longitude in [
+            ('Victoria Park', 51.5362, -0.0410),
+            ('Regent\'s Canal', 51.5355, -0.1030),
+            ('Hampstead Heath', 51.5608, -0.1631),
+        ]:
+            venues[name], _ = Venue.objects.get_or_create(
+                name=name, defaults={'latitude': latitude, 'longitude': longitude}
+            )
+
         # Create some test runs
         runs_data = [
             {
@@ -56,7 +67,7 @@ class Command(BaseCommand):
                 date=run_data['date'],
                 venue=run_data['venue']
             ).exists():
-                Run.objects.create(**run_data)
+                Run.objects.create(location=venues[run_data['venue']], **run_data)
                 runs_created += 1
         
         self.stdout.write(self.style.SUCCESS(f'Created {runs_created} test runs'))
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+from runs import ballots
+from runs.models import Run
+
+
+class Command(BaseCommand):
+    help = 'Draws places for ballot runs whose entry window has closed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--run', type=int, dest='run_id',
+                            help='Draw this run now, even if its ballot has not closed')
+        parser.add_argument('--seed',
+                            help='Random seed for the draw (with --run), to reproduce an earlier draw')
+
+    def handle(self, *args, **options):
+        if options['run_id'] is not None:
+            try:
+                run = Run.objects.get(pk=options['run_id'], allocation=Run.BALLOT)
+            except Run.DoesNotExist:
+                raise CommandError(f"No ballot run with id {options['run_id']}")
+            if not run.ballot_pending():
+                raise CommandError(f'The ballot for {run} has already been drawn')
+            runs = [run]
+        elif options['seed'] is not None:
+            raise CommandError('--seed can only be used with --run')
+        else:
+            runs = ballots.due_ballots()
+
+        for run in runs:
+            winners, reserves = ballots.draw(run, seed=options['seed'])
+            run.refresh_from_db(fields=['ballot_seed'])
+            self.stdout.write(self.style.SUCCESS(
+                f'{run}: {len(winners)} places allocated, {len(reserves)} reserves (seed {run.ballot_seed})'
+            ))
@@ -0,0 +1,59 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from runs.models import ArchivedSignUp, SignUpEvent
+from runs.retention import inactive_members, purge_members, purge_signups, retention_horizon
+
+
+class Command(BaseCommand):
+    help = 'Deletes or anonymises inactive members and old sign-ups, in small batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--member-days', type=int, default=settings.RETAIN_INACTIVE_MEMBERS_DAYS,
+                            help='Purge members with no login or run for this many days')
+        parser.add_argument('--signup-days', type=int, default=settings.RETAIN_SIGNUPS_DAYS,
+                            help='Purge archived sign-ups to runs more than this many days old')
+        parser.add_argument('--anonymise', action='store_true',
+                            help='Strip inactive members\' personal details instead of deleting them')
+        parser.add_argument('--batch-size', type=int, default=100,
+                            help='Number of members (or ten times as many sign-ups) per transaction')
+        parser.add_argument('--pause', type=float, default=0,
+                            help='Seconds to wait between batches, to leave room for live traffic')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Report what would be purged without changing anything')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1.')
+        member_horizon = retention_horizon(options['member_days'])
+        signup_horizon = retention_horizon(options['signup_days'])
+        action = 'anonymise' if options['anonymise'] else 'delete'
+
+        if options['dry_run']:
+            members = inactive_members(member_horizon).count()
+            signups = ArchivedSignUp.objects.filter(run__date__lt=signup_horizon.date()).count()
+            events = SignUpEvent.objects.filter(at__lt=signup_horizon, user_id__isnull=False).count()
+            self.stdout.write(
+                f'Would {action} {members} members inactive since {member_horizon:%Y-%m-%d}, '
+                f'delete {signups} archived sign-ups and anonymise {events} sign-up events '
+                f'from before {signup_horizon:%Y-%m-%d}'
+            )
+            return
+
+        total_members = total_member_signups = 0
+        for members, signups in purge_members(member_horizon, batch_size=options['batch_size'],
+                                              anonymise=options['anonymise'], pause=options['pause']):
+            total_members += members
+            total_member_signups += signups
+            self.stdout.write(f'Purged {total_members} members ({total_member_signups} sign-ups) so far')
+
+        total_signups = total_events = 0
+        for signups, events in purge_signups(signup_horizon, batch_size=options['batch_size'] * 10,
+                                             pause=options['pause']):
+            total_signups += signups
+            total_events += events
+            self.stdout.write(f'Deleted {total_signups} old sign-ups and anonymised {total_events} events so far')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{"Anonymised" if options["anonymise"] else "Deleted"} {total_members} inactive members; '
+            f'deleted {total_member_signups + total_signups} sign-ups and anonymised {total_events} sign-up events'
+        ))
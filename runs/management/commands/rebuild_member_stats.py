@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth.models import User
+from runs import stats
+
+
+class Command(BaseCommand):
+    help = 'Recomputes member run stats (counts, distance, streaks) from live and archived sign-ups'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Only rebuild this username')
+
+    def handle(self, *args, **options):
+        if options['user']:
+            user = User.objects.filter(username=options['user']).first()
+            if user is None:
+                raise CommandError(f"No user named {options['user']!r}")
+            row = stats.refresh(user.pk)
+            self.stdout.write(self.style.SUCCESS(
+                f'Rebuilt stats for {user.username}: {row.runs_attended} runs attended, {row.km_attended} km'
+            ))
+            return
+        count = stats.rebuild_all()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt stats for {count} members'))
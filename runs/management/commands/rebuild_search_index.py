@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connections
+from runs import search
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the run and member search indexes from the live tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS,
+                            help='Database to rebuild the indexes in')
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        if connection.vendor != 'sqlite':
+            search.install(connection)
+            self.stdout.write(self.style.SUCCESS(
+                f'{connection.vendor} search indexes are maintained by the database; ensured they exist'
+            ))
+            return
+        runs, members = search.rebuild(connection)
+        self.stdout.write(self.style.SUCCESS(f'Indexed {runs} runs and {members} members'))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from runs import analytics
+
+
+class Command(BaseCommand):
+    help = 'Refreshes the club analytics rollups for runs changed since the last refresh'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true',
+                            help='Rebuild every rollup from scratch instead of only changed runs')
+
+    def handle(self, *args, **options):
+        written = analytics.refresh_rollups(full=options['full'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Refreshed {written['runs']} run rollups, {written['venue_months']} venue months "
+            f"and {written['cohorts']} cohort months"
+        ))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from runs.models import SpotHold
+from runs.services import release_expired_holds
+
+
+class Command(BaseCommand):
+    help = 'Deletes lapsed spot holds and offers their places to members waiting for one'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Number of holds to delete per transaction')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Report how many holds have lapsed without changing anything')
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+
+        if options['dry_run']:
+            holds = SpotHold.objects.filter(expires_at__lte=now).count()
+            self.stdout.write(f'Would release {holds} lapsed holds')
+            return
+
+        total = 0
+        for released in release_expired_holds(batch_size=options['batch_size'], now=now):
+            total += released
+            self.stdout.write(f'Released {total} holds so far')
+
+        self.stdout.write(self.style.SUCCESS(f'Released {total} lapsed holds'))
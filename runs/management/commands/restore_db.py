@@ -0,0 +1,44 @@
+import time
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from runs.backup import BackupError, backup_format, import_rows, is_sqlite, restore_sqlite
+
+
+class Command(BaseCommand):
+    help = 'Replaces the database with a backup made by backup_db, once the backup passes its check'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Backup file, compressed or not')
+        parser.add_argument('--database', default='default', help='Database alias to restore into')
+        parser.add_argument('--no-input', action='store_false', dest='interactive',
+                            help='Do not ask for confirmation')
+
+    def handle(self, *args, **options):
+        using, path = options['database'], options['path']
+        try:
+            kind = backup_format(path)
+        except OSError as e:
+            raise CommandError(f'Cannot read {path}: {e}')
+        if kind == 'sqlite' and not is_sqlite(using):
+            raise CommandError('This is an SQLite file backup; restore it into an SQLite database.')
+
+        if options['interactive']:
+            answer = input(f'This replaces everything in the "{using}" database with {path}. Type "yes" to continue: ')
+            if answer != 'yes':
+                raise CommandError('Restore cancelled.')
+
+        start = time.perf_counter()
+        try:
+            if kind == 'sqlite':
+                restore_sqlite(path, using=using)
+                summary = 'restored the database file'
+            else:
+                counts = import_rows(path, using=using)
+                summary = f'restored {sum(counts.values())} rows to {len(counts)} tables'
+        except BackupError as e:
+            raise CommandError(f'Backup failed its check; nothing was restored: {e}')
+        # Cached sessions, member bundles and rosters describe the replaced data.
+        cache.clear()
+
+        self.stdout.write(self.style.SUCCESS(f'{summary.capitalize()} from {path} in {time.perf_counter() - start:.1f}s'))
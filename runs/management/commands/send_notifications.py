@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand
+from runs import notifications
+
+
+class Command(BaseCommand):
+    help = 'Queues tomorrow\'s run reminders and sends pending notification emails'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Maximum number of emails to send per batch')
+        parser.add_argument('--no-reminders', action='store_true',
+                            help='Only send what is already queued')
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep running, sending new notifications as they become due')
+        parser.add_argument('--interval', type=int, default=60,
+                            help='Seconds to wait between batches with --loop')
+
+    def handle(self, *args, **options):
+        while True:
+            if not options['no_reminders']:
+                # Reminders are deduplicated, so re-queuing them each pass is harmless.
+                queued = notifications.enqueue_reminders()
+                if queued:
+                    self.stdout.write(f'Queued {queued} reminders')
+
+            # Drain everything that is due before sleeping.
+            while True:
+                sent, failed = notifications.dispatch(batch_size=options['batch_size'])
+                if sent or failed:
+                    self.stdout.write(self.style.SUCCESS(f'Sent {sent} notifications ({failed} failed)'))
+                if sent + failed < options['batch_size']:
+                    break
+
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,85 @@
+"""
+Cached per-member bundle for authenticated requests.
+
+``AuthenticationMiddleware`` fetches the ``User`` on every request, templates
+showing profile data fetch the ``UserProfile``, and the run list fetches the
+member's sign-ups. ``EmailOrUsernameBackend.get_user`` serves all three from
+one cache entry instead. Together with the ``cached_db`` session engine, a
+member's steady-state page views need no auth-related queries.
+
+The user's permissions are loaded into the bundle too, so menus that check
+``perms`` cost nothing. Permissions granted through a group only show up
+when the bundle expires or the member's groups change.
+
+The bundle is always built from the primary, so a lagging replica can't be
+cached. It is deleted whenever the user, their profile or one of their
+sign-ups is saved or deleted, or their permissions or groups change (see
+``signals.py``). It is deleted again once
+the transaction commits, so a request that rebuilt it in between can't leave
+a stale copy. Paths that write sign-ups in bulk call ``invalidate`` themselves.
+``BUNDLE_VERSION`` is part of the key; bump it when the bundle's shape changes
+so old entries are ignored after a deploy.
+"""
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import SignUp, UserProfile
+from .routers import PRIMARY_DB
+
+BUNDLE_VERSION = 2
+BUNDLE_TIMEOUT = 60 * 60
+
+
+def _key(user_id):
+    return f'runs:member:v{BUNDLE_VERSION}:{user_id}'
+
+
+def _build(user_id):
+    user = User.objects.using(PRIMARY_DB).filter(pk=user_id).first()
+    if user is None:
+        return None
+    # Fills the user's permission caches, which are pickled along with it.
+    user.get_all_permissions()
+    return {
+        'user': user,
+        'profile': UserProfile.objects.using(PRIMARY_DB).filter(user_id=user_id).first(),
+        'signup_run_ids': list(
+            SignUp.objects.using(PRIMARY_DB).filter(user_id=user_id).values_list('run_id', flat=True)
+        ),
+    }
+
+
+def get_member(user_id):
+    """
+    Return the ``User`` with this ID, with its profile and sign-up run IDs
+    attached, or None if there is no such user.
+    """
+    key = _key(user_id)
+    bundle = cache.get(key)
+    if bundle is None:
+        bundle = _build(user_id)
+        if bundle is None:
+            return None
+        cache.set(key, bundle, BUNDLE_TIMEOUT)
+    user = bundle['user']
+    # Makes user.profile free (and raise DoesNotExist, as usual, when missing).
+    User.profile.related.set_cached_value(user, bundle['profile'])
+    user.signup_run_ids = bundle['signup_run_ids']
+    return user
+
+
+def signup_run_ids(user):
+    """Return the IDs of the runs ``user`` is signed up for, from the bundle when loaded."""
+    if hasattr(user, 'signup_run_ids'):
+        return user.signup_run_ids
+    return list(SignUp.objects.filter(user=user).values_list('run_id', flat=True))
+
+
+def invalidate(*user_ids):
+    """Drop the cached bundles of these users, now and again after commit."""
+    keys = [_key(user_id) for user_id in user_ids]
+    if not keys:
+        return
+    cache.delete_many(keys)
+    transaction.on_commit(lambda: cache.delete_many(keys))
@@ -0,0 +1,150 @@
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.http import FileResponse
+from django.middleware.gzip import GZipMiddleware
+from django.utils._os import safe_join
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli is optional
+    brotli = None
+
+# Fingerprinted files never change, so browsers may keep them for a year.
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+# Unhashed names (e.g. manifest.json) may change on deploy.
+SHORT_CACHE_CONTROL = 'public, max-age=300'
+
+# ManifestStaticFilesStorage inserts a 12 character content hash before the
+# extension, e.g. css/site.55e7cbb9ba48.css.
+FINGERPRINT_RE = re.compile(r'\.[0-9a-f]{12}\.[^/]+$')
+
+# Responses worth compressing on the fly; images and fonts already are.
+COMPRESSIBLE_TYPES = {
+    'text/html', 'text/css', 'text/csv', 'text/plain', 'text/javascript',
+    'application/javascript', 'application/json', 'image/svg+xml',
+}
+ACCEPTS_BR_RE = re.compile(r'\bbr\b')
+# Brotli's quality 11 is for build-time assets; 5 compresses better than gzip at similar speed.
+BROTLI_QUALITY = 5
+
+
+class PrecompressedStaticMiddleware(MiddlewareMixin):
+    """
+    Serve collected static files from STATIC_ROOT with precompressed variants.
+
+    Picks the ``.br`` or ``.gz`` file written by collectstatic when the client
+    accepts it, and marks fingerprinted files as immutable. Only active when
+    DEBUG is off; during development runserver serves static files itself.
+    A front-end web server (see docs/OCI_DEPLOYMENT_GUIDE.md) can do the same
+    job, in which case these requests never reach Django.
+    """
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.prefix = '/' + settings.STATIC_URL.lstrip('/')
+
+    def process_request(self, request):
+        if settings.DEBUG or not settings.STATIC_ROOT:
+            return None
+        if request.method not in ('GET', 'HEAD') or not request.path.startswith(self.prefix):
+            return None
+
+        name = request.path[len(self.prefix):]
+        try:
+            path = safe_join(str(settings.STATIC_ROOT), name)
+        except Exception:
+            return None
+        if not os.path.isfile(path):
+            return None
+
+        return self.serve(request, name, path)
+
+    def serve(self, request, name, path):
+        accept_encoding = request.META.get('HTTP_ACCEPT_ENCODING', '')
+        encoding = None
+        for candidate, suffix in (('br', '.br'), ('gzip', '.gz')):
+            if candidate in accept_encoding and os.path.isfile(path + suffix):
+                encoding, path = candidate, path + suffix
+                break
+
+        content_type, _ = mimetypes.guess_type(name)
+        response = FileResponse(open(path, 'rb'), content_type=content_type or 'application/octet-stream')
+        if encoding:
+            response['Content-Encoding'] = encoding
+        response['Vary'] = 'Accept-Encoding'
+        response['Cache-Control'] = (
+            IMMUTABLE_CACHE_CONTROL if FINGERPRINT_RE.search(name) else SHORT_CACHE_CONTROL
+        )
+        return response
+
+
+def _reflects_input(request):
+    """Check whether the request carries free text a page could echo back."""
+    match = getattr(request, 'resolver_match', None)
+    if match is None or 'admin' in match.app_names:
+        # Unmatched paths, and the admin's object IDs, are free text.
+        return True
+    return bool(request.META.get('QUERY_STRING')) or request.method not in ('GET', 'HEAD')
+
+
+def _carries_secrets(request, response):
+    """Check whether a response is for one member, so holds their personal details."""
+    if 'private' in response.get('Cache-Control', ''):
+        return True
+    user = getattr(request, 'user', None)
+    return user is not None and user.is_authenticated
+
+
+def _breach_exposed(request, response):
+    """Check whether a response may put request input next to a member's secrets, and so must not be compressed."""
+    return _reflects_input(request) and _carries_secrets(request, response)
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """
+    Compress text responses with brotli, when installed and accepted, or gzip.
+
+    Streaming responses, and clients that don't accept brotli, get Django's
+    gzip handling, which also weakens the ETag as compression requires.
+    Responses that are already encoded, such as precompressed static files,
+    pass through untouched.
+
+    BREACH: compressing a secret alongside text an attacker can influence
+    leaks the secret through the response size. Both must be present, so
+    only responses that are for one member (logged in, or marked
+    ``Cache-Control: private``) *and* whose request has a query string or a
+    body are sent uncompressed, e.g. a member's search results. The site's
+    own URL patterns take only IDs, so their paths carry no free text; the
+    admin's and unmatched paths do. The plain run list, rosters and My Runs
+    are compressed. The CSRF token in
+    every form is masked with a fresh random pad per response by Django, so
+    compression doesn't reveal it either.
+    """
+
+    def process_response(self, request, response):
+        content_type = response.get('Content-Type', '').split(';')[0].strip()
+        if content_type not in COMPRESSIBLE_TYPES or _breach_exposed(request, response):
+            return response
+        if brotli is None or response.streaming or not ACCEPTS_BR_RE.search(
+            request.META.get('HTTP_ACCEPT_ENCODING', '')
+        ):
+            return super().process_response(request, response)
+
+        if len(response.content) < 200 or response.has_header('Content-Encoding'):
+            return response
+        patch_vary_headers(response, ('Accept-Encoding',))
+        compressed = brotli.compress(response.content, quality=BROTLI_QUALITY)
+        if len(compressed) >= len(response.content):
+            return response
+        response.content = compressed
+        response.headers['Content-Length'] = str(len(compressed))
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = 'br'
+        return response
@@ -0,0 +1,56 @@
+# Generated by Django 4.2.30 on 2026-10-19 05:23
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('runs', '0003_notifications'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='run',
+            name='allocation',
+            field=models.CharField(choices=[('fcfs', 'First come, first served'), ('ballot', 'Ballot')], default='fcfs', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='run',
+            name='ballot_closes_at',
+            field=models.DateTimeField(blank=True, help_text='When ballot entries close and places are drawn', null=True),
+        ),
+        migrations.AddField(
+            model_name='run',
+            name='ballot_drawn_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='run',
+            name='ballot_priority',
+            field=models.BooleanField(default=False, help_text='Give members who have attended fewer runs a better chance in the ballot'),
+        ),
+        migrations.AddField(
+            model_name='run',
+            name='ballot_seed',
+            field=models.CharField(blank=True, help_text='Random seed used for the draw, kept so it can be reproduced', max_length=64),
+        ),
+        migrations.CreateModel(
+            name='BallotEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entered_at', models.DateTimeField(auto_now_add=True)),
+                ('reserve_position', models.PositiveIntegerField(blank=True, help_text='Place on the reserve list after the draw', null=True)),
+                ('run', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='runs.run')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'ballot entries',
+                'ordering': ['reserve_position', 'entered_at'],
+                'unique_together': {('run', 'user')},
+            },
+        ),
+    ]
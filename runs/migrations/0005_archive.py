@@ -0,0 +1,47 @@
+# Generated by Django 4.2.30 on 2026-10-19 05:26
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('runs', '0004_ballot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedRun',
+            fields=[
+                ('id', models.BigIntegerField(help_text='ID the run had while live', primary_key=True, serialize=False)),
+                ('date', models.DateField(db_index=True)),
+                ('time', models.TimeField()),
+                ('meeting_place', models.CharField(max_length=200)),
+                ('venue', models.CharField(max_length=200)),
+                ('length_km', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('max_capacity', models.PositiveIntegerField()),
+                ('allocation', models.CharField(choices=[('fcfs', 'First come, first served'), ('ballot', 'Ballot')], default='fcfs', max_length=10)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['date', 'time'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedSignUp',
+            fields=[
+                ('id', models.BigIntegerField(help_text='ID the sign-up had while live', primary_key=True, serialize=False)),
+                ('signed_up_at', models.DateTimeField()),
+                ('attended', models.BooleanField(default=False)),
+                ('run', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='runs.archivedrun')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['signed_up_at'],
+                'unique_together': {('user', 'run')},
+            },
+        ),
+    ]
@@ -0,0 +1,24 @@
+from django.db import migrations
+
+from runs import search
+
+
+def install_search(apps, schema_editor):
+    search.install(schema_editor.connection)
+    search.rebuild(schema_editor.connection)
+
+
+def uninstall_search(apps, schema_editor):
+    search.uninstall(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('runs', '0005_archive'),
+    ]
+
+    operations = [
+        migrations.RunPython(install_search, uninstall_search),
+    ]
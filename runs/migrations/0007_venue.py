@@ -0,0 +1,38 @@
+# Generated by Django 4.2.30 on 2026-10-19 05:33
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('runs', '0006_search'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='run',
+            name='venue',
+            field=models.CharField(blank=True, help_text='Venue name, filled in from the location when one is set', max_length=200),
+        ),
+        migrations.CreateModel(
+            name='Venue',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200, unique=True)),
+                ('latitude', models.FloatField(blank=True, help_text='Decimal degrees, e.g. 51.5362', null=True)),
+                ('longitude', models.FloatField(blank=True, help_text='Decimal degrees, e.g. -0.0410', null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['name'],
+                'indexes': [models.Index(fields=['latitude', 'longitude'], name='venue_bbox_idx')],
+            },
+        ),
+        migrations.AddField(
+            model_name='run',
+            name='location',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='runs', to='runs.venue'),
+        ),
+    ]
@@ -0,0 +1,48 @@
+import re
+import unicodedata
+from collections import Counter, defaultdict
+
+from django.db import migrations
+
+
+def venue_key(name):
+    """Normalise a venue string so spellings that differ only in case, accents, punctuation or spacing match."""
+    name = unicodedata.normalize('NFKD', name).encode('ascii', 'ignore').decode()
+    name = re.sub(r'[^\w\s]', '', name.casefold())
+    return ' '.join(name.split())
+
+
+def create_venues(apps, schema_editor):
+    """Create one Venue per distinct venue string and point every run at it."""
+    Run = apps.get_model('runs', 'Run')
+    Venue = apps.get_model('runs', 'Venue')
+
+    spellings = defaultdict(Counter)
+    run_ids = defaultdict(list)
+    for pk, name in Run.objects.values_list('pk', 'venue'):
+        if name.strip():
+            key = venue_key(name)
+            spellings[key][' '.join(name.split())] += 1
+            run_ids[key].append(pk)
+
+    for key, counter in spellings.items():
+        # The most common spelling wins; ties go to the alphabetically first.
+        canonical = min(counter, key=lambda name: (-counter[name], name))
+        venue, _ = Venue.objects.get_or_create(name=canonical)
+        Run.objects.filter(pk__in=run_ids[key]).update(location=venue, venue=canonical)
+
+
+def clear_venues(apps, schema_editor):
+    Run = apps.get_model('runs', 'Run')
+    Run.objects.update(location=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('runs', '0007_venue'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_venues, clear_venues),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.30 on 2026-10-19 05:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('runs', '0008_dedupe_venues'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='run',
+            index=models.Index(fields=['date', 'time'], name='run_date_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='run',
+            index=models.Index(fields=['length_km', 'date'], name='run_length_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='run',
+            index=models.Index(fields=['location', 'date'], name='run_location_date_idx'),
+        ),
+    ]
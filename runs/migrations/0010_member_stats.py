@@ -0,0 +1,31 @@
+# Generated by Django 4.2.30 on 2026-10-19 05:46
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('runs', '0009_run_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MemberStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='run_stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('runs_signed_up', models.PositiveIntegerField(default=0)),
+                ('runs_attended', models.PositiveIntegerField(default=0)),
+                ('km_attended', models.DecimalField(decimal_places=2, default=0, max_digits=9)),
+                ('current_streak', models.PositiveIntegerField(default=0, help_text='Past runs attended in a row, most recent first')),
+                ('last_attended_on', models.DateField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'member stats',
+            },
+        ),
+    ]
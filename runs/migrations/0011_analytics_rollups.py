@@ -0,0 +1,89 @@
+# Generated by Django 4.2.30 on 2026-10-19 05:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('runs', '0010_member_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CohortRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cohort', models.DateField(help_text='First day of the month the members joined')),
+                ('month', models.DateField(help_text='First day of the month they ran in')),
+                ('members', models.PositiveIntegerField(help_text='Members of the cohort who attended at least one run')),
+                ('runs_attended', models.PositiveIntegerField()),
+            ],
+            options={
+                'ordering': ['cohort', 'month'],
+            },
+        ),
+        migrations.CreateModel(
+            name='RollupWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('processed_until', models.DateTimeField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RunRollup',
+            fields=[
+                ('run_id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('date', models.DateField()),
+                ('month', models.DateField(help_text="First day of the run's month")),
+                ('venue', models.CharField(max_length=200)),
+                ('length_km', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('max_capacity', models.PositiveIntegerField()),
+                ('signups', models.PositiveIntegerField()),
+                ('attended', models.PositiveIntegerField()),
+            ],
+            options={
+                'ordering': ['-date'],
+            },
+        ),
+        migrations.CreateModel(
+            name='VenueMonthRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('venue', models.CharField(max_length=200)),
+                ('month', models.DateField(help_text='First day of the month')),
+                ('runs', models.PositiveIntegerField()),
+                ('places', models.PositiveIntegerField()),
+                ('signups', models.PositiveIntegerField()),
+                ('attended', models.PositiveIntegerField()),
+                ('km_attended', models.DecimalField(decimal_places=2, max_digits=12)),
+            ],
+            options={
+                'verbose_name': 'club analytics',
+                'verbose_name_plural': 'club analytics',
+                'ordering': ['-month', 'venue'],
+            },
+        ),
+        migrations.AddField(
+            model_name='run',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, help_text="Also bumped when the run's sign-ups change"),
+        ),
+        migrations.AddIndex(
+            model_name='run',
+            index=models.Index(fields=['updated_at'], name='run_updated_at_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='venuemonthrollup',
+            unique_together={('venue', 'month')},
+        ),
+        migrations.AddIndex(
+            model_name='runrollup',
+            index=models.Index(fields=['month', 'venue'], name='runrollup_month_venue_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='cohortrollup',
+            unique_together={('cohort', 'month')},
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.30 on 2026-10-19 05:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('runs', '0011_analytics_rollups'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='run',
+            options={'ordering': ['date', 'time'], 'permissions': [('view_roster', 'Can view run rosters with emergency contacts')]},
+        ),
+        migrations.AlterField(
+            model_name='run',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, help_text="Also bumped when the run's sign-ups or their contact details change"),
+        ),
+    ]
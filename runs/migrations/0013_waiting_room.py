@@ -0,0 +1,23 @@
+# Generated by Django 4.2.30 on 2026-10-19 06:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('runs', '0012_roster_permission'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='run',
+            name='admission_rate',
+            field=models.PositiveSmallIntegerField(default=5, help_text='Members let through the waiting room per second'),
+        ),
+        migrations.AddField(
+            model_name='run',
+            name='opens_at',
+            field=models.DateTimeField(blank=True, help_text='When sign-ups open. Members arriving around then queue in a waiting room', null=True),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 4.2.30 on 2026-10-19 06:06
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+def log_existing_signups(apps, schema_editor):
+    """Start the log with the sign-ups that already exist, live and archived (earlier cancellations are lost)."""
+    SignUpEvent = apps.get_model('runs', 'SignUpEvent')
+    for model_name in ('SignUp', 'ArchivedSignUp'):
+        rows = apps.get_model('runs', model_name).objects.values_list('run_id', 'user_id', 'signed_up_at')
+        SignUpEvent.objects.bulk_create(
+            (SignUpEvent(run_id=run_id, user_id=user_id, change=1, at=at) for run_id, user_id, at in rows.iterator()),
+            batch_size=1000,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('runs', '0013_waiting_room'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SignUpEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('run_id', models.BigIntegerField()),
+                ('user_id', models.IntegerField(blank=True, null=True)),
+                ('change', models.SmallIntegerField(choices=[(1, 'Signed up'), (-1, 'Cancelled')])),
+                ('at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'ordering': ['at', 'pk'],
+                'indexes': [models.Index(fields=['run_id', 'at'], name='signupevent_run_at_idx')],
+            },
+        ),
+        migrations.RunPython(log_existing_signups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.30 on 2026-10-19 06:39
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('runs', '0014_signup_events'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SpotHold',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('expires_at', models.DateTimeField()),
+                ('run', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='runs.run')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['run', 'expires_at'], name='spothold_run_expires_idx'), models.Index(fields=['expires_at'], name='spothold_expires_idx')],
+                'unique_together': {('run', 'user')},
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-19 07:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('runs', '0015_spot_holds'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='claimed_by',
+            field=models.CharField(blank=True, help_text='The sender run that last claimed this notice', max_length=32),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.30 on 2026-10-19 07:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('runs', '0016_notification_claim'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='signupevent',
+            index=models.Index(fields=['user_id'], name='signupevent_user_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='signupevent',
+            index=models.Index(condition=models.Q(('user_id__isnull', False)), fields=['at'], name='signupevent_named_at_idx'),
+        ),
+    ]
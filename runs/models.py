@@ -1,6 +1,8 @@
 from django.db import models
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import User
 from django.core.exceptions import ValidationError
+from django.utils import timezone
 
 
 class UserProfile(models.Model):
@@ -17,32 +19,136 @@ class UserProfile(models.Model):
         return f"{self.user.username}'s Profile"
 
 
+class Venue(models.Model):
+    """A place runs start from, with coordinates for finding runs nearby."""
+    name = models.CharField(max_length=200, unique=True)
+    latitude = models.FloatField(null=True, blank=True, help_text="Decimal degrees, e.g. 51.5362")
+    longitude = models.FloatField(null=True, blank=True, help_text="Decimal degrees, e.g. -0.0410")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['name']
+        indexes = [
+            models.Index(fields=['latitude', 'longitude'], name='venue_bbox_idx'),
+        ]
+
+    def __str__(self):
+        return self.name
+
+    def save(self, *args, **kwargs):
+        """Save, and carry a rename through to the runs held here."""
+        super().save(*args, **kwargs)
+        self.runs.exclude(venue=self.name).update(venue=self.name, updated_at=timezone.now())
+
+
+class RunQuerySet(models.QuerySet):
+    """QuerySet for runs."""
+
+    def with_signup_counts(self):
+        """Annotate each run with its sign-up and active hold counts so capacity checks need no extra queries."""
+        # Expired holds simply stop counting here; release_expired_holds deletes them later.
+        active_holds = (
+            SpotHold.objects.filter(run=models.OuterRef('pk'), expires_at__gt=timezone.now())
+            .order_by().values('run').annotate(count=models.Count('pk')).values('count')
+        )
+        queryset = self.annotate(
+            signup_count=models.Count('signup'),
+            hold_count=Coalesce(models.Subquery(active_holds), 0),
+        )
+        if not queryset.query.order_by:
+            # Meta.ordering is not applied to GROUP BY queries; keep runs in date order.
+            queryset = queryset.order_by(*self.model._meta.ordering)
+        return queryset
+
+
 class Run(models.Model):
     """Model representing a running event."""
+    FIRST_COME = 'fcfs'
+    BALLOT = 'ballot'
+    ALLOCATION_CHOICES = [
+        (FIRST_COME, 'First come, first served'),
+        (BALLOT, 'Ballot'),
+    ]
+
     date = models.DateField()
     time = models.TimeField()
     meeting_place = models.CharField(max_length=200)
-    venue = models.CharField(max_length=200)
+    location = models.ForeignKey(Venue, null=True, blank=True, on_delete=models.PROTECT, related_name='runs')
+    venue = models.CharField(max_length=200, blank=True, help_text="Venue name, filled in from the location when one is set")
     length_km = models.DecimalField(max_digits=5, decimal_places=2, help_text="Length in kilometers")
     max_capacity = models.PositiveIntegerField(help_text="Maximum number of participants")
+    allocation = models.CharField(max_length=10, choices=ALLOCATION_CHOICES, default=FIRST_COME)
+    ballot_closes_at = models.DateTimeField(null=True, blank=True, help_text="When ballot entries close and places are drawn")
+    ballot_priority = models.BooleanField(default=False, help_text="Give members who have attended fewer runs a better chance in the ballot")
+    ballot_seed = models.CharField(max_length=64, blank=True, help_text="Random seed used for the draw, kept so it can be reproduced")
+    ballot_drawn_at = models.DateTimeField(null=True, blank=True)
+    opens_at = models.DateTimeField(null=True, blank=True, help_text="When sign-ups open. Members arriving around then queue in a waiting room")
+    admission_rate = models.PositiveSmallIntegerField(default=5, help_text="Members let through the waiting room per second")
+    updated_at = models.DateTimeField(auto_now=True, help_text="Also bumped when the run's sign-ups or their contact details change")
+
+    objects = RunQuerySet.as_manager()
     
     class Meta:
         ordering = ['date', 'time']
+        indexes = [
+            # Serves the default ordering and date-range filters without a sort.
+            models.Index(fields=['date', 'time'], name='run_date_time_idx'),
+            models.Index(fields=['length_km', 'date'], name='run_length_date_idx'),
+            models.Index(fields=['location', 'date'], name='run_location_date_idx'),
+            # Finds runs changed since the analytics rollups were last refreshed.
+            models.Index(fields=['updated_at'], name='run_updated_at_idx'),
+        ]
+        permissions = [
+            ('view_roster', 'Can view run rosters with emergency contacts'),
+        ]
     
     def __str__(self):
         return f"{self.venue} - {self.date} at {self.time} ({self.length_km}km)"
+
+    def clean(self):
+        """Require a venue, either as a location or as free text."""
+        if self.location_id is None and not self.venue.strip():
+            raise ValidationError({'location': 'Choose a location or enter a venue name.'})
+
+    def save(self, *args, **kwargs):
+        """Keep the venue name in step with the location."""
+        if self.location_id is not None:
+            self.venue = self.location.name
+        super().save(*args, **kwargs)
     
     def get_signups_count(self):
         """Return the number of users signed up for this run."""
+        if hasattr(self, 'signup_count'):
+            # Annotated by RunQuerySet.with_signup_counts()
+            return self.signup_count
         return self.signup_set.count()
     
+    def _places_taken(self):
+        """Return sign-ups plus active holds, from the annotations or else one query."""
+        if hasattr(self, 'signup_count') and hasattr(self, 'hold_count'):
+            return self.signup_count + self.hold_count
+        counts = Run.objects.with_signup_counts().filter(pk=self.pk).values_list('signup_count', 'hold_count').first()
+        return sum(counts or (0, 0))
+
     def is_full(self):
-        """Check if the run has reached maximum capacity."""
-        return self.get_signups_count() >= self.max_capacity
+        """Check if the run's places are all taken or held."""
+        return self._places_taken() >= self.max_capacity
     
+    def signups_open(self):
+        """Check if the run's sign-ups have opened."""
+        return self.opens_at is None or timezone.now() >= self.opens_at
+
+    def ballot_pending(self):
+        """Check if places on this run are still waiting to be drawn by ballot."""
+        return self.allocation == self.BALLOT and self.ballot_drawn_at is None
+
+    def ballot_open(self):
+        """Check if members can currently enter this run's ballot."""
+        return self.ballot_pending() and (self.ballot_closes_at is None or timezone.now() < self.ballot_closes_at)
+
     def available_spots(self):
-        """Return the number of available spots."""
-        return max(0, self.max_capacity - self.get_signups_count())
+        """Return the number of available spots, less any held."""
+        return max(0, self.max_capacity - self._places_taken())
 
 
 class SignUp(models.Model):
@@ -69,3 +175,265 @@ class SignUp(models.Model):
         """Override save to run validation."""
         self.clean()
         super().save(*args, **kwargs)
+
+
+class SpotHold(models.Model):
+    """
+    A place set aside for a member for a short while, until they confirm or it expires.
+
+    Active holds count against capacity alongside sign-ups. Expired holds
+    stop counting at once and are deleted by ``release_expired_holds``.
+    """
+    run = models.ForeignKey(Run, on_delete=models.CASCADE)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ['run', 'user']
+        indexes = [
+            # Counts a run's active holds without touching lapsed ones.
+            models.Index(fields=['run', 'expires_at'], name='spothold_run_expires_idx'),
+            # Lets the sweep find expired holds without a scan.
+            models.Index(fields=['expires_at'], name='spothold_expires_idx'),
+        ]
+
+    def __str__(self):
+        return f"Place on {self.run} held for {self.user.username} until {self.expires_at}"
+
+
+class SignUpEvent(models.Model):
+    """
+    A sign-up or cancellation, appended to the log as it happens.
+
+    Holds plain IDs rather than foreign keys so the history survives the run
+    being archived or deleted. Rows are never changed once written.
+    """
+    SIGNED_UP = 1
+    CANCELLED = -1
+    CHANGE_CHOICES = [
+        (SIGNED_UP, 'Signed up'),
+        (CANCELLED, 'Cancelled'),
+    ]
+
+    run_id = models.BigIntegerField()
+    user_id = models.IntegerField(null=True, blank=True)
+    change = models.SmallIntegerField(choices=CHANGE_CHOICES)
+    at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['at', 'pk']
+        indexes = [
+            # Serves a run's timeline in order without touching the rest of the log.
+            models.Index(fields=['run_id', 'at'], name='signupevent_run_at_idx'),
+            # Lets retention find a departed member's events.
+            models.Index(fields=['user_id'], name='signupevent_user_idx'),
+            # Old events not yet anonymised; rows leave it as retention clears them.
+            models.Index(
+                fields=['at'], condition=models.Q(user_id__isnull=False), name='signupevent_named_at_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.get_change_display()}: member {self.user_id} on run {self.run_id} at {self.at}"
+
+    def save(self, *args, **kwargs):
+        """Refuse to change a logged event."""
+        if not self._state.adding:
+            raise ValueError('Sign-up events are append-only.')
+        super().save(*args, **kwargs)
+
+
+class ArchivedRun(models.Model):
+    """A past run moved out of the live tables by the archive_runs command."""
+    id = models.BigIntegerField(primary_key=True, help_text="ID the run had while live")
+    date = models.DateField(db_index=True)
+    time = models.TimeField()
+    meeting_place = models.CharField(max_length=200)
+    venue = models.CharField(max_length=200)
+    length_km = models.DecimalField(max_digits=5, decimal_places=2)
+    max_capacity = models.PositiveIntegerField()
+    allocation = models.CharField(max_length=10, choices=Run.ALLOCATION_CHOICES, default=Run.FIRST_COME)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['date', 'time']
+
+    def __str__(self):
+        return f"{self.venue} - {self.date} at {self.time} ({self.length_km}km)"
+
+
+class ArchivedSignUp(models.Model):
+    """A sign-up to an archived run."""
+    id = models.BigIntegerField(primary_key=True, help_text="ID the sign-up had while live")
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    run = models.ForeignKey(ArchivedRun, on_delete=models.CASCADE)
+    signed_up_at = models.DateTimeField()
+    attended = models.BooleanField(default=False)
+
+    class Meta:
+        unique_together = ['user', 'run']
+        ordering = ['signed_up_at']
+
+    def __str__(self):
+        return f"{self.user.username} - {self.run}"
+
+
+class MemberStats(models.Model):
+    """
+    Running totals for a member's history, kept up to date as sign-ups change.
+
+    Spans live and archived sign-ups. Rebuild with
+    ``python manage.py rebuild_member_stats``.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='run_stats')
+    runs_signed_up = models.PositiveIntegerField(default=0)
+    runs_attended = models.PositiveIntegerField(default=0)
+    km_attended = models.DecimalField(max_digits=9, decimal_places=2, default=0)
+    current_streak = models.PositiveIntegerField(default=0, help_text="Past runs attended in a row, most recent first")
+    last_attended_on = models.DateField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = 'member stats'
+
+    def __str__(self):
+        return f"{self.user.username}: {self.runs_attended} runs, {self.km_attended} km"
+
+
+class RunRollup(models.Model):
+    """Sign-up and attendance totals for one run, live or archived, for analytics."""
+    run_id = models.BigIntegerField(primary_key=True)
+    date = models.DateField()
+    month = models.DateField(help_text="First day of the run's month")
+    venue = models.CharField(max_length=200)
+    length_km = models.DecimalField(max_digits=5, decimal_places=2)
+    max_capacity = models.PositiveIntegerField()
+    signups = models.PositiveIntegerField()
+    attended = models.PositiveIntegerField()
+
+    class Meta:
+        ordering = ['-date']
+        indexes = [
+            models.Index(fields=['month', 'venue'], name='runrollup_month_venue_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.venue} - {self.date}"
+
+    def fill_rate(self):
+        """Return sign-ups as a fraction of places."""
+        return self.signups / self.max_capacity if self.max_capacity else 0
+
+
+class VenueMonthRollup(models.Model):
+    """Totals for the runs held at one venue in one month."""
+    venue = models.CharField(max_length=200)
+    month = models.DateField(help_text="First day of the month")
+    runs = models.PositiveIntegerField()
+    places = models.PositiveIntegerField()
+    signups = models.PositiveIntegerField()
+    attended = models.PositiveIntegerField()
+    km_attended = models.DecimalField(max_digits=12, decimal_places=2)
+
+    class Meta:
+        ordering = ['-month', 'venue']
+        unique_together = ['venue', 'month']
+        verbose_name = 'club analytics'
+        verbose_name_plural = 'club analytics'
+
+    def __str__(self):
+        return f"{self.venue} - {self.month:%b %Y}"
+
+
+class CohortRollup(models.Model):
+    """How many members who joined in ``cohort`` attended runs in ``month``."""
+    cohort = models.DateField(help_text="First day of the month the members joined")
+    month = models.DateField(help_text="First day of the month they ran in")
+    members = models.PositiveIntegerField(help_text="Members of the cohort who attended at least one run")
+    runs_attended = models.PositiveIntegerField()
+
+    class Meta:
+        ordering = ['cohort', 'month']
+        unique_together = ['cohort', 'month']
+
+    def __str__(self):
+        return f"Joined {self.cohort:%b %Y}, ran {self.month:%b %Y}"
+
+
+class RollupWatermark(models.Model):
+    """How far ``refresh_rollups`` has processed run changes."""
+    name = models.CharField(max_length=50, unique=True)
+    processed_until = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.name}: {self.processed_until}"
+
+
+class BallotEntry(models.Model):
+    """A member's entry in a run's ballot, kept as a reserve if they miss out."""
+    run = models.ForeignKey(Run, on_delete=models.CASCADE)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    entered_at = models.DateTimeField(auto_now_add=True)
+    reserve_position = models.PositiveIntegerField(null=True, blank=True, help_text="Place on the reserve list after the draw")
+
+    class Meta:
+        unique_together = ['run', 'user']
+        ordering = ['reserve_position', 'entered_at']
+        verbose_name_plural = 'ballot entries'
+
+    def __str__(self):
+        return f"{self.user.username} in ballot for {self.run}"
+
+
+class SpotAlert(models.Model):
+    """A member's request to be told when a place opens up on a full run."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    run = models.ForeignKey(Run, on_delete=models.CASCADE)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ['user', 'run']
+
+    def __str__(self):
+        return f"{self.user.username} watching {self.run}"
+
+
+class Notification(models.Model):
+    """An outbound email waiting for the send_notifications worker."""
+    REMINDER = 'reminder'
+    SPOT_OPENED = 'spot_opened'
+    KIND_CHOICES = [
+        (REMINDER, 'Run reminder'),
+        (SPOT_OPENED, 'Spot opened'),
+    ]
+
+    PENDING = 'pending'
+    SENT = 'sent'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (SENT, 'Sent'),
+        (FAILED, 'Failed'),
+    ]
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    run = models.ForeignKey(Run, on_delete=models.CASCADE)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    dedup_key = models.CharField(max_length=100, unique=True, help_text="Stops the same notice being queued twice")
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    claimed_by = models.CharField(max_length=32, blank=True, help_text="The sender run that last claimed this notice")
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='notification_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} for {self.user.username} - {self.run}"
@@ -0,0 +1,190 @@
+"""
+Outbound email notifications.
+
+Requests only ever insert ``Notification`` rows; the ``send_notifications``
+management command delivers them. It groups due notifications by run so each
+message body is rendered once per run, and sends everything through a single
+SMTP connection, retrying failures with exponential backoff.
+
+Each sender run claims its batch before sending, so several senders never
+send the same email twice. A claim is a lease: if a sender dies mid-batch,
+its notices come due again after ``CLAIM_TIMEOUT``. A reminder is withdrawn
+when its sign-up is cancelled. The run's deletion removes all of its
+notices.
+"""
+import logging
+import uuid
+from datetime import timedelta
+from itertools import groupby
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from .models import Notification, Run, SignUp, SpotAlert
+
+logger = logging.getLogger(__name__)
+
+# Give up on a notification after this many failed sends.
+MAX_ATTEMPTS = 5
+
+# How long a claimed batch is left to its sender before others may take it.
+CLAIM_TIMEOUT = timedelta(minutes=10)
+
+SUBJECTS = {
+    Notification.REMINDER: 'Reminder: {run.venue} tomorrow at {time}',
+    Notification.SPOT_OPENED: 'A place has opened up: {run.venue} on {date}',
+}
+
+TEMPLATES = {
+    Notification.REMINDER: 'runs/email/run_reminder.txt',
+    Notification.SPOT_OPENED: 'runs/email/spot_opened.txt',
+}
+
+
+def enqueue_spot_opened(run_id):
+    """
+    Queue "a spot opened" notices for everyone watching a run with space.
+
+    Alerts are one-shot: they are removed once their notice is queued.
+    """
+    with transaction.atomic():
+        run = Run.objects.with_signup_counts().filter(pk=run_id).first()
+        if run is None or run.is_full():
+            return 0
+        alerts = list(SpotAlert.objects.filter(run=run).select_for_update())
+        if not alerts:
+            return 0
+        Notification.objects.bulk_create([
+            Notification(
+                kind=Notification.SPOT_OPENED,
+                user_id=alert.user_id,
+                run=run,
+                dedup_key=f'{Notification.SPOT_OPENED}:{alert.pk}',
+            )
+            for alert in alerts
+        ], ignore_conflicts=True)
+        SpotAlert.objects.filter(pk__in=[alert.pk for alert in alerts]).delete()
+    return len(alerts)
+
+
+def enqueue_reminders(day=None):
+    """Queue reminders for every sign-up to a run on ``day`` (default: tomorrow)."""
+    day = day or timezone.localdate() + timedelta(days=1)
+    already_queued = Notification.objects.filter(
+        kind=Notification.REMINDER, run=OuterRef('run'), user=OuterRef('user'),
+    )
+    signups = (
+        SignUp.objects
+        .filter(run__date=day)
+        .exclude(Exists(already_queued))
+        .values_list('user_id', 'run_id')
+    )
+    return len(Notification.objects.bulk_create([
+        Notification(
+            kind=Notification.REMINDER,
+            user_id=user_id,
+            run_id=run_id,
+            dedup_key=f'{Notification.REMINDER}:{run_id}:{user_id}',
+        )
+        for user_id, run_id in signups
+    ], ignore_conflicts=True))
+
+
+def withdraw_reminder(user_id, run_id):
+    """Drop a member's unsent reminder for a run they are no longer signed up for."""
+    Notification.objects.filter(
+        kind=Notification.REMINDER, status=Notification.PENDING, user_id=user_id, run_id=run_id,
+    ).delete()
+
+
+def _claim(batch_size, now):
+    """Lease up to ``batch_size`` due notifications to this sender and return them, grouped by run."""
+    token = uuid.uuid4().hex
+    with transaction.atomic():
+        ids = list(
+            Notification.objects.select_for_update(skip_locked=True)
+            .filter(status=Notification.PENDING, next_attempt_at__lte=now)
+            .order_by('run_id', 'kind', 'pk')
+            .values_list('pk', flat=True)[:batch_size]
+        )
+        # The conditions are checked again as rows are updated, so without
+        # row locks (SQLite) a sender that read the same rows gets none of them.
+        Notification.objects.filter(
+            pk__in=ids, status=Notification.PENDING, next_attempt_at__lte=now,
+        ).update(next_attempt_at=now + CLAIM_TIMEOUT, claimed_by=token)
+    return list(
+        Notification.objects.filter(pk__in=ids, claimed_by=token)
+        .select_related('user', 'run')
+        .order_by('run_id', 'kind', 'pk')
+    )
+
+
+def _render(kind, run):
+    subject = SUBJECTS[kind].format(
+        run=run, date=run.date.strftime('%a %d %b'), time=run.time.strftime('%H:%M'),
+    )
+    body = render_to_string(TEMPLATES[kind], {'run': run, 'site_url': settings.SITE_URL})
+    return subject, body
+
+
+def _mark_failed(notification, error, now):
+    notification.attempts += 1
+    notification.last_error = str(error)
+    if notification.attempts >= MAX_ATTEMPTS:
+        notification.status = Notification.FAILED
+    else:
+        notification.next_attempt_at = now + timedelta(minutes=2 ** notification.attempts)
+
+
+def dispatch(batch_size=500, connection=None):
+    """
+    Claim and send due notifications. Returns ``(sent, failed)`` counts.
+
+    Failed sends are retried on a later run with exponential backoff until
+    ``MAX_ATTEMPTS`` is reached.
+    """
+    now = timezone.now()
+    # Reminders whose sign-up went without the usual signal (e.g. raw SQL).
+    Notification.objects.filter(
+        kind=Notification.REMINDER, status=Notification.PENDING, next_attempt_at__lte=now,
+    ).exclude(
+        Exists(SignUp.objects.filter(run=OuterRef('run'), user=OuterRef('user')))
+    ).delete()
+    due = _claim(batch_size, now)
+    if not due:
+        return 0, 0
+
+    sent = failed = 0
+    connection = connection or get_connection()
+    with connection:
+        for (run_id, kind), group in groupby(due, key=lambda n: (n.run_id, n.kind)):
+            group = list(group)
+            subject, body = _render(kind, group[0].run)
+            for notification in group:
+                if not notification.user.email:
+                    notification.status = Notification.FAILED
+                    notification.last_error = 'Member has no email address.'
+                    failed += 1
+                    continue
+                message = EmailMessage(subject, body, to=[notification.user.email], connection=connection)
+                try:
+                    message.send()
+                except Exception as exc:
+                    logger.warning('Sending notification %s failed: %s', notification.pk, exc)
+                    _mark_failed(notification, exc, now)
+                    failed += 1
+                else:
+                    notification.status = Notification.SENT
+                    notification.sent_at = timezone.now()
+                    notification.attempts += 1
+                    sent += 1
+
+    Notification.objects.bulk_update(
+        due, ['status', 'attempts', 'next_attempt_at', 'last_error', 'sent_at'],
+    )
+    return sent, failed
+
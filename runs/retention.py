@@ -0,0 +1,127 @@
+"""
+Data retention: purging inactive members and old sign-up records.
+
+Deleting a ``User`` in one go cascades through their sign-ups, profile, stats
+and alerts in a single transaction; for thousands of stale accounts that
+holds locks long enough to stall live sign-ups. The purges here work in
+batches of ``batch_size`` rows, each in its own short transaction, with an
+optional pause between batches, and yield progress as they go so they can be
+interrupted and resumed safely.
+
+- ``purge_members`` deletes (or anonymises) members who haven't logged in or
+  run since the horizon. Staff accounts are never touched.
+- ``purge_signups`` deletes archived sign-ups to runs before the horizon and
+  drops the member IDs from sign-up events that old. Run totals, rollups and
+  timelines keep their counts.
+"""
+import time
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import CharField, Exists, OuterRef, Q, Value
+from django.db.models.functions import Cast, Concat
+from django.utils import timezone
+
+from . import member_cache
+from .archive import archiving
+from .models import ArchivedSignUp, SignUp, SignUpEvent, UserProfile
+
+# Username given to anonymised members, followed by their ID.
+ANONYMISED_PREFIX = 'anonymised-'
+
+
+def retention_horizon(days):
+    """Return the moment before which records fall outside a ``days``-long retention period."""
+    return timezone.now() - timedelta(days=days)
+
+
+def inactive_members(horizon):
+    """
+    Return members with no login, sign-up or run since ``horizon``.
+
+    Staff, superusers and members already anonymised are left out.
+    """
+    since = horizon.date()
+    recent_signup = SignUp.objects.filter(user=OuterRef('pk')).filter(
+        Q(run__date__gte=since) | Q(signed_up_at__gte=horizon)
+    )
+    recent_archived = ArchivedSignUp.objects.filter(user=OuterRef('pk'), run__date__gte=since)
+    return (
+        User.objects.filter(is_staff=False, is_superuser=False, date_joined__lt=horizon)
+        .filter(Q(last_login__lt=horizon) | Q(last_login__isnull=True))
+        .exclude(username__startswith=ANONYMISED_PREFIX)
+        .exclude(Exists(recent_signup))
+        .exclude(Exists(recent_archived))
+        .order_by('pk')
+    )
+
+
+def _delete_members(user_ids):
+    """Delete members and everything of theirs; returns how many sign-ups went with them."""
+    # Archived sign-ups have no handlers, so this is one plain DELETE ahead of the cascade.
+    archived, _ = ArchivedSignUp.objects.filter(user_id__in=user_ids).delete()
+    # Removing a departed member's past sign-ups isn't a cancellation.
+    token = archiving.set(True)
+    try:
+        signups, _ = SignUp.objects.filter(user_id__in=user_ids).delete()
+        User.objects.filter(pk__in=user_ids).delete()
+    finally:
+        archiving.reset(token)
+    SignUpEvent.objects.filter(user_id__in=user_ids).update(user_id=None)
+    return archived + signups
+
+
+def _anonymise_members(user_ids):
+    """Strip members' personal details, keeping their (now anonymous) run history."""
+    UserProfile.objects.filter(user_id__in=user_ids).delete()
+    User.objects.filter(pk__in=user_ids).update(
+        username=Concat(Value(ANONYMISED_PREFIX), Cast('pk', CharField())),
+        first_name='', last_name='', email='',
+        password=make_password(None), is_active=False,
+    )
+    return 0
+
+
+def purge_members(horizon, batch_size=100, anonymise=False, pause=0):
+    """
+    Delete, or with ``anonymise`` strip the details of, members inactive since ``horizon``.
+
+    Yields ``(members, signups)`` counts for each batch; ``signups`` is how
+    many live and archived sign-ups were deleted along with the members.
+    """
+    purge = _anonymise_members if anonymise else _delete_members
+    while True:
+        with transaction.atomic():
+            user_ids = list(inactive_members(horizon).values_list('pk', flat=True)[:batch_size])
+            if not user_ids:
+                return
+            signups = purge(user_ids)
+            member_cache.invalidate(*user_ids)
+        yield len(user_ids), signups
+        if pause:
+            time.sleep(pause)
+
+
+def purge_signups(horizon, batch_size=1000, pause=0):
+    """
+    Delete archived sign-ups to runs dated before ``horizon`` and anonymise older sign-up events.
+
+    Live sign-ups are left for ``archive_runs`` to move first. Yields
+    ``(signups, events)`` counts for each batch.
+    """
+    old_signups = ArchivedSignUp.objects.filter(run__date__lt=horizon.date()).order_by('pk')
+    old_events = SignUpEvent.objects.filter(at__lt=horizon, user_id__isnull=False).order_by('at', 'pk')
+    while True:
+        with transaction.atomic():
+            signup_ids = list(old_signups.values_list('pk', flat=True)[:batch_size])
+            event_ids = list(old_events.values_list('pk', flat=True)[:batch_size])
+            if not signup_ids and not event_ids:
+                return
+            signups, _ = ArchivedSignUp.objects.filter(pk__in=signup_ids).delete()
+            events = SignUpEvent.objects.filter(pk__in=event_ids).update(user_id=None)
+        yield signups, events
+        if pause:
+            time.sleep(pause)
+
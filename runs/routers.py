@@ -0,0 +1,95 @@
+"""
+Database routing for read-heavy run browsing traffic.
+
+Reads issued while a view decorated with ``replica_reads`` is running go to
+the ``replica`` database alias. Everything else (sign-ups, cancellations,
+admin, sessions) stays on ``default``. After a member writes, their session
+is pinned to the primary for ``REPLICA_PIN_SECONDS`` so they always see
+their own changes even if the replica is lagging.
+"""
+import time
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+
+PRIMARY_DB = 'default'
+REPLICA_DB = 'replica'
+PIN_SESSION_KEY = '_primary_pinned_until'
+
+# Apps whose tables must always be read from the primary. Sessions and users
+# are looked up on every request and must never lag behind a login.
+PRIMARY_ONLY_APPS = {'sessions', 'auth'}
+
+_use_replica = ContextVar('use_replica', default=False)
+
+
+def replica_configured():
+    """Return True if a replica database alias is configured."""
+    return REPLICA_DB in connections.settings
+
+
+def pin_to_primary(request):
+    """Send this member's reads to the primary for a short window."""
+    seconds = getattr(settings, 'REPLICA_PIN_SECONDS', 10)
+    request.session[PIN_SESSION_KEY] = time.time() + seconds
+
+
+def is_pinned(request):
+    """Check whether the request falls inside a read-your-writes window."""
+    session = getattr(request, 'session', None)
+    if session is None:
+        return False
+    return session.get(PIN_SESSION_KEY, 0) > time.time()
+
+
+def replica_reads(view_func):
+    """
+    Decorator for read-only views whose queries may be served by the replica.
+
+    Requests from members inside their read-your-writes window keep reading
+    from the primary.
+    """
+    if iscoroutinefunction(view_func):
+        @wraps(view_func)
+        async def _wrapped_async(request, *args, **kwargs):
+            # Reading the session may hit the database, so do it off the loop.
+            pinned = await sync_to_async(is_pinned)(request)
+            token = _use_replica.set(not pinned)
+            try:
+                return await view_func(request, *args, **kwargs)
+            finally:
+                _use_replica.reset(token)
+        return _wrapped_async
+
+    @wraps(view_func)
+    def _wrapped(request, *args, **kwargs):
+        token = _use_replica.set(not is_pinned(request))
+        try:
+            return view_func(request, *args, **kwargs)
+        finally:
+            _use_replica.reset(token)
+    return _wrapped
+
+
+class PrimaryReplicaRouter:
+    """Route reads from replica-enabled views to the replica alias."""
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label in PRIMARY_ONLY_APPS:
+            return PRIMARY_DB
+        if _use_replica.get() and replica_configured():
+            return REPLICA_DB
+        return PRIMARY_DB
+
+    def db_for_write(self, model, **hints):
+        return PRIMARY_DB
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data, so relations across them are fine.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return True
@@ -0,0 +1,260 @@
+"""
+Indexed search over runs and members.
+
+The admin's default ``search_fields`` matching is an unanchored ``icontains``
+on every field, which scans whole tables (and their joins). Here each backend
+gets an index that can answer the same substring queries:
+
+- SQLite: FTS5 tables using the trigram tokenizer, kept in sync with
+  ``runs_run``, ``auth_user`` and ``runs_userprofile`` by triggers, so bulk
+  inserts and queryset updates are covered too.
+- PostgreSQL: ``pg_trgm`` GIN indexes on the searched columns, which make
+  ``icontains`` (``ILIKE``) an index scan. Each table is matched on its own
+  and the matches combined with ``UNION``: an ``OR`` across ``auth_user``
+  and its profile join can't use either table's indexes.
+
+Other backends fall back to plain ``icontains``. ``matching_run_ids`` and
+``matching_user_ids`` return subqueries to filter any queryset with.
+"""
+import sqlite3
+
+from django.contrib.auth.models import User
+from django.db import connections
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from .models import Run, UserProfile
+
+RUN_INDEX = 'runs_run_search'
+MEMBER_INDEX = 'runs_member_search'
+
+# FTS5's trigram tokenizer arrived in SQLite 3.34; it matches substrings of
+# three or more characters.
+TRIGRAM_MIN_SQLITE = (3, 34, 0)
+TRIGRAM_MIN_LENGTH = 3
+
+# (model, field holding the matched row's ID, searched fields) per table.
+RUN_SEARCH_TABLES = [
+    (Run, 'pk', ['venue', 'meeting_place']),
+]
+MEMBER_SEARCH_TABLES = [
+    (User, 'pk', ['username', 'first_name', 'last_name', 'email']),
+    (UserProfile, 'user_id', ['emergency_contact_name', 'emergency_contact_phone', 'phone_number']),
+]
+
+_MEMBER_ROW = f"""
+    INSERT INTO {MEMBER_INDEX} (rowid, username, name, email, contact)
+    SELECT u.id, u.username, u.first_name || ' ' || u.last_name, u.email,
+           coalesce(p.emergency_contact_name || ' ' || p.emergency_contact_phone || ' ' || p.phone_number, '')
+    FROM auth_user u LEFT JOIN runs_userprofile p ON p.user_id = u.id
+"""
+
+SQLITE_SCHEMA = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {RUN_INDEX} USING fts5(venue, meeting_place, tokenize='trigram')",
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {MEMBER_INDEX} USING fts5(username, name, email, contact, tokenize='trigram')",
+    f"""CREATE TRIGGER IF NOT EXISTS runs_run_search_ai AFTER INSERT ON runs_run BEGIN
+        INSERT INTO {RUN_INDEX} (rowid, venue, meeting_place) VALUES (NEW.id, NEW.venue, NEW.meeting_place);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS runs_run_search_au AFTER UPDATE OF venue, meeting_place ON runs_run BEGIN
+        DELETE FROM {RUN_INDEX} WHERE rowid = OLD.id;
+        INSERT INTO {RUN_INDEX} (rowid, venue, meeting_place) VALUES (NEW.id, NEW.venue, NEW.meeting_place);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS runs_run_search_ad AFTER DELETE ON runs_run BEGIN
+        DELETE FROM {RUN_INDEX} WHERE rowid = OLD.id;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS runs_member_search_user_ai AFTER INSERT ON auth_user BEGIN
+        {_MEMBER_ROW} WHERE u.id = NEW.id;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS runs_member_search_user_au
+        AFTER UPDATE OF username, first_name, last_name, email ON auth_user BEGIN
+        DELETE FROM {MEMBER_INDEX} WHERE rowid = OLD.id;
+        {_MEMBER_ROW} WHERE u.id = NEW.id;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS runs_member_search_user_ad AFTER DELETE ON auth_user BEGIN
+        DELETE FROM {MEMBER_INDEX} WHERE rowid = OLD.id;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS runs_member_search_profile_ai AFTER INSERT ON runs_userprofile BEGIN
+        DELETE FROM {MEMBER_INDEX} WHERE rowid = NEW.user_id;
+        {_MEMBER_ROW} WHERE u.id = NEW.user_id;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS runs_member_search_profile_au AFTER UPDATE ON runs_userprofile BEGIN
+        DELETE FROM {MEMBER_INDEX} WHERE rowid IN (OLD.user_id, NEW.user_id);
+        {_MEMBER_ROW} WHERE u.id IN (OLD.user_id, NEW.user_id);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS runs_member_search_profile_ad AFTER DELETE ON runs_userprofile BEGIN
+        DELETE FROM {MEMBER_INDEX} WHERE rowid = OLD.user_id;
+        {_MEMBER_ROW} WHERE u.id = OLD.user_id;
+    END""",
+]
+
+SQLITE_TRIGGERS = (
+    'runs_run_search_ai', 'runs_run_search_au', 'runs_run_search_ad',
+    'runs_member_search_user_ai', 'runs_member_search_user_au', 'runs_member_search_user_ad',
+    'runs_member_search_profile_ai', 'runs_member_search_profile_au', 'runs_member_search_profile_ad',
+)
+
+SQLITE_DROP = [
+    f'DROP TABLE IF EXISTS {RUN_INDEX}',
+    f'DROP TABLE IF EXISTS {MEMBER_INDEX}',
+] + [f'DROP TRIGGER IF EXISTS {name}' for name in SQLITE_TRIGGERS]
+
+POSTGRES_SCHEMA = [
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    'CREATE INDEX IF NOT EXISTS runs_run_venue_trgm ON runs_run USING gin (upper(venue) gin_trgm_ops)',
+    'CREATE INDEX IF NOT EXISTS runs_run_meeting_place_trgm ON runs_run USING gin (upper(meeting_place) gin_trgm_ops)',
+    'CREATE INDEX IF NOT EXISTS auth_user_username_trgm ON auth_user USING gin (upper(username) gin_trgm_ops)',
+    'CREATE INDEX IF NOT EXISTS auth_user_first_name_trgm ON auth_user USING gin (upper(first_name) gin_trgm_ops)',
+    'CREATE INDEX IF NOT EXISTS auth_user_last_name_trgm ON auth_user USING gin (upper(last_name) gin_trgm_ops)',
+    'CREATE INDEX IF NOT EXISTS auth_user_email_trgm ON auth_user USING gin (upper(email) gin_trgm_ops)',
+    'CREATE INDEX IF NOT EXISTS runs_userprofile_contact_trgm ON runs_userprofile '
+    'USING gin (upper(emergency_contact_name) gin_trgm_ops)',
+    'CREATE INDEX IF NOT EXISTS runs_userprofile_contact_phone_trgm ON runs_userprofile '
+    'USING gin (upper(emergency_contact_phone) gin_trgm_ops)',
+    'CREATE INDEX IF NOT EXISTS runs_userprofile_phone_trgm ON runs_userprofile '
+    'USING gin (upper(phone_number) gin_trgm_ops)',
+]
+
+POSTGRES_DROP = [
+    'DROP INDEX IF EXISTS runs_run_venue_trgm',
+    'DROP INDEX IF EXISTS runs_run_meeting_place_trgm',
+    'DROP INDEX IF EXISTS auth_user_username_trgm',
+    'DROP INDEX IF EXISTS auth_user_first_name_trgm',
+    'DROP INDEX IF EXISTS auth_user_last_name_trgm',
+    'DROP INDEX IF EXISTS auth_user_email_trgm',
+    'DROP INDEX IF EXISTS runs_userprofile_contact_trgm',
+    'DROP INDEX IF EXISTS runs_userprofile_contact_phone_trgm',
+    'DROP INDEX IF EXISTS runs_userprofile_phone_trgm',
+]
+
+
+def _uses_fts(connection):
+    return connection.vendor == 'sqlite' and sqlite3.sqlite_version_info >= TRIGRAM_MIN_SQLITE
+
+
+def install(connection):
+    """Create the search indexes (and, on SQLite, the triggers that maintain them)."""
+    if _uses_fts(connection):
+        statements = SQLITE_SCHEMA
+    elif connection.vendor == 'postgresql':
+        statements = POSTGRES_SCHEMA
+    else:
+        return
+    with connection.cursor() as cursor:
+        for sql in statements:
+            cursor.execute(sql)
+
+
+def uninstall(connection):
+    """Drop everything ``install`` creates."""
+    if _uses_fts(connection):
+        statements = SQLITE_DROP
+    elif connection.vendor == 'postgresql':
+        statements = POSTGRES_DROP
+    else:
+        return
+    with connection.cursor() as cursor:
+        for sql in statements:
+            cursor.execute(sql)
+
+
+def ensure_installed(connection):
+    """
+    Install the search indexes if any part is missing.
+
+    SQLite drops a table's triggers when a migration rebuilds the table, and
+    changes made before they are recreated are missed, so the FTS tables are
+    repopulated whenever a trigger had to be put back.
+    """
+    if not _uses_fts(connection):
+        install(connection)
+        return
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'")
+        existing = {row[0] for row in cursor.fetchall()}
+    if not set(SQLITE_TRIGGERS) <= existing:
+        rebuild(connection)
+
+
+def rebuild(connection):
+    """Repopulate the SQLite FTS tables from scratch. Returns ``(runs, members)`` indexed."""
+    if not _uses_fts(connection):
+        return 0, 0
+    install(connection)
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {RUN_INDEX}')
+        cursor.execute(f'INSERT INTO {RUN_INDEX} (rowid, venue, meeting_place) SELECT id, venue, meeting_place FROM runs_run')
+        runs = cursor.rowcount
+        cursor.execute(f'DELETE FROM {MEMBER_INDEX}')
+        cursor.execute(_MEMBER_ROW)
+        members = cursor.rowcount
+    return runs, members
+
+
+def _fts_query(terms):
+    """Quote each term as an FTS5 string, so punctuation in user input is matched literally."""
+    return ' '.join('"{}"'.format(term.replace('"', '""')) for term in terms)
+
+
+def _term_matches(tables, term, using):
+    """Return a subquery of the IDs with ``term`` in any searched field: one ``OR`` per table, ``UNION``-ed."""
+    matches = []
+    for model, id_field, fields in tables:
+        condition = Q()
+        for field in fields:
+            condition |= Q(**{f'{field}__icontains': term})
+        matches.append(model._default_manager.using(using).order_by().filter(condition).values_list(id_field))
+    return matches[0].union(*matches[1:]) if len(matches) > 1 else matches[0]
+
+
+def _matching_ids(model, index, tables, search_term, using):
+    terms = search_term.split()
+    queryset = model._default_manager.using(using).order_by()
+    short_terms = terms
+    if _uses_fts(connections[using]):
+        long_terms = [t for t in terms if len(t) >= TRIGRAM_MIN_LENGTH]
+        short_terms = [t for t in terms if len(t) < TRIGRAM_MIN_LENGTH]
+        if long_terms:
+            queryset = queryset.filter(pk__in=RawSQL(
+                f'SELECT rowid FROM {index} WHERE {index} MATCH %s', [_fts_query(long_terms)],
+            ))
+    # Terms too short for the trigram index, and backends without one, use icontains.
+    for term in short_terms:
+        queryset = queryset.filter(pk__in=_term_matches(tables, term, using))
+    return queryset.values('pk')
+
+
+def matching_run_ids(search_term, using='default'):
+    """Return a subquery of the IDs of runs whose venue or meeting place contain every term."""
+    return _matching_ids(Run, RUN_INDEX, RUN_SEARCH_TABLES, search_term, using)
+
+
+def matching_user_ids(search_term, using='default'):
+    """Return a subquery of the IDs of members whose name, email or contacts contain every term."""
+    return _matching_ids(User, MEMBER_INDEX, MEMBER_SEARCH_TABLES, search_term, using)
+
+
+def search_runs(queryset, search_term):
+    """Filter a ``Run`` queryset to runs matching ``search_term``."""
+    if not search_term.strip():
+        return queryset
+    return queryset.filter(pk__in=matching_run_ids(search_term, using=queryset.db))
+
+
+class IndexedSearchMixin:
+    """
+    ModelAdmin mixin that answers the changelist search box from the search indexes.
+
+    ``search_indexes`` maps lookups on the admin's model to the index to match
+    them against, e.g. ``{'pk': 'runs'}`` or ``{'user': 'members', 'run': 'runs'}``.
+    A row is included if any of its lookups matches.
+    """
+    search_indexes = {}
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term.strip():
+            return queryset, False
+        matchers = {'runs': matching_run_ids, 'members': matching_user_ids}
+        condition = Q()
+        for lookup, index in self.search_indexes.items():
+            condition |= Q(**{f'{lookup}__in': matchers[index](search_term, using=queryset.db)})
+        return queryset.filter(condition), False
@@ -0,0 +1,350 @@
+"""
+Sign-up and cancellation logic shared by the HTML views and the JSON API.
+
+Each function applies one member action and returns a status string rather
+than raising, so callers can turn it into a flash message or a per-action
+API result.
+
+The ``a``-prefixed coroutines are async ORM equivalents used by the async
+views when the site is served under ASGI.
+
+``bulk_sign_up`` adds a whole group to a run at once, for coaches and
+admins, and returns a status per member.
+
+``hold_spot`` sets a place aside the moment a member taps "Sign Up", for
+``SPOT_HOLD_SECONDS``; ``confirm_hold`` turns it into a sign-up and
+``release_hold`` gives it back. Holds that lapse stop counting against
+capacity straight away; ``release_expired_holds`` deletes them and offers
+the places to members waiting for one.
+"""
+import asyncio
+from datetime import timedelta
+from functools import partial
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import events, member_cache, stats
+from .models import BallotEntry, Run, SignUp, SpotHold
+from .signals import place_freed
+
+SIGNED_UP = 'signed_up'
+ALREADY_SIGNED_UP = 'already_signed_up'
+RUN_FULL = 'full'
+CANCELLED = 'cancelled'
+NOT_SIGNED_UP = 'not_signed_up'
+RUN_NOT_FOUND = 'not_found'
+INVALID_ACTION = 'invalid'
+BALLOT_ENTERED = 'ballot_entered'
+ALREADY_ENTERED = 'already_entered'
+BALLOT_CLOSED = 'ballot_closed'
+BALLOT_WITHDRAWN = 'ballot_withdrawn'
+NOT_OPEN = 'not_open'
+IN_WAITING_ROOM = 'waiting_room'
+MEMBER_NOT_FOUND = 'member_not_found'
+HELD = 'held'
+RELEASED = 'released'
+NOT_HELD = 'not_held'
+
+
+def enter_ballot(user, run):
+    """Enter ``user`` into ``run``'s ballot. Insert-only: places are allocated at the draw."""
+    if not run.ballot_open():
+        return BALLOT_CLOSED
+    try:
+        with transaction.atomic():
+            BallotEntry.objects.create(user=user, run=run)
+    except IntegrityError:
+        return ALREADY_ENTERED
+    return BALLOT_ENTERED
+
+
+def sign_up(user, run):
+    """Sign ``user`` up for ``run`` if they are not already and it has space."""
+    if not run.signups_open():
+        return NOT_OPEN
+    if run.ballot_pending():
+        return enter_ballot(user, run)
+
+    if SignUp.objects.filter(user=user, run=run).exists():
+        return ALREADY_SIGNED_UP
+    # A member holding a place takes that one rather than another.
+    if SpotHold.objects.filter(user=user, run=run, expires_at__gt=timezone.now()).exists():
+        return confirm_hold(user, run)
+
+    if run.is_full():
+        return RUN_FULL
+    return _take_place(user, run)
+
+
+def _take_place(user, run):
+    """Insert ``user``'s sign-up with the run locked, so it can't race a group sign-up or a hold."""
+    with transaction.atomic():
+        if not Run.objects.select_for_update().filter(pk=run.pk).exists():
+            return RUN_NOT_FOUND
+        try:
+            # By ID, so the capacity check reloads the run and counts again under the lock.
+            SignUp.objects.create(user=user, run_id=run.pk)
+        except ValidationError:
+            return RUN_FULL
+    return SIGNED_UP
+
+
+def hold_spot(user, run):
+    """
+    Set a place on ``run`` aside for ``user`` while they confirm.
+
+    Holding again extends the member's hold. Returns ``(status, expires_at)``;
+    ``expires_at`` is None unless the status is ``HELD``.
+    """
+    if not run.signups_open():
+        return NOT_OPEN, None
+    if run.ballot_pending():
+        return enter_ballot(user, run), None
+
+    now = timezone.now()
+    expires_at = now + timedelta(seconds=settings.SPOT_HOLD_SECONDS)
+    with transaction.atomic():
+        # Lock the run so two members can't both hold its last place.
+        if not Run.objects.select_for_update().filter(pk=run.pk).exists():
+            return RUN_NOT_FOUND, None
+        if SignUp.objects.filter(user=user, run=run).exists():
+            return ALREADY_SIGNED_UP, None
+        if SpotHold.objects.filter(user=user, run=run, expires_at__gt=now).update(expires_at=expires_at):
+            # The member's own run list shows when the hold runs out.
+            Run.objects.filter(pk=run.pk).update(updated_at=now)
+            return HELD, expires_at
+
+        # Lazy expiry: drop this run's lapsed holds (an index range) before counting.
+        SpotHold.objects.filter(run=run, expires_at__lte=now).delete()
+        # Sign-ups and active holds, in one query.
+        if Run.objects.get(pk=run.pk).is_full():
+            return RUN_FULL, None
+        SpotHold.objects.create(user=user, run=run, expires_at=expires_at)
+        # The run list's ETag follows updated_at, and it now shows one place fewer.
+        Run.objects.filter(pk=run.pk).update(updated_at=now)
+    return HELD, expires_at
+
+
+def held_places(user):
+    """Return ``(run_id, expires_at)`` pairs for the places ``user`` is holding right now."""
+    return SpotHold.objects.filter(user=user, expires_at__gt=timezone.now()).values_list('run_id', 'expires_at')
+
+
+def confirm_hold(user, run):
+    """Turn ``user``'s hold on ``run`` into a sign-up; with no active hold, try an ordinary sign-up."""
+    with transaction.atomic():
+        hold = SpotHold.objects.select_for_update().filter(user=user, run=run).first()
+        if hold is None or hold.expires_at <= timezone.now():
+            if hold is not None:
+                hold.delete()
+            held = False
+        else:
+            hold.delete()
+            held = True
+            if SignUp.objects.filter(user=user, run=run).exists():
+                return ALREADY_SIGNED_UP
+            try:
+                # By ID, so the capacity check reloads the run without the hold just released.
+                SignUp.objects.create(user=user, run_id=run.pk)
+            except ValidationError:
+                # The run's capacity was cut while the place was held.
+                return RUN_FULL
+    if not held:
+        return sign_up(user, run)
+    return SIGNED_UP
+
+
+def release_hold(user, run):
+    """Give back the place ``user`` is holding on ``run``."""
+    now = timezone.now()
+    with transaction.atomic():
+        if not SpotHold.objects.filter(user=user, run=run, expires_at__gt=now).delete()[0]:
+            SpotHold.objects.filter(user=user, run=run).delete()
+            return NOT_HELD
+        Run.objects.filter(pk=run.pk).update(updated_at=now)
+        transaction.on_commit(partial(place_freed, run.pk))
+    return RELEASED
+
+
+def release_expired_holds(batch_size=500, now=None):
+    """
+    Delete lapsed holds, oldest first, and offer their places to reserves and watching members.
+
+    Finds them through the ``expires_at`` index rather than a scan. Yields
+    the number deleted in each batch.
+    """
+    now = now or timezone.now()
+    expired = SpotHold.objects.filter(expires_at__lte=now).order_by('expires_at')
+    while True:
+        with transaction.atomic():
+            holds = list(expired.values_list('pk', 'run_id')[:batch_size])
+            if not holds:
+                return
+            SpotHold.objects.filter(pk__in=[pk for pk, _ in holds]).delete()
+            run_ids = {run_id for _, run_id in holds}
+            # The run list showed these places as taken.
+            Run.objects.filter(pk__in=run_ids).update(updated_at=timezone.now())
+            for run_id in run_ids:
+                transaction.on_commit(partial(place_freed, run_id))
+        yield len(holds)
+
+
+def cancel(user, run):
+    """Remove ``user``'s sign-up for ``run``, if there is one."""
+    try:
+        signup = SignUp.objects.get(user=user, run=run)
+    except SignUp.DoesNotExist:
+        # Members can also withdraw from a ballot, or step off the reserve list.
+        if BallotEntry.objects.filter(user=user, run=run).delete()[0]:
+            return BALLOT_WITHDRAWN
+        return NOT_SIGNED_UP
+    signup.delete()
+    return CANCELLED
+
+
+def find_members(identifiers):
+    """
+    Look members up by ID, username or email address, in one query.
+
+    Returns ``{identifier: user_id}`` for the identifiers that matched.
+    """
+    identifiers = [str(i).strip() for i in identifiers if str(i).strip()]
+    ids = [int(i) for i in identifiers if i.isdigit()]
+    lookup = Q(pk__in=ids) | Q(username__in=identifiers) | Q(email__in=identifiers)
+    found = {}
+    for pk, username, email in User.objects.filter(lookup).values_list('pk', 'username', 'email'):
+        found[str(pk)] = found[username] = pk
+        if email:
+            found.setdefault(email, pk)
+    return {i: found[i] for i in identifiers if i in found}
+
+
+def bulk_sign_up(run_id, user_ids):
+    """
+    Sign a group of members up for a run, in the order given, as far as places allow.
+
+    The run is locked and its free places counted once for the whole group,
+    then every new sign-up is inserted with one ``bulk_create``. Single
+    sign-ups and holds take the same lock, so they can't overbook the run
+    meanwhile. Opening
+    times and waiting rooms don't apply: this is for staff. Returns
+    ``{user_id: status}``.
+    """
+    user_ids = list(dict.fromkeys(user_ids))
+    with transaction.atomic():
+        # Lock the run (counts are taken afterwards; FOR UPDATE can't be combined with GROUP BY).
+        run = Run.objects.select_for_update().filter(pk=run_id).first()
+        if run is None:
+            return dict.fromkeys(user_ids, RUN_NOT_FOUND)
+        members = set(User.objects.filter(pk__in=user_ids).values_list('pk', flat=True))
+        signed_up = set(SignUp.objects.filter(run=run).values_list('user_id', flat=True))
+        holding = set(
+            SpotHold.objects.filter(run=run, expires_at__gt=timezone.now()).values_list('user_id', flat=True)
+        )
+        places = max(0, run.max_capacity - len(signed_up) - len(holding))
+
+        results, added, taken = {}, [], 0
+        for user_id in user_ids:
+            if user_id not in members:
+                results[user_id] = MEMBER_NOT_FOUND
+            elif user_id in signed_up:
+                results[user_id] = ALREADY_SIGNED_UP
+            elif user_id in holding or taken < places:
+                # A member holding a place takes that one.
+                results[user_id] = SIGNED_UP
+                added.append(user_id)
+                taken += user_id not in holding
+            else:
+                results[user_id] = RUN_FULL
+
+        added = _insert_signups(run, added, results)
+        if not added:
+            return results
+        # bulk_create skips SignUp.save() and its signals, so do their work here.
+        if holding.intersection(added):
+            SpotHold.objects.filter(run=run, user_id__in=added).delete()
+        stats.signups_added(added)
+        events.signups_created(run.pk, added)
+        member_cache.invalidate(*added)
+        Run.objects.filter(pk=run.pk).update(updated_at=timezone.now())
+    return results
+
+
+def _insert_signups(run, user_ids, results):
+    """
+    Insert sign-ups for ``user_ids`` on the locked ``run``; return the IDs actually inserted.
+
+    Single sign-ups lock the run too, but staff can still add a member in
+    the admin meanwhile. If the batch hits the unique constraint, each row
+    is retried in its own savepoint and the members already signed up are
+    reported as such, so nothing is counted twice.
+    """
+    try:
+        with transaction.atomic():
+            SignUp.objects.bulk_create([SignUp(run=run, user_id=user_id) for user_id in user_ids])
+        return user_ids
+    except IntegrityError:
+        pass
+    inserted = []
+    for user_id in user_ids:
+        try:
+            with transaction.atomic():
+                SignUp.objects.bulk_create([SignUp(run=run, user_id=user_id)])
+        except IntegrityError:
+            results[user_id] = ALREADY_SIGNED_UP
+        else:
+            inserted.append(user_id)
+    return inserted
+
+
+async def aenter_ballot(user, run):
+    """Async version of ``enter_ballot``."""
+    if not run.ballot_open():
+        return BALLOT_CLOSED
+    try:
+        await BallotEntry.objects.acreate(user=user, run=run)
+    except IntegrityError:
+        return ALREADY_ENTERED
+    return BALLOT_ENTERED
+
+
+async def asign_up(user, run):
+    """Async version of ``sign_up``."""
+    if not run.signups_open():
+        return NOT_OPEN
+    if run.ballot_pending():
+        return await aenter_ballot(user, run)
+
+    # The duplicate, hold and capacity checks are independent reads.
+    already_signed_up, holding, counts = await asyncio.gather(
+        SignUp.objects.filter(user=user, run=run).aexists(),
+        SpotHold.objects.filter(user=user, run=run, expires_at__gt=timezone.now()).aexists(),
+        Run.objects.with_signup_counts().filter(pk=run.pk).values_list('signup_count', 'hold_count').afirst(),
+    )
+    if already_signed_up:
+        return ALREADY_SIGNED_UP
+    if holding:
+        return await sync_to_async(confirm_hold)(user, run)
+
+    if sum(counts or (0, 0)) >= run.max_capacity:
+        return RUN_FULL
+    # Async queries can't run in a transaction, so the locked insert runs in a thread.
+    return await sync_to_async(_take_place)(user, run)
+
+
+async def acancel(user, run):
+    """Async version of ``cancel``."""
+    try:
+        signup = await SignUp.objects.aget(user=user, run=run)
+    except SignUp.DoesNotExist:
+        if (await BallotEntry.objects.filter(user=user, run=run).adelete())[0]:
+            return BALLOT_WITHDRAWN
+        return NOT_SIGNED_UP
+    await signup.adelete()
+    return CANCELLED
@@ -0,0 +1,143 @@
+"""Signal handlers for the runs app."""
+from functools import partial
+
+from django.db import connections, transaction
+from django.contrib.auth.models import User
+from django.db.models.signals import m2m_changed, post_delete, post_migrate, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import events, member_cache, search, stats, waiting_room
+from .archive import archiving
+from .ballots import promote_reserves
+from .models import Run, SignUp, UserProfile, Venue
+from .notifications import enqueue_spot_opened, withdraw_reminder
+from .venues import invalidate_grid
+
+
+def place_freed(run_id):
+    """Offer a freed place to the ballot reserves first, then to watching members."""
+    promote_reserves(run_id)
+    enqueue_spot_opened(run_id)
+
+
+@receiver(post_delete, sender=SignUp)
+def queue_spot_opened(sender, instance, **kwargs):
+    """Fill or advertise the place a cancelled sign-up leaves behind."""
+    if archiving.get():
+        return
+    # Wait for the cancellation to commit (and skip runs deleted outright);
+    # this only inserts rows, so the request never waits on SMTP.
+    transaction.on_commit(partial(place_freed, instance.run_id))
+
+
+@receiver(post_delete, sender=SignUp)
+def withdraw_run_reminder(sender, instance, **kwargs):
+    """Drop the unsent reminder for a cancelled sign-up (archived runs take theirs with them)."""
+    if not archiving.get():
+        withdraw_reminder(instance.user_id, instance.run_id)
+
+
+@receiver(post_migrate)
+def install_search_indexes(sender, using, **kwargs):
+    """Recreate the search triggers, which SQLite drops whenever a migration rebuilds a table."""
+    if sender.name != 'runs':
+        return
+    connection = connections[using]
+    if 'runs_run' in connection.introspection.table_names():
+        search.ensure_installed(connection)
+
+
+@receiver([post_save, post_delete], sender=Venue)
+def venue_changed(sender, **kwargs):
+    """Rebuild the near-me venue grid after a venue is added, moved or removed."""
+    invalidate_grid()
+
+
+@receiver(pre_save, sender=SignUp)
+def remember_attendance(sender, instance, raw=False, **kwargs):
+    """Note the stored attendance flag, so post_save can tell whether it changed."""
+    if raw or instance._state.adding:
+        return
+    instance._stored_attended = (
+        SignUp.objects.filter(pk=instance.pk).values_list('attended', flat=True).first()
+    )
+
+
+@receiver(post_save, sender=SignUp)
+def count_signup(sender, instance, created, raw=False, **kwargs):
+    """Keep the member's stats row in step with a new sign-up or changed attendance."""
+    if raw:
+        return
+    if created:
+        stats.signup_added(instance)
+    elif getattr(instance, '_stored_attended', instance.attended) != instance.attended:
+        stats.attendance_changed(instance)
+    instance._stored_attended = instance.attended
+
+
+@receiver(post_delete, sender=SignUp)
+def uncount_signup(sender, instance, **kwargs):
+    """Take a cancelled sign-up off the member's stats (archived ones still count)."""
+    if not archiving.get():
+        stats.signup_removed(instance)
+
+
+@receiver(post_save, sender=SignUp)
+def log_signup(sender, instance, created, raw=False, **kwargs):
+    """Append a new sign-up to the event log."""
+    if created and not raw:
+        events.signup_created(instance)
+
+
+@receiver(post_delete, sender=SignUp)
+def log_cancellation(sender, instance, **kwargs):
+    """Append a cancellation to the event log (archiving isn't one)."""
+    if not archiving.get():
+        events.signup_deleted(instance)
+
+
+@receiver([post_save, post_delete], sender=SignUp)
+def touch_run(sender, instance, raw=False, **kwargs):
+    """Bump the run's ``updated_at`` so the analytics rollups reprocess it."""
+    if not raw and not archiving.get():
+        Run.objects.filter(pk=instance.run_id).update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=User)
+@receiver(post_save, sender=UserProfile)
+def touch_member_runs(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Bump the member's upcoming runs so cached rosters pick up new names and contacts."""
+    if raw or update_fields == frozenset({'last_login'}):
+        return
+    user_id = instance.pk if sender is User else instance.user_id
+    Run.objects.filter(signup__user_id=user_id, date__gte=timezone.localdate()).update(updated_at=timezone.now())
+
+
+@receiver([post_save, post_delete], sender=User)
+@receiver([post_save, post_delete], sender=UserProfile)
+@receiver([post_save, post_delete], sender=SignUp)
+def invalidate_member_cache(sender, instance, **kwargs):
+    """Drop the member's cached user/profile/sign-up bundle after any change to them."""
+    member_cache.invalidate(instance.pk if sender is User else instance.user_id)
+
+
+@receiver(m2m_changed, sender=User.user_permissions.through)
+@receiver(m2m_changed, sender=User.groups.through)
+def invalidate_member_permissions(sender, instance, action, reverse, pk_set, **kwargs):
+    """Drop cached bundles, and the permissions in them, when members' permissions or groups change."""
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        member_cache.invalidate(instance.pk)
+    elif pk_set:
+        member_cache.invalidate(*pk_set)
+    else:
+        # Cleared from the permission or group side; the members affected aren't listed.
+        member_cache.invalidate(*User.objects.values_list('pk', flat=True))
+
+
+@receiver([post_save, post_delete], sender=Run)
+def forget_waiting_room(sender, instance, **kwargs):
+    """Drop the cached waiting room settings after a run is edited or deleted."""
+    waiting_room.forget(instance.pk)
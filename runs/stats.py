@@ -0,0 +1,150 @@
+"""
+Per-member run statistics.
+
+``MemberStats`` holds each member's totals so the My Runs page reads one row
+instead of aggregating their whole history. The signal handlers in
+``signals.py`` apply each sign-up, cancellation and attendance change as an
+``F()`` delta; only the streak is recomputed, by walking the member's past
+runs newest first until the first one they missed. A streak also breaks
+when a run the member signed up for passes without them, which no signal
+sees, so ``get_stats`` checks for that on each read. Paths that bypass model
+signals (``bulk_create``, ``QuerySet.update``) call these functions directly
+or are covered by ``rebuild_member_stats``.
+
+Everything here reads from the primary, even under ``replica_reads``: the
+results are written back, and a lagging replica would otherwise leave stale
+totals for later deltas to build on.
+"""
+from decimal import Decimal
+
+from django.db.models import Count, F, Max, Q, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import ArchivedSignUp, MemberStats, SignUp
+from .routers import PRIMARY_DB
+
+
+def _past_runs(user_id):
+    """Return ``(attended, date)`` for the member's past runs, newest first, live and archived."""
+    fields = ['attended', 'run__date', 'run__time']
+    today = timezone.localdate()
+    live = SignUp.objects.using(PRIMARY_DB).filter(user_id=user_id, run__date__lt=today)
+    archived = ArchivedSignUp.objects.using(PRIMARY_DB).filter(user_id=user_id, run__date__lt=today)
+    live = live.order_by().values_list(*fields)
+    archived = archived.order_by().values_list(*fields)
+    return live.union(archived, all=True).order_by('-run__date', '-run__time')
+
+
+def _streak(user_id):
+    streak = 0
+    for attended, run_date, run_time in _past_runs(user_id).iterator(chunk_size=50):
+        if not attended:
+            break
+        streak += 1
+    return streak
+
+
+def _last_attended_on(user_id):
+    dates = [
+        model.objects.using(PRIMARY_DB).filter(user_id=user_id, attended=True).aggregate(last=Max('run__date'))['last']
+        for model in (SignUp, ArchivedSignUp)
+    ]
+    return max((d for d in dates if d is not None), default=None)
+
+
+def compute(user_id):
+    """Compute a member's stats from scratch, as a dict of ``MemberStats`` fields."""
+    stats = {'runs_signed_up': 0, 'runs_attended': 0, 'km_attended': Decimal('0')}
+    for model in (SignUp, ArchivedSignUp):
+        totals = model.objects.using(PRIMARY_DB).filter(user_id=user_id).aggregate(
+            runs_signed_up=Count('pk'),
+            runs_attended=Count('pk', filter=Q(attended=True)),
+            km_attended=Coalesce(Sum('run__length_km', filter=Q(attended=True)), Decimal('0')),
+        )
+        for key in stats:
+            stats[key] += totals[key]
+    stats['current_streak'] = _streak(user_id)
+    stats['last_attended_on'] = _last_attended_on(user_id)
+    return stats
+
+
+def refresh(user_id):
+    """Recompute and save a member's stats row."""
+    stats, _ = MemberStats.objects.update_or_create(user_id=user_id, defaults=compute(user_id))
+    return stats
+
+
+def _missed_since(user_id, last_attended_on):
+    """Check whether the member has a past, unattended sign-up from ``last_attended_on`` on."""
+    return SignUp.objects.using(PRIMARY_DB).filter(
+        user_id=user_id, attended=False, run__date__gte=last_attended_on, run__date__lt=timezone.localdate(),
+    ).exists()
+
+
+def get_stats(user):
+    """Return ``user``'s stats row, creating it on first use and breaking a streak that has lapsed."""
+    stats = MemberStats.objects.using(PRIMARY_DB).filter(user=user).first()
+    if stats is None:
+        return refresh(user.pk)
+    if stats.current_streak and _missed_since(user.pk, stats.last_attended_on):
+        stats.current_streak = _streak(user.pk)
+        MemberStats.objects.filter(pk=stats.pk).update(current_streak=stats.current_streak)
+    return stats
+
+
+def _apply(user_id, refresh_streak=False, **deltas):
+    """
+    Add ``deltas`` to a member's counters.
+
+    Members without a row are left alone: ``get_stats`` computes it from
+    scratch on first use, which already includes this change.
+    """
+    updates = {field: F(field) + delta for field, delta in deltas.items()}
+    if refresh_streak:
+        updates['current_streak'] = _streak(user_id)
+        updates['last_attended_on'] = _last_attended_on(user_id)
+    MemberStats.objects.filter(user_id=user_id).update(**updates)
+
+
+def signup_added(signup):
+    """Count a new sign-up."""
+    if signup.attended:
+        _apply(signup.user_id, refresh_streak=True,
+               runs_signed_up=1, runs_attended=1, km_attended=signup.run.length_km)
+    else:
+        _apply(signup.user_id, runs_signed_up=1)
+
+
+def signups_added(user_ids):
+    """Count sign-ups created in bulk (not attended yet), one per user ID."""
+    MemberStats.objects.filter(user_id__in=list(user_ids)).update(runs_signed_up=F('runs_signed_up') + 1)
+
+
+def signup_removed(signup):
+    """Uncount a deleted sign-up."""
+    if signup.attended:
+        _apply(signup.user_id, refresh_streak=True,
+               runs_signed_up=-1, runs_attended=-1, km_attended=-signup.run.length_km)
+    else:
+        # A missed past run may have been what broke the streak.
+        _apply(signup.user_id, refresh_streak=signup.run.date < timezone.localdate(), runs_signed_up=-1)
+
+
+def attendance_changed(signup):
+    """Apply a change to ``signup.attended``."""
+    sign = 1 if signup.attended else -1
+    _apply(signup.user_id, refresh_streak=True,
+           runs_attended=sign, km_attended=sign * signup.run.length_km)
+
+
+def rebuild_all():
+    """Recompute every member's stats. Returns the number of rows written."""
+    from django.contrib.auth.models import User
+
+    rows = [MemberStats(user_id=user_id, **compute(user_id)) for user_id in User.objects.values_list('pk', flat=True)]
+    MemberStats.objects.bulk_create(
+        rows, batch_size=500, update_conflicts=True, unique_fields=['user'],
+        update_fields=['runs_signed_up', 'runs_attended', 'km_attended', 'current_streak', 'last_attended_on'],
+    )
+    return len(rows)
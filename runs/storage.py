@@ -0,0 +1,58 @@
+"""
+Static files storage that fingerprints and precompresses assets.
+
+``collectstatic`` writes each file under a content-hashed name (via Django's
+ManifestStaticFilesStorage) and then saves ``.gz`` and, when the optional
+``brotli`` package is installed, ``.br`` variants next to it. Nginx
+(``gzip_static``/``brotli_static``) or ``PrecompressedStaticMiddleware`` can
+then serve the smallest variant without compressing on every request.
+"""
+import gzip
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli is optional
+    brotli = None
+
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.svg', '.json', '.txt', '.html', '.map')
+
+# Files smaller than this gain nothing from compression.
+MIN_COMPRESS_SIZE = 256
+
+
+def compress_file(path):
+    """Write gzip (and brotli, if available) variants of ``path``."""
+    with open(path, 'rb') as f:
+        data = f.read()
+    if len(data) < MIN_COMPRESS_SIZE:
+        return []
+
+    written = []
+    compressed = gzip.compress(data, compresslevel=9, mtime=0)
+    if len(compressed) < len(data):
+        with open(path + '.gz', 'wb') as f:
+            f.write(compressed)
+        written.append(path + '.gz')
+
+    if brotli is not None:
+        compressed = brotli.compress(data)
+        if len(compressed) < len(data):
+            with open(path + '.br', 'wb') as f:
+                f.write(compressed)
+            written.append(path + '.br')
+    return written
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """Manifest storage that also writes precompressed copies of text assets."""
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run=dry_run, **options)
+        if dry_run:
+            return
+
+        for hashed_name in set(self.hashed_files.values()):
+            if hashed_name.endswith(COMPRESSIBLE_EXTENSIONS):
+                compress_file(self.path(hashed_name))
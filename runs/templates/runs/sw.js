@@ -0,0 +1,330 @@
+// MRC Runs service worker. Rendered by the service_worker view so it is
+// served from the site root (scope "/") and versioned from the static
+// files manifest: a new deploy changes ASSET_VERSION, which installs a new
+// worker and drops the caches of the previous one.
+const ASSET_VERSION = '{{ version }}';
+const STATIC_CACHE = `mrc-static-${ASSET_VERSION}`;
+const PAGE_CACHE = `mrc-pages-${ASSET_VERSION}`;
+// Run leaders' rosters. Not versioned: they outlive deploys, and are cleared
+// on login/logout and pruned to the runs the leader last asked for.
+const ROSTER_CACHE = 'mrc-rosters';
+const STATIC_PREFIX = '{{ static_prefix }}';
+
+// Fingerprinted assets needed to render any page offline.
+const PRECACHE_URLS = [
+{% for url in precache_urls %}  '{{ url }}',
+{% endfor %}];
+
+// Pages and public API responses served stale-while-revalidate. Everything
+// else under /api/ (timelines, holds, sign-ups) is per member and goes to
+// the network only.
+const PAGE_ROUTES = [/^\/$/, /^\/api\/runs\/$/, /^\/api\/runs\/near\/$/];
+
+// Rosters and the leaders' roster list, served network-first so they are as
+// fresh as the connection allows and still open with no signal.
+const ROSTER_ROUTES = [/^\/roster\/\d+\/$/, /^\/rosters\/$/];
+
+// Requests that change what the run list shows; the cached copy is dropped
+// so the redirect back to the list is fetched fresh.
+const INVALIDATING_ROUTES = [/^\/accounts\/log(in|out)\//];
+
+// Sign-up/cancel links; queued in IndexedDB when there is no connection.
+const QUEUEABLE_ROUTE = /^\/(signup|cancel)\/(\d+)\/$/;
+const BATCH_URL = '{{ batch_url }}';
+const BATCH_SIZE = {{ batch_size }};
+const SYNC_TAG = 'background-sync';
+
+// Install Service Worker
+self.addEventListener('install', (event) => {
+  event.waitUntil(
+    caches.open(STATIC_CACHE)
+      .then((cache) => cache.addAll(PRECACHE_URLS))
+      .then(() => self.skipWaiting())
+  );
+});
+
+// Activate Service Worker
+self.addEventListener('activate', (event) => {
+  event.waitUntil(
+    caches.keys().then((cacheNames) => {
+      return Promise.all(
+        cacheNames.map((cacheName) => {
+          if (cacheName !== STATIC_CACHE && cacheName !== PAGE_CACHE && cacheName !== ROSTER_CACHE) {
+            return caches.delete(cacheName);
+          }
+        })
+      );
+    }).then(() => self.clients.claim())
+  );
+});
+
+// Fetch Event
+self.addEventListener('fetch', (event) => {
+  const request = event.request;
+  if (request.method !== 'GET') {
+    return;
+  }
+  const url = new URL(request.url);
+  if (url.origin !== self.location.origin) {
+    return;
+  }
+
+  if (url.pathname.startsWith(STATIC_PREFIX)) {
+    event.respondWith(cacheFirst(request));
+  } else if (QUEUEABLE_ROUTE.test(url.pathname)) {
+    event.respondWith(fetchOrQueue(request, url));
+  } else if (INVALIDATING_ROUTES.some((route) => route.test(url.pathname))) {
+    // Rosters hold other members' contact details; never leave them for the next user.
+    event.respondWith(
+      Promise.all([caches.delete(PAGE_CACHE), caches.delete(ROSTER_CACHE)]).then(() => fetch(request))
+    );
+  } else if (ROSTER_ROUTES.some((route) => route.test(url.pathname))) {
+    event.respondWith(networkFirst(request, ROSTER_CACHE));
+  } else if (PAGE_ROUTES.some((route) => route.test(url.pathname))) {
+    event.respondWith(staleWhileRevalidate(request, event));
+  }
+});
+
+// Responses marked no-store (e.g. a page carrying a one-off flash message)
+// must never be replayed from the cache.
+function isCacheable(response) {
+  if (!response || !response.ok || response.type === 'opaqueredirect') {
+    return false;
+  }
+  return !/no-store/.test(response.headers.get('Cache-Control') || '');
+}
+
+// Fingerprinted assets never change under the same URL.
+function cacheFirst(request) {
+  return caches.open(STATIC_CACHE).then((cache) => {
+    return cache.match(request).then((cached) => {
+      if (cached) {
+        return cached;
+      }
+      return fetch(request).then((response) => {
+        if (isCacheable(response)) {
+          cache.put(request, response.clone());
+        }
+        return response;
+      });
+    });
+  });
+}
+
+// Answer from the cache straight away and refresh it in the background, so
+// repeat visits on a slow connection render instantly.
+function staleWhileRevalidate(request, event) {
+  // The "queued" marker only drives a banner; cache the page without it.
+  const cacheUrl = new URL(request.url);
+  cacheUrl.searchParams.delete('queued');
+  const cacheKey = cacheUrl.toString();
+
+  return caches.open(PAGE_CACHE).then((cache) => {
+    return cache.match(cacheKey).then((cached) => {
+      const network = fetch(request).then((response) => {
+        if (isCacheable(response)) {
+          return cache.put(cacheKey, response.clone()).then(() => response);
+        }
+        return response;
+      });
+
+      if (cached) {
+        event.waitUntil(network.catch(() => undefined));
+        return cached;
+      }
+      return network;
+    });
+  });
+}
+
+// Try the network, keeping a copy; fall back to the copy when offline.
+function networkFirst(request, cacheName) {
+  return caches.open(cacheName).then((cache) => {
+    return fetch(request).then((response) => {
+      if (isCacheable(response)) {
+        cache.put(request, response.clone());
+      }
+      return response;
+    }, () => cache.match(request).then((cached) => cached || Promise.reject(new Error('offline'))));
+  });
+}
+
+// Fetch the given rosters into the cache and drop any others, so rosters of
+// past runs don't linger on the device.
+function precacheRosters(urls) {
+  const wanted = new Set(urls.map((url) => new URL(url, self.location.origin).toString()));
+  return caches.open(ROSTER_CACHE).then((cache) => {
+    return cache.keys().then((requests) => Promise.all(
+      requests
+        .filter((request) => !wanted.has(request.url) && /\/roster\/\d+\/$/.test(new URL(request.url).pathname))
+        .map((request) => cache.delete(request))
+    )).then(() => Promise.all(urls.map((url) => {
+      return fetch(url, { credentials: 'same-origin' }).then((response) => {
+        return isCacheable(response) ? cache.put(url, response).then(() => 1) : 0;
+      }, () => 0);
+    })));
+  }).then((saved) => saved.reduce((total, n) => total + n, 0));
+}
+
+// Offline sign-up queue ----------------------------------------------------
+//
+// Sign-ups and cancellations made without a connection are stored in an
+// IndexedDB "outbox" and replayed in batches through BATCH_URL when the
+// connection returns, so a reconnecting phone makes one request per batch
+// instead of one per action.
+
+const DB_NAME = 'mrc-runs';
+const OUTBOX = 'outbox';
+const META = 'meta';
+
+function openDb() {
+  return new Promise((resolve, reject) => {
+    const open = indexedDB.open(DB_NAME, 1);
+    open.onupgradeneeded = () => {
+      open.result.createObjectStore(OUTBOX, { keyPath: 'id', autoIncrement: true });
+      open.result.createObjectStore(META);
+    };
+    open.onsuccess = () => resolve(open.result);
+    open.onerror = () => reject(open.error);
+  });
+}
+
+function withStore(name, mode, callback) {
+  return openDb().then((db) => new Promise((resolve, reject) => {
+    const tx = db.transaction(name, mode);
+    const result = callback(tx.objectStore(name));
+    tx.oncomplete = () => resolve(result && 'result' in result ? result.result : result);
+    tx.onerror = () => reject(tx.error);
+  }));
+}
+
+function queueAction(action, runId) {
+  return withStore(OUTBOX, 'readwrite', (store) => store.add({
+    action: action,
+    run_id: runId,
+    queued_at: Date.now(),
+  }));
+}
+
+function fetchOrQueue(request, url) {
+  return fetch(request).then((response) => {
+    return caches.delete(PAGE_CACHE).then(() => response);
+  }, () => {
+    const match = url.pathname.match(QUEUEABLE_ROUTE);
+    return queueAction(match[1], parseInt(match[2], 10))
+      .then(() => self.registration.sync ? self.registration.sync.register(SYNC_TAG) : undefined)
+      .catch(() => undefined)
+      .then(() => Response.redirect('/?queued=' + match[1], 303));
+  });
+}
+
+// Background Sync for offline actions
+self.addEventListener('sync', (event) => {
+  if (event.tag === SYNC_TAG) {
+    event.waitUntil(doBackgroundSync());
+  }
+});
+
+// Pages hand over their CSRF token and ask for a flush when they come back
+// online (for browsers without the Background Sync API).
+self.addEventListener('message', (event) => {
+  const data = event.data || {};
+  if (data.type === 'csrf-token') {
+    event.waitUntil(withStore(META, 'readwrite', (store) => store.put(data.token, 'csrfToken')));
+  } else if (data.type === 'flush-queue') {
+    event.waitUntil(doBackgroundSync().catch(() => undefined));
+  } else if (data.type === 'precache-rosters' && Array.isArray(data.urls)) {
+    event.waitUntil(precacheRosters(data.urls).then((count) => {
+      if (event.source) {
+        event.source.postMessage({ type: 'rosters-cached', count: count });
+      }
+    }));
+  }
+});
+
+function doBackgroundSync() {
+  return Promise.all([
+    withStore(OUTBOX, 'readonly', (store) => store.getAll()),
+    withStore(META, 'readonly', (store) => store.get('csrfToken')),
+  ]).then(([queued, csrfToken]) => {
+    if (!queued.length || !csrfToken) {
+      return;
+    }
+    return sendBatch(queued.slice(0, BATCH_SIZE), csrfToken).then((sent) => {
+      // Keep going until the outbox is empty.
+      return sent ? doBackgroundSync() : undefined;
+    });
+  });
+}
+
+function sendBatch(batch, csrfToken) {
+  return fetch(BATCH_URL, {
+    method: 'POST',
+    credentials: 'same-origin',
+    headers: {
+      'Content-Type': 'application/json',
+      'X-CSRFToken': csrfToken,
+    },
+    body: JSON.stringify({ actions: batch }),
+  }).then((response) => {
+    if (response.status === 401 || response.status === 403) {
+      // Logged out or stale CSRF token: keep the queue for the next page load.
+      return false;
+    }
+    if (!response.ok) {
+      throw new Error('Batch sync failed with status ' + response.status);
+    }
+    return response.json().then((body) => {
+      return withStore(OUTBOX, 'readwrite', (store) => {
+        batch.forEach((item) => store.delete(item.id));
+      }).then(() => caches.delete(PAGE_CACHE))
+        .then(() => self.clients.matchAll())
+        .then((clients) => {
+          clients.forEach((client) => client.postMessage({ type: 'sync-complete', results: body.results }));
+          return true;
+        });
+    });
+  });
+}
+
+// Push notifications (for future enhancement)
+self.addEventListener('push', (event) => {
+  const options = {
+    body: event.data ? event.data.text() : 'New run available!',
+    icon: '/static/icons/icon-192x192.png',
+    badge: '/static/icons/icon-96x96.png',
+    vibrate: [100, 50, 100],
+    data: {
+      dateOfArrival: Date.now(),
+      primaryKey: 1
+    },
+    actions: [
+      {
+        action: 'explore',
+        title: 'View Runs',
+        icon: '/static/icons/checkmark.png'
+      },
+      {
+        action: 'close',
+        title: 'Close',
+        icon: '/static/icons/xmark.png'
+      }
+    ]
+  };
+
+  event.waitUntil(
+    self.registration.showNotification('MRC Runs', options)
+  );
+});
+
+// Handle notification clicks
+self.addEventListener('notificationclick', (event) => {
+  event.notification.close();
+
+  if (event.action === 'explore') {
+    // Open the app to the runs list
+    event.waitUntil(
+      clients.openWindow('/')
+    );
+  }
+});
@@ -0,0 +1,27 @@
+from django import template
+from django.templatetags.static import static
+from django.utils.html import format_html
+
+register = template.Library()
+
+ICON_SPRITE = 'icons/icons.svg'
+
+
+@register.simple_tag
+def icon_sprite_url():
+    """Return the (fingerprinted) URL of the icon sprite."""
+    return static(ICON_SPRITE)
+
+
+@register.simple_tag
+def icon(name, css_class=''):
+    """
+    Render an icon from the self-hosted SVG sprite.
+
+    Usage: {% icon 'person-running' 'me-2' %}
+    """
+    classes = f'icon {css_class}'.strip()
+    return format_html(
+        '<svg class="{}" aria-hidden="true" focusable="false"><use href="{}#{}"></use></svg>',
+        classes, static(ICON_SPRITE), name,
+    )
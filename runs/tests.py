@@ -1,10 +1,48 @@
-from django.test import TestCase, Client
-from django.contrib.auth.models import User
-from django.urls import reverse
+from asgiref.sync import async_to_sync, sync_to_async
+import gzip
+import importlib
+import json
+import os
+import random
+import re
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock, skipUnless
+from django.apps import apps as django_apps
+from django.conf import settings
+from django.contrib.admin import helpers
+from django.test import TestCase, TransactionTestCase, Client, AsyncRequestFactory, RequestFactory, override_settings
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.messages.storage.fallback import FallbackStorage
+from django.contrib.sessions.backends.db import SessionStore
+from django.http import Http404, HttpResponse
+from django.utils.functional import SimpleLazyObject
+from django.contrib.staticfiles import finders
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.db import connection, connections
+from django.test.utils import CaptureQueriesContext
+from django.core.management import CommandError, call_command
+from django.contrib.auth.models import Permission, User
+from django.core.cache import cache
+from django.urls import resolve, reverse
 from django.core.exceptions import ValidationError
-from datetime import date, time
-from .models import Run, SignUp, UserProfile
+from django.core import mail
+from django.utils import timezone
+from datetime import date, time, timedelta
+from decimal import Decimal
+from .models import (
+    ArchivedRun, ArchivedSignUp, BallotEntry, CohortRollup, MemberStats, Notification, Run, RunRollup, SignUp,
+    SignUpEvent, SpotAlert, SpotHold, UserProfile, Venue, VenueMonthRollup,
+)
+from .backends import EmailOrUsernameBackend
 from .forms import RegistrationForm
+from . import (
+    analytics, archive, backup, ballots, bulk_edit, conditional, events, facets, member_cache, middleware, notifications, retention,
+    search, services, stats, venues, views, waiting_room,
+)
+from .views import MAX_BATCH_ACTIONS, PRECACHE_ASSETS
+from .routers import PIN_SESSION_KEY, PrimaryReplicaRouter, _use_replica
 
 
 class RunModelTest(TestCase):
@@ -470,3 +508,2512 @@ class EmailOrUsernameAuthenticationTest(TestCase):
         # Verify correct user is logged in
         user_id = int(self.client.session['_auth_user_id'])
         self.assertEqual(user_id, self.legacy_user.id)
+
+
+class PrimaryReplicaRouterTest(TestCase):
+    """Test cases for read/write database routing."""
+
+    def setUp(self):
+        self.router = PrimaryReplicaRouter()
+
+    def test_reads_default_to_primary(self):
+        """Test that reads outside replica-enabled views use the primary."""
+        with mock.patch('runs.routers.replica_configured', return_value=True):
+            self.assertEqual(self.router.db_for_read(Run), 'default')
+
+    def test_replica_reads_without_replica_use_primary(self):
+        """Test that replica-enabled views fall back to the primary when no replica exists."""
+        token = _use_replica.set(True)
+        try:
+            self.assertEqual(self.router.db_for_read(Run), 'default')
+        finally:
+            _use_replica.reset(token)
+
+    def test_writes_always_use_primary(self):
+        """Test that writes are never sent to the replica."""
+        token = _use_replica.set(True)
+        try:
+            with mock.patch('runs.routers.replica_configured', return_value=True):
+                self.assertEqual(self.router.db_for_read(Run), 'replica')
+                self.assertEqual(self.router.db_for_write(SignUp), 'default')
+        finally:
+            _use_replica.reset(token)
+
+    def test_sessions_stay_on_primary(self):
+        """Test that session reads are never sent to the replica."""
+        from django.contrib.sessions.models import Session
+        token = _use_replica.set(True)
+        try:
+            with mock.patch('runs.routers.replica_configured', return_value=True):
+                self.assertEqual(self.router.db_for_read(Session), 'default')
+        finally:
+            _use_replica.reset(token)
+
+
+class ReplicaRoutingTwoFileTest(TestCase):
+    """Test routing against a second local database file acting as the replica."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.replica_dir = tempfile.TemporaryDirectory()
+        connections.settings['replica'] = {
+            **connections['default'].settings_dict,
+            'NAME': os.path.join(cls.replica_dir.name, 'replica.sqlite3'),
+        }
+        call_command('migrate', database='replica', verbosity=0)
+
+    @classmethod
+    def tearDownClass(cls):
+        connections['replica'].close()
+        del connections['replica']
+        del connections.settings['replica']
+        cls.replica_dir.cleanup()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.run = Run.objects.create(
+            date=date(2025, 12, 25),
+            time=time(10, 0),
+            meeting_place='Test Meeting Place',
+            venue='Primary Venue',
+            length_km=5.0,
+            max_capacity=2
+        )
+        Run.objects.using('replica').all().delete()
+        User.objects.using('replica').all().delete()
+        Run.objects.using('replica').create(
+            pk=self.run.pk,
+            date=date(2025, 12, 25),
+            time=time(10, 0),
+            meeting_place='Test Meeting Place',
+            venue='Replica Venue',
+            length_km=5.0,
+            max_capacity=2
+        )
+
+    def test_run_list_reads_from_replica(self):
+        """Test that the run list is served from the replica file."""
+        response = self.client.get(reverse('run_list'))
+        self.assertContains(response, 'Replica Venue')
+        self.assertNotContains(response, 'Primary Venue')
+
+    def test_signup_writes_to_primary_and_pins_member(self):
+        """Test that sign-ups hit the primary and the member then reads their own write."""
+        self.client.login(username='testuser', password='testpass')
+        self.client.get(reverse('run_signup', args=[self.run.id]))
+
+        self.assertTrue(SignUp.objects.using('default').filter(user=self.user, run=self.run).exists())
+        self.assertFalse(SignUp.objects.using('replica').exists())
+        self.assertGreater(self.client.session[PIN_SESSION_KEY], 0)
+
+        response = self.client.get(reverse('run_list'))
+        self.assertContains(response, 'Primary Venue')
+
+    def test_history_and_export_read_from_replica(self):
+        """Test that My Runs and its CSV export are served from the replica file."""
+        User.objects.using('replica').create(pk=self.user.pk, username='testuser')
+        SignUp.objects.using('replica').create(user_id=self.user.pk, run_id=self.run.pk, attended=True)
+        self.client.login(username='testuser', password='testpass')
+
+        self.assertContains(self.client.get(reverse('run_history')), 'Replica Venue')
+        response = self.client.get(reverse('run_history'), {'format': 'csv'})
+        self.assertIn('Replica Venue', response.content.decode())
+
+    def test_history_stats_read_from_primary(self):
+        """Test that My Runs computes the stats it saves from the primary, not a lagging replica."""
+        User.objects.using('replica').create(pk=self.user.pk, username='testuser')
+        SignUp.objects.using('replica').create(user_id=self.user.pk, run_id=self.run.pk, attended=True)
+        self.client.login(username='testuser', password='testpass')
+
+        response = self.client.get(reverse('run_history'))
+        self.assertEqual(response.context['stats'].runs_signed_up, 0)
+        self.assertEqual(MemberStats.objects.using('default').get(user=self.user).runs_signed_up, 0)
+
+    def test_pin_expires(self):
+        """Test that members return to the replica once the pinning window ends."""
+        self.client.login(username='testuser', password='testpass')
+        session = self.client.session
+        session[PIN_SESSION_KEY] = 0
+        session.save()
+
+        response = self.client.get(reverse('run_list'))
+        self.assertContains(response, 'Replica Venue')
+
+
+class StaticAssetPipelineTest(TestCase):
+    """Test cases for the self-hosted, fingerprinted static asset pipeline."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.static_root = tempfile.TemporaryDirectory()
+        cls.settings_override = override_settings(
+            STATIC_ROOT=cls.static_root.name,
+            STORAGES={
+                'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+                'staticfiles': {'BACKEND': 'runs.storage.CompressedManifestStaticFilesStorage'},
+            },
+        )
+        cls.settings_override.enable()
+        call_command('collectstatic', interactive=False, verbosity=0)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.settings_override.disable()
+        cls.static_root.cleanup()
+        super().tearDownClass()
+
+    def test_pages_do_not_use_cdns(self):
+        """Test that pages only reference self-hosted, fingerprinted assets."""
+        response = self.client.get(reverse('run_list'))
+        content = response.content.decode()
+        self.assertNotIn('cdn.jsdelivr.net', content)
+        self.assertNotIn('cdnjs.cloudflare.com', content)
+        self.assertNotIn('<style>', content)
+        self.assertIn(staticfiles_storage.url('css/site.css'), content)
+        self.assertRegex(staticfiles_storage.url('css/site.css'), r'site\.[0-9a-f]{12}\.css$')
+
+    def test_collectstatic_writes_precompressed_variants(self):
+        """Test that hashed assets get gzip variants next to them."""
+        hashed = staticfiles_storage.stored_name('vendor/bootstrap/bootstrap.min.css')
+        self.assertTrue(os.path.exists(staticfiles_storage.path(hashed) + '.gz'))
+
+    def test_service_worker_precaches_fingerprinted_assets(self):
+        """Test that the service worker is versioned from the static manifest."""
+        response = self.client.get(reverse('service_worker'))
+        content = response.content.decode()
+        self.assertIn(staticfiles_storage.url('vendor/bootstrap/bootstrap.min.css'), content)
+        self.assertIn(f"ASSET_VERSION = '{staticfiles_storage.manifest_hash}'", content)
+
+    def test_fingerprinted_asset_served_compressed_and_immutable(self):
+        """Test that hashed assets are served precompressed with far-future caching."""
+        url = staticfiles_storage.url('css/site.css')
+        with override_settings(DEBUG=False):
+            response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Content-Type'], 'text/css')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content))[:2], b'/*')
+
+
+class ServiceWorkerViewTest(TestCase):
+    """Test cases for the root-scoped service worker."""
+
+    def test_served_from_site_root(self):
+        """Test that the service worker is served at /sw.js with root scope."""
+        response = self.client.get(reverse('service_worker'))
+        self.assertEqual(reverse('service_worker'), '/sw.js')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/javascript')
+        self.assertEqual(response['Service-Worker-Allowed'], '/')
+        self.assertIn('no-cache', response['Cache-Control'])
+
+    def test_only_public_api_responses_are_cached(self):
+        """Test that per-member API responses are left to the network rather than cached stale."""
+        content = self.client.get(reverse('service_worker')).content.decode()
+        routes = re.search(r'const PAGE_ROUTES = \[(.*)\];', content).group(1)
+        patterns = [re.compile(js[1:-1].replace('\\/', '/')) for js in routes.split(', ')]
+
+        def cached(path):
+            return any(pattern.search(path) for pattern in patterns)
+
+        self.assertTrue(cached(reverse('run_list')))
+        self.assertTrue(cached(reverse('run_filter_api')))
+        self.assertTrue(cached(reverse('runs_near')))
+        self.assertFalse(cached(reverse('run_timeline', args=[1])))
+        self.assertFalse(cached(reverse('run_hold', args=[1])))
+        self.assertFalse(cached(reverse('run_group_signup_api', args=[1])))
+
+    def test_precaches_only_existing_assets(self):
+        """Test that every precached URL points at a real static file."""
+        response = self.client.get(reverse('service_worker'))
+        content = response.content.decode()
+        self.assertNotIn('/static/css/style.css', content)
+        self.assertNotIn('/static/js/app.js', content)
+        for name in PRECACHE_ASSETS:
+            self.assertIsNotNone(finders.find(name), name)
+            self.assertIn(staticfiles_storage.url(name), content)
+
+    def test_base_template_registers_root_worker(self):
+        """Test that pages register the root-scoped worker."""
+        response = self.client.get(reverse('run_list'))
+        self.assertContains(response, "navigator.serviceWorker.register('/sw.js', { scope: '/' })")
+
+    def test_run_list_with_flash_message_is_not_cacheable(self):
+        """Test that pages carrying a flash message are marked no-store."""
+        User.objects.create_user(username='testuser', password='testpass')
+        run = Run.objects.create(
+            date=date(2025, 12, 25),
+            time=time(10, 0),
+            meeting_place='Test Meeting Place',
+            venue='Test Venue',
+            length_km=5.0,
+            max_capacity=2
+        )
+        self.client.login(username='testuser', password='testpass')
+        response = self.client.get(reverse('run_signup', args=[run.id]), follow=True)
+        self.assertIn('no-store', response['Cache-Control'])
+
+        response = self.client.get(reverse('run_list'))
+        self.assertNotIn('no-store', response['Cache-Control'])
+
+
+class RunActionsBatchTest(TestCase):
+    """Test cases for the batch endpoint that replays offline sign-ups."""
+
+    def setUp(self):
+        self.client = Client(enforce_csrf_checks=True)
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.other = User.objects.create_user(username='other', password='pass')
+        self.run = Run.objects.create(
+            date=date(2025, 12, 25),
+            time=time(10, 0),
+            meeting_place='Test Meeting Place',
+            venue='Test Venue',
+            length_km=5.0,
+            max_capacity=2
+        )
+        self.full_run = Run.objects.create(
+            date=date(2025, 12, 26),
+            time=time(10, 0),
+            meeting_place='Test Meeting Place',
+            venue='Full Venue',
+            length_km=5.0,
+            max_capacity=1
+        )
+        SignUp.objects.create(user=self.other, run=self.full_run)
+        self.url = reverse('run_actions_batch')
+
+    def post_batch(self, actions):
+        self.client.login(username='testuser', password='testpass')
+        self.client.get(reverse('run_list'))
+        return self.client.post(
+            self.url,
+            data=json.dumps({'actions': actions}),
+            content_type='application/json',
+            HTTP_X_CSRFTOKEN=self.client.cookies['csrftoken'].value,
+        )
+
+    def test_requires_authentication(self):
+        """Test that anonymous batches are rejected with 401, not a redirect."""
+        response = self.client.post(self.url, data='{}', content_type='application/json')
+        self.assertIn(response.status_code, (401, 403))
+        response = Client().post(self.url, data='{"actions": []}', content_type='application/json')
+        self.assertEqual(response.status_code, 401)
+
+    def test_applies_actions_in_order_with_per_action_results(self):
+        """Test that each queued action gets its own result."""
+        response = self.post_batch([
+            {'id': 1, 'action': 'signup', 'run_id': self.run.id},
+            {'id': 2, 'action': 'signup', 'run_id': self.run.id},
+            {'id': 3, 'action': 'signup', 'run_id': self.full_run.id},
+            {'id': 4, 'action': 'cancel', 'run_id': self.full_run.id},
+            {'id': 5, 'action': 'signup', 'run_id': 9999},
+            {'id': 6, 'action': 'explode', 'run_id': self.run.id},
+        ])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'], [
+            {'id': 1, 'status': 'signed_up'},
+            {'id': 2, 'status': 'already_signed_up'},
+            {'id': 3, 'status': 'full'},
+            {'id': 4, 'status': 'not_signed_up'},
+            {'id': 5, 'status': 'not_found'},
+            {'id': 6, 'status': 'invalid'},
+        ])
+        self.assertTrue(SignUp.objects.filter(user=self.user, run=self.run).exists())
+
+    def test_signup_then_cancel(self):
+        """Test that a sign-up and later cancellation of the same run both apply."""
+        response = self.post_batch([
+            {'id': 1, 'action': 'signup', 'run_id': self.run.id},
+            {'id': 2, 'action': 'cancel', 'run_id': self.run.id},
+        ])
+        self.assertEqual([r['status'] for r in response.json()['results']], ['signed_up', 'cancelled'])
+        self.assertFalse(SignUp.objects.filter(user=self.user, run=self.run).exists())
+
+    def test_rejects_malformed_and_oversized_batches(self):
+        """Test that malformed or oversized batches are rejected."""
+        self.assertEqual(self.post_batch('nope').status_code, 400)
+        too_many = [{'id': i, 'action': 'signup', 'run_id': self.run.id} for i in range(MAX_BATCH_ACTIONS + 1)]
+        self.assertEqual(self.post_batch(too_many).status_code, 400)
+
+    def test_service_worker_knows_batch_endpoint(self):
+        """Test that the service worker is rendered with the batch endpoint."""
+        response = self.client.get(reverse('service_worker'))
+        self.assertContains(response, f"const BATCH_URL = '{self.url}';")
+
+
+class RunListRenderingTest(TestCase):
+    """Test cases for the single-pass run list."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        for i in range(5):
+            run = Run.objects.create(
+                date=date(2025, 12, 20 + i),
+                time=time(10, 0),
+                meeting_place='Test Meeting Place',
+                venue=f'Venue {i}',
+                length_km=5.0,
+                max_capacity=2
+            )
+            for n in range(i % 3):
+                SignUp.objects.create(user=User.objects.create_user(username=f'u{i}-{n}'), run=run)
+
+    def test_each_run_rendered_once(self):
+        """Test that every run appears exactly once in the markup."""
+        response = self.client.get(reverse('run_list'))
+        content = response.content.decode()
+        self.assertEqual(content.count('class="run-item'), 5)
+        self.assertEqual(content.count('Venue 0'), 1)
+        self.assertNotIn('<table', content)
+
+    def test_query_count_independent_of_run_count(self):
+        """Test that capacity is computed in the run query, not per run."""
+        self.client.login(username='testuser', password='testpass')
+        self.client.get(reverse('run_list'))
+        with self.assertNumQueries(3):
+            # Change watermark, runs with counts and facet counts; the session and member come from the cache.
+            self.client.get(reverse('run_list'))
+
+    def test_capacity_from_annotation(self):
+        """Test that annotated counts drive the capacity methods."""
+        runs = list(Run.objects.with_signup_counts())
+        with self.assertNumQueries(0):
+            self.assertEqual([r.get_signups_count() for r in runs], [0, 1, 2, 0, 1])
+            self.assertEqual([r.is_full() for r in runs], [False, False, True, False, False])
+            self.assertEqual([r.available_spots() for r in runs], [2, 1, 0, 2, 1])
+
+
+class AsyncRunViewsTest(TestCase):
+    """Test cases for the async ORM versions of the run views."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.run = Run.objects.create(
+            date=date(2025, 12, 25),
+            time=time(10, 0),
+            meeting_place='Test Meeting Place',
+            venue='Test Venue',
+            length_km=5.0,
+            max_capacity=1
+        )
+
+    def make_request(self, path, user=None):
+        """Build an async request the way the middleware would, with a lazy user."""
+        request = AsyncRequestFactory().get(path)
+        request.session = SessionStore()
+        request._messages = FallbackStorage(request)
+        request.user = SimpleLazyObject(lambda: user or AnonymousUser())
+        return request
+
+    async def test_run_list(self):
+        """Test that the async run list renders runs and the member's sign-ups."""
+        await SignUp.objects.acreate(user=self.user, run=self.run)
+        response = await views.arun_list(self.make_request('/', self.user))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Test Venue')
+        self.assertContains(response, reverse('run_cancel', args=[self.run.id]))
+
+    async def test_run_list_while_holding_last_place(self):
+        """Test that the async run list offers a member's held place back to them to confirm."""
+        await sync_to_async(services.hold_spot)(self.user, self.run)
+        response = await views.arun_list(self.make_request('/', self.user))
+        self.assertContains(response, '1/1')
+        self.assertContains(response, '>Confirm</a>')
+
+    async def test_run_list_with_stored_session(self):
+        """Test that the replica decorator loads a stored session off the event loop."""
+        session = SessionStore()
+        await sync_to_async(session.create)()
+        request = self.make_request('/', self.user)
+        request.session = SessionStore(session_key=session.session_key)
+        response = await views.arun_list(request)
+        self.assertEqual(response.status_code, 200)
+
+    async def test_signup_requires_login(self):
+        """Test that anonymous members are redirected to log in."""
+        response = await views.arun_signup(self.make_request('/signup/1/'), self.run.id)
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(response.url.startswith(reverse('login')))
+
+    async def test_signup_and_cancel(self):
+        """Test async sign-up followed by cancellation."""
+        request = self.make_request('/signup/', self.user)
+        response = await views.arun_signup(request, self.run.id)
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(await SignUp.objects.filter(user=self.user, run=self.run).aexists())
+        self.assertIn(PIN_SESSION_KEY, request.session)
+
+        response = await views.arun_cancel(self.make_request('/cancel/', self.user), self.run.id)
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(await SignUp.objects.filter(user=self.user, run=self.run).aexists())
+
+    async def test_signup_prevented_when_full(self):
+        """Test that the async capacity check rejects sign-ups to a full run."""
+        other = await User.objects.acreate(username='other')
+        await SignUp.objects.acreate(user=other, run=self.run)
+        self.assertEqual(await services.asign_up(self.user, self.run), services.RUN_FULL)
+        self.assertEqual(await services.asign_up(other, self.run), services.ALREADY_SIGNED_UP)
+
+    async def test_missing_run_is_404(self):
+        """Test that unknown runs raise 404."""
+        with self.assertRaises(Http404):
+            await views.arun_signup(self.make_request('/signup/', self.user), 9999)
+
+
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+class NotificationTest(TestCase):
+    """Test cases for the notification queue and dispatcher."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', email='test@example.com', password='testpass')
+        self.other = User.objects.create_user(username='other', email='other@example.com', password='pass')
+        self.run = Run.objects.create(
+            date=timezone.localdate() + timedelta(days=1),
+            time=time(10, 0),
+            meeting_place='Test Meeting Place',
+            venue='Test Venue',
+            length_km=5.0,
+            max_capacity=1
+        )
+
+    def test_notify_me_creates_alert_for_full_run(self):
+        """Test that members can ask to hear about a full run."""
+        SignUp.objects.create(user=self.other, run=self.run)
+        self.client.login(username='testuser', password='testpass')
+        response = self.client.post(reverse('run_notify', args=[self.run.id]))
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(SpotAlert.objects.filter(user=self.user, run=self.run).exists())
+
+    def test_notify_me_ignored_when_run_has_space(self):
+        """Test that no alert is stored for a run with places left."""
+        self.client.login(username='testuser', password='testpass')
+        self.client.post(reverse('run_notify', args=[self.run.id]))
+        self.assertFalse(SpotAlert.objects.exists())
+
+    def test_cancel_queues_spot_opened_without_sending(self):
+        """Test that cancelling queues a notice but sends nothing itself."""
+        SignUp.objects.create(user=self.other, run=self.run)
+        SpotAlert.objects.create(user=self.user, run=self.run)
+        self.client.login(username='other', password='pass')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.get(reverse('run_cancel', args=[self.run.id]))
+
+        self.assertEqual(len(mail.outbox), 0)
+        notification = Notification.objects.get()
+        self.assertEqual(notification.kind, Notification.SPOT_OPENED)
+        self.assertEqual(notification.user, self.user)
+        self.assertFalse(SpotAlert.objects.exists())
+
+    def test_deleting_run_queues_nothing(self):
+        """Test that removing a whole run does not notify watchers."""
+        SignUp.objects.create(user=self.other, run=self.run)
+        SpotAlert.objects.create(user=self.user, run=self.run)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.run.delete()
+        self.assertFalse(Notification.objects.exists())
+
+    def test_reminders_are_deduplicated(self):
+        """Test that queuing reminders twice only sends one per sign-up."""
+        SignUp.objects.create(user=self.user, run=self.run)
+        self.assertEqual(notifications.enqueue_reminders(), 1)
+        self.assertEqual(notifications.enqueue_reminders(), 0)
+        self.assertEqual(Notification.objects.count(), 1)
+
+    def test_dispatch_sends_over_one_connection(self):
+        """Test that a batch is sent through a single connection and renders once per run."""
+        big_run = Run.objects.create(
+            date=self.run.date, time=time(18, 0), meeting_place='Gate',
+            venue='Other Venue', length_km=10.0, max_capacity=10,
+        )
+        for user in (self.user, self.other):
+            SignUp.objects.create(user=user, run=big_run)
+        notifications.enqueue_reminders()
+
+        with mock.patch('runs.notifications.get_connection', wraps=mail.get_connection) as get_connection, \
+                mock.patch('runs.notifications.render_to_string', wraps=notifications.render_to_string) as render:
+            sent, failed = notifications.dispatch()
+
+        self.assertEqual((sent, failed), (2, 0))
+        get_connection.assert_called_once()
+        render.assert_called_once()
+        self.assertEqual(sorted(m.to[0] for m in mail.outbox), ['other@example.com', 'test@example.com'])
+        self.assertIn('Other Venue', mail.outbox[0].subject)
+        self.assertFalse(Notification.objects.exclude(status=Notification.SENT).exists())
+
+    def test_failed_send_is_retried_with_backoff(self):
+        """Test that failures are rescheduled and eventually given up on."""
+        SignUp.objects.create(user=self.user, run=self.run)
+        notifications.enqueue_reminders()
+
+        with mock.patch('django.core.mail.EmailMessage.send', side_effect=OSError('SMTP down')), \
+                self.assertLogs('runs.notifications', 'WARNING'):
+            self.assertEqual(notifications.dispatch(), (0, 1))
+            notification = Notification.objects.get()
+            self.assertEqual(notification.status, Notification.PENDING)
+            self.assertEqual(notification.attempts, 1)
+            self.assertGreater(notification.next_attempt_at, timezone.now())
+            # Not due yet, so nothing is retried straight away.
+            self.assertEqual(notifications.dispatch(), (0, 0))
+
+            Notification.objects.update(attempts=notifications.MAX_ATTEMPTS - 1, next_attempt_at=timezone.now())
+            notifications.dispatch()
+        self.assertEqual(Notification.objects.get().status, Notification.FAILED)
+
+        self.assertEqual(notifications.dispatch(), (0, 0))
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_claimed_batch_is_not_sent_twice(self):
+        """Test that a second sender skips notices another sender has claimed."""
+        SignUp.objects.create(user=self.user, run=self.run)
+        notifications.enqueue_reminders()
+        now = timezone.now()
+        claimed = notifications._claim(500, now)
+        self.assertEqual(len(claimed), 1)
+
+        self.assertEqual(notifications._claim(500, now), [])
+        self.assertEqual(notifications.dispatch(), (0, 0))
+        self.assertEqual(len(mail.outbox), 0)
+
+        # A sender that never finished gives its claim up after the lease.
+        later = now + notifications.CLAIM_TIMEOUT
+        self.assertEqual([n.pk for n in notifications._claim(500, later)], [claimed[0].pk])
+
+    def test_cancelling_withdraws_reminder(self):
+        """Test that a cancelled sign-up's unsent reminder is dropped."""
+        SignUp.objects.create(user=self.user, run=self.run)
+        other_run = Run.objects.create(
+            date=self.run.date, time=time(18, 0), meeting_place='Gate',
+            venue='Other Venue', length_km=10.0, max_capacity=10,
+        )
+        SignUp.objects.create(user=self.user, run=other_run)
+        notifications.enqueue_reminders()
+        with self.captureOnCommitCallbacks(execute=True):
+            services.cancel(self.user, self.run)
+
+        self.assertEqual(list(Notification.objects.values_list('run', flat=True)), [other_run.pk])
+
+    def test_dispatch_skips_reminder_without_signup(self):
+        """Test that a reminder whose sign-up vanished unnoticed is never sent."""
+        signup = SignUp.objects.create(user=self.user, run=self.run)
+        notifications.enqueue_reminders()
+        SignUp.objects.filter(pk=signup.pk)._raw_delete(using='default')
+
+        self.assertEqual(notifications.dispatch(), (0, 0))
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertFalse(Notification.objects.exists())
+
+    def test_send_notifications_command(self):
+        """Test that the worker command queues and sends tomorrow's reminders."""
+        SignUp.objects.create(user=self.user, run=self.run)
+        call_command('send_notifications', stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn('Test Venue', mail.outbox[0].body)
+        self.assertEqual(Notification.objects.get().status, Notification.SENT)
+
+
+class BallotTest(TestCase):
+    """Test cases for ballot allocation."""
+
+    def setUp(self):
+        self.users = [User.objects.create_user(username=f'runner{i}', password='pass') for i in range(6)]
+        self.run = Run.objects.create(
+            date=date(2025, 12, 25),
+            time=time(10, 0),
+            meeting_place='Test Meeting Place',
+            venue='Marquee Venue',
+            length_km=10.0,
+            max_capacity=2,
+            allocation=Run.BALLOT,
+            ballot_closes_at=timezone.now() + timedelta(days=1),
+        )
+
+    def enter_all(self):
+        for user in self.users:
+            self.assertEqual(services.sign_up(user, self.run), services.BALLOT_ENTERED)
+
+    def test_sign_up_enters_ballot_without_capacity_check(self):
+        """Test that entries are insert-only and not limited by capacity."""
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(services.sign_up(self.users[0], self.run), services.BALLOT_ENTERED)
+        statements = [q['sql'] for q in ctx.captured_queries if 'SAVEPOINT' not in q['sql']]
+        self.assertEqual(len(statements), 1)
+        self.assertTrue(statements[0].startswith('INSERT'))
+        for user in self.users[1:]:
+            services.sign_up(user, self.run)
+        self.assertEqual(BallotEntry.objects.filter(run=self.run).count(), 6)
+        self.assertEqual(SignUp.objects.count(), 0)
+        self.assertEqual(services.sign_up(self.users[0], self.run), services.ALREADY_ENTERED)
+
+    def test_entries_refused_after_close(self):
+        """Test that the ballot cannot be entered once closed."""
+        Run.objects.filter(pk=self.run.pk).update(ballot_closes_at=timezone.now() - timedelta(minutes=1))
+        self.run.refresh_from_db()
+        self.assertEqual(services.sign_up(self.users[0], self.run), services.BALLOT_CLOSED)
+
+    def test_draw_allocates_capacity_and_orders_reserves(self):
+        """Test that the draw fills the run and ranks everyone else."""
+        self.enter_all()
+        winners, reserves = ballots.draw(self.run, seed='fixed')
+
+        self.assertEqual(len(winners), 2)
+        self.assertEqual(
+            set(SignUp.objects.filter(run=self.run).values_list('user_id', flat=True)),
+            {e.user_id for e in winners},
+        )
+        self.assertEqual(
+            list(BallotEntry.objects.filter(run=self.run).values_list('reserve_position', flat=True)),
+            [1, 2, 3, 4],
+        )
+        self.run.refresh_from_db()
+        self.assertIsNotNone(self.run.ballot_drawn_at)
+        self.assertEqual(self.run.ballot_seed, 'fixed')
+        # A second draw is a no-op.
+        self.assertEqual(ballots.draw(self.run), ([], []))
+
+    def test_draw_is_reproducible_from_seed(self):
+        """Test that the same seed gives the same result."""
+        self.enter_all()
+        entries = list(BallotEntry.objects.filter(run=self.run).order_by('pk'))
+        first = ballots._draw_order(entries, random.Random(f'{self.run.pk}:seed'))
+        second = ballots._draw_order(entries, random.Random(f'{self.run.pk}:seed'))
+        self.assertEqual(first, second)
+
+    def test_priority_favours_less_frequent_attenders(self):
+        """Test that attendance weighting shifts the odds towards newer members."""
+        regular, newcomer = self.users[:2]
+        for i in range(9):
+            past = Run.objects.create(
+                date=date(2025, 1, 1 + i), time=time(10, 0), meeting_place='Gate',
+                venue='Past Venue', length_km=5.0, max_capacity=10,
+            )
+            SignUp.objects.create(user=regular, run=past, attended=True)
+        entries = [BallotEntry(run=self.run, user=regular), BallotEntry(run=self.run, user=newcomer)]
+        weights = ballots._attendance_weights([regular.pk, newcomer.pk])
+        self.assertEqual(weights, {regular.pk: 0.1, newcomer.pk: 1.0})
+
+        rng = random.Random(0)
+        newcomer_first = sum(
+            ballots._draw_order(entries, rng, weights)[0].user_id == newcomer.pk for _ in range(1000)
+        )
+        self.assertGreater(newcomer_first, 850)
+
+    def test_cancellation_promotes_top_reserve(self):
+        """Test that a freed place goes to the first reserve."""
+        self.enter_all()
+        winners, reserves = ballots.draw(self.run, seed='fixed')
+        loser = User.objects.get(pk=winners[0].user_id)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(services.cancel(loser, self.run), services.CANCELLED)
+
+        self.assertTrue(SignUp.objects.filter(run=self.run, user_id=reserves[0].user_id).exists())
+        self.assertFalse(BallotEntry.objects.filter(user_id=reserves[0].user_id).exists())
+        self.assertEqual(SignUp.objects.filter(run=self.run).count(), 2)
+
+    def test_withdraw_from_ballot(self):
+        """Test that cancelling before the draw withdraws the entry."""
+        services.sign_up(self.users[0], self.run)
+        self.assertEqual(services.cancel(self.users[0], self.run), services.BALLOT_WITHDRAWN)
+        self.assertFalse(BallotEntry.objects.exists())
+
+    def test_draw_ballots_command_draws_closed_ballots(self):
+        """Test that the command draws only ballots that have closed."""
+        self.enter_all()
+        call_command('draw_ballots', stdout=StringIO())
+        self.assertEqual(SignUp.objects.count(), 0)
+
+        Run.objects.filter(pk=self.run.pk).update(ballot_closes_at=timezone.now() - timedelta(minutes=1))
+        out = StringIO()
+        call_command('draw_ballots', stdout=out)
+        self.assertEqual(SignUp.objects.count(), 2)
+        self.assertIn('2 places allocated, 4 reserves', out.getvalue())
+
+    def test_run_list_shows_ballot_actions(self):
+        """Test that ballot runs offer entry and withdrawal instead of sign-up."""
+        self.client.login(username='runner0', password='pass')
+        response = self.client.get(reverse('run_list'))
+        self.assertContains(response, 'Enter ballot')
+        services.sign_up(self.users[0], self.run)
+        response = self.client.get(reverse('run_list'))
+        self.assertContains(response, 'Withdraw')
+
+
+class ArchiveTest(TestCase):
+    """Test cases for archiving past runs."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.other = User.objects.create_user(username='other', password='pass')
+        today = timezone.localdate()
+        self.old_runs = []
+        for i in range(5):
+            run = Run.objects.create(
+                date=today - timedelta(days=400 + i), time=time(9, 0), meeting_place='Gate',
+                venue=f'Old Venue {i}', length_km=5.0, max_capacity=3,
+            )
+            SignUp.objects.create(user=self.user, run=run, attended=i % 2 == 0)
+            SignUp.objects.create(user=self.other, run=run)
+            self.old_runs.append(run)
+        self.live_run = Run.objects.create(
+            date=today + timedelta(days=3), time=time(18, 0), meeting_place='Gate',
+            venue='Live Venue', length_km=10.0, max_capacity=3,
+        )
+        SignUp.objects.create(user=self.user, run=self.live_run)
+
+    def test_archive_moves_old_runs_in_chunks(self):
+        """Test that old runs and sign-ups move to the archive, chunk by chunk."""
+        chunks = list(archive.archive_runs(archive.archive_horizon(365), chunk_size=2))
+        self.assertEqual(chunks, [(2, 4), (2, 4), (1, 2)])
+
+        self.assertEqual(list(Run.objects.all()), [self.live_run])
+        self.assertEqual(SignUp.objects.count(), 1)
+        self.assertEqual(ArchivedRun.objects.count(), 5)
+        self.assertEqual(ArchivedSignUp.objects.count(), 10)
+        archived = ArchivedRun.objects.get(pk=self.old_runs[0].pk)
+        self.assertEqual(archived.venue, 'Old Venue 0')
+        self.assertEqual(archived.archivedsignup_set.get(user=self.user).attended, True)
+
+    def test_archiving_has_no_cancellation_side_effects(self):
+        """Test that archived sign-ups do not trigger alerts or reserve promotion."""
+        SpotAlert.objects.create(user=self.user, run=self.old_runs[0])
+        with self.captureOnCommitCallbacks(execute=True):
+            list(archive.archive_runs(archive.archive_horizon(365)))
+        self.assertFalse(Notification.objects.exists())
+        self.assertFalse(SpotAlert.objects.exists())
+
+    def test_history_and_stats_span_live_and_archive(self):
+        """Test that member history reads both tables transparently."""
+        list(archive.archive_runs(archive.archive_horizon(365)))
+        history = list(archive.member_history(self.user))
+        self.assertEqual([row['run__venue'] for row in history[:2]], ['Live Venue', 'Old Venue 0'])
+        self.assertEqual(len(history), 6)
+        totals = stats.compute(self.user.pk)
+        self.assertEqual((totals['runs_signed_up'], totals['runs_attended']), (6, 3))
+
+    def test_history_view_and_csv_export(self):
+        """Test the member history page and its CSV download."""
+        list(archive.archive_runs(archive.archive_horizon(365)))
+        self.client.login(username='testuser', password='testpass')
+        response = self.client.get(reverse('run_history'))
+        self.assertContains(response, 'Old Venue 4')
+        self.assertContains(response, 'Live Venue')
+
+        response = self.client.get(reverse('run_history'), {'format': 'csv'})
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        lines = response.content.decode().strip().splitlines()
+        self.assertEqual(len(lines), 7)
+        self.assertTrue(lines[1].split(',')[2] == 'Live Venue')
+
+    def test_run_list_only_reads_live_tables(self):
+        """Test that the run list no longer shows archived runs."""
+        call_command('archive_runs', stdout=StringIO())
+        response = self.client.get(reverse('run_list'))
+        self.assertContains(response, 'Live Venue')
+        self.assertNotContains(response, 'Old Venue')
+
+    def test_archive_runs_dry_run(self):
+        """Test that --dry-run reports without moving anything."""
+        out = StringIO()
+        call_command('archive_runs', '--dry-run', stdout=out)
+        self.assertIn('Would archive 5 runs and 10 sign-ups', out.getvalue())
+        self.assertEqual(Run.objects.count(), 6)
+
+
+class MemberStatsTest(TestCase):
+    """Test cases for incremental member stats and the My Runs page."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        today = timezone.localdate()
+        self.past = []
+        for i in range(4):
+            run = Run.objects.create(
+                date=today - timedelta(days=7 * (i + 1)), time=time(9, 0), meeting_place='Gate',
+                venue=f'Past Venue {i}', length_km=5.0 + i, max_capacity=10,
+            )
+            self.past.append(run)
+        # Newest first: attended, attended, missed, attended.
+        for run, attended in zip(self.past, [True, True, False, True]):
+            SignUp.objects.create(user=self.user, run=run, attended=attended)
+        self.upcoming = Run.objects.create(
+            date=today + timedelta(days=2), time=time(18, 0), meeting_place='Gate',
+            venue='Next Venue', length_km=10.0, max_capacity=10,
+        )
+
+    def assertMatchesRebuild(self):
+        row = MemberStats.objects.get(user=self.user)
+        fresh = stats.compute(self.user.pk)
+        for field, value in fresh.items():
+            self.assertEqual(getattr(row, field), value, field)
+
+    def test_first_read_computes_row(self):
+        """Test that a member's stats row is computed from their history on first use."""
+        row = stats.get_stats(self.user)
+        self.assertEqual(row.runs_signed_up, 4)
+        self.assertEqual(row.runs_attended, 3)
+        self.assertEqual(row.km_attended, Decimal('19.00'))
+        self.assertEqual(row.current_streak, 2)
+        self.assertEqual(row.last_attended_on, self.past[0].date)
+
+    def test_streak_breaks_when_a_run_passes_without_member(self):
+        """Test that a run passing unattended breaks the streak on the next read, with no sign-up change."""
+        signup = SignUp.objects.create(user=self.user, run=self.upcoming)
+        self.assertEqual(stats.get_stats(self.user).current_streak, 2)
+        with self.assertNumQueries(2):
+            stats.get_stats(self.user)
+
+        Run.objects.filter(pk=self.upcoming.pk).update(date=timezone.localdate() - timedelta(days=1))
+        self.assertEqual(stats.get_stats(self.user).current_streak, 0)
+        self.assertEqual(MemberStats.objects.get(user=self.user).current_streak, 0)
+        self.assertMatchesRebuild()
+
+        signup.attended = True
+        signup.save()
+        self.assertEqual(stats.get_stats(self.user).current_streak, 3)
+
+    def test_signups_and_attendance_update_incrementally(self):
+        """Test that sign-ups, cancellations and attendance changes keep the row in step."""
+        stats.get_stats(self.user)
+        signup = SignUp.objects.create(user=self.user, run=self.upcoming)
+        self.assertMatchesRebuild()
+
+        missed = SignUp.objects.get(run=self.past[2])
+        missed.attended = True
+        missed.save()
+        self.assertEqual(MemberStats.objects.get(user=self.user).current_streak, 4)
+        self.assertMatchesRebuild()
+
+        latest = SignUp.objects.get(run=self.past[0])
+        latest.attended = False
+        latest.save()
+        self.assertEqual(MemberStats.objects.get(user=self.user).current_streak, 0)
+        self.assertMatchesRebuild()
+
+        signup.delete()
+        latest.delete()
+        self.assertMatchesRebuild()
+
+    def test_ballot_signups_are_counted(self):
+        """Test that sign-ups created in bulk by a ballot draw are counted."""
+        stats.get_stats(self.user)
+        run = Run.objects.create(
+            date=timezone.localdate() + timedelta(days=9), time=time(9, 0), meeting_place='Gate',
+            venue='Ballot Venue', length_km=5.0, max_capacity=10, allocation=Run.BALLOT,
+            ballot_closes_at=timezone.now() - timedelta(hours=1),
+        )
+        BallotEntry.objects.create(run=run, user=self.user)
+        ballots.draw(run, seed='x')
+        self.assertEqual(MemberStats.objects.get(user=self.user).runs_signed_up, 5)
+
+    def test_archiving_keeps_totals(self):
+        """Test that moving sign-ups to the archive doesn't count as cancelling them."""
+        stats.get_stats(self.user)
+        list(archive.archive_runs(archive.archive_horizon(0)))
+        self.assertFalse(SignUp.objects.filter(user=self.user).exists())
+        self.assertMatchesRebuild()
+        self.assertEqual(MemberStats.objects.get(user=self.user).runs_signed_up, 4)
+
+    def test_rebuild_command(self):
+        """Test that the rebuild command corrects drifted rows."""
+        MemberStats.objects.create(user=self.user, runs_signed_up=99)
+        out = StringIO()
+        call_command('rebuild_member_stats', stdout=out)
+        self.assertIn('Rebuilt stats for 1 members', out.getvalue())
+        self.assertMatchesRebuild()
+
+        call_command('rebuild_member_stats', '--user', 'testuser', stdout=out)
+        with self.assertRaises(CommandError):
+            call_command('rebuild_member_stats', '--user', 'nobody', stdout=out)
+
+    def test_deleting_member_removes_row(self):
+        """Test that deleting a member with sign-ups also deletes their stats."""
+        stats.get_stats(self.user)
+        self.user.delete()
+        self.assertFalse(MemberStats.objects.exists())
+
+    def test_my_runs_page_uses_fixed_queries(self):
+        """Test that My Runs costs the same number of queries however long the history is."""
+        SignUp.objects.create(user=self.user, run=self.upcoming)
+        self.client.login(username='testuser', password='testpass')
+        stats.get_stats(self.user)
+        member_cache.get_member(self.user.pk)
+        # Stats row, the lapsed-streak check, upcoming sign-ups and the history page; the member is cached.
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse('run_history'))
+        self.assertContains(response, 'Next Venue')
+        self.assertContains(response, 'Past Venue 3')
+        self.assertEqual(response.context['stats'].current_streak, 2)
+
+        for i in range(20):
+            run = Run.objects.create(
+                date=timezone.localdate() - timedelta(days=100 + i), time=time(9, 0), meeting_place='Gate',
+                venue='Older Venue', length_km=5.0, max_capacity=10,
+            )
+            SignUp.objects.create(user=self.user, run=run, attended=True)
+        member_cache.get_member(self.user.pk)
+        with self.assertNumQueries(4):
+            self.client.get(reverse('run_history'))
+
+
+class AnalyticsTest(TestCase):
+    """Test cases for the analytics rollups and admin charts."""
+
+    def setUp(self):
+        self.this_month = analytics.month_start(timezone.localdate())
+        self.last_month = analytics.month_start(self.this_month - timedelta(days=1))
+        joined = timezone.make_aware(timezone.datetime.combine(self.last_month, time(12, 0)))
+        self.users = [
+            User.objects.create_user(username=f'runner{i}', password='pass', date_joined=joined)
+            for i in range(3)
+        ]
+        self.park = [
+            Run.objects.create(
+                date=self.last_month + timedelta(days=i), time=time(9, 0), meeting_place='Gate',
+                venue='Victoria Park', length_km=5.0, max_capacity=4,
+            )
+            for i in range(2)
+        ]
+        self.canal = Run.objects.create(
+            date=self.last_month + timedelta(days=3), time=time(18, 0), meeting_place='Lock',
+            venue='Canal', length_km=10.0, max_capacity=10,
+        )
+        for user in self.users:
+            SignUp.objects.create(user=user, run=self.park[0], attended=True)
+        SignUp.objects.create(user=self.users[0], run=self.park[1], attended=True)
+        SignUp.objects.create(user=self.users[1], run=self.park[1])
+        SignUp.objects.create(user=self.users[0], run=self.canal, attended=True)
+        # Pretend everything so far changed long ago.
+        Run.objects.update(updated_at=timezone.now() - timedelta(days=1))
+        analytics.refresh_rollups()
+
+    def venue_month(self, venue='Victoria Park'):
+        return VenueMonthRollup.objects.get(venue=venue, month=self.last_month)
+
+    def test_rollups_sum_signups_and_attendance(self):
+        """Test the per-run, venue-month and cohort totals."""
+        self.assertEqual(RunRollup.objects.count(), 3)
+        park = self.venue_month()
+        self.assertEqual((park.runs, park.places, park.signups, park.attended), (2, 8, 5, 4))
+        self.assertEqual(park.km_attended, Decimal('20.00'))
+        cohort = CohortRollup.objects.get()
+        self.assertEqual((cohort.cohort, cohort.month), (self.last_month, self.last_month))
+        self.assertEqual((cohort.members, cohort.runs_attended), (3, 5))
+
+    def test_incremental_refresh_only_reprocesses_changed_runs(self):
+        """Test that a refresh recomputes just the runs changed since the watermark."""
+        self.assertEqual(analytics.refresh_rollups()['runs'], 0)
+
+        signup = SignUp.objects.get(user=self.users[1], run=self.park[1])
+        signup.attended = True
+        signup.save()
+        self.assertEqual(analytics.refresh_rollups(), {'runs': 1, 'venue_months': 1, 'cohorts': 1})
+        self.assertEqual(self.venue_month().attended, 5)
+        self.assertEqual(self.venue_month('Canal').attended, 1)
+
+    def test_moved_and_deleted_runs(self):
+        """Test that a run's old venue month is re-summed when it moves or is deleted."""
+        self.canal.venue = 'Victoria Park'
+        self.canal.save()
+        analytics.refresh_rollups()
+        self.assertFalse(VenueMonthRollup.objects.filter(venue='Canal').exists())
+        self.assertEqual(self.venue_month().runs, 3)
+
+        self.canal.delete()
+        analytics.refresh_rollups()
+        self.assertEqual(RunRollup.objects.count(), 2)
+        self.assertEqual(self.venue_month().runs, 2)
+        self.assertEqual(CohortRollup.objects.get().runs_attended, 4)
+
+    def test_archived_runs_keep_their_rollups(self):
+        """Test that archiving runs leaves the analytics unchanged."""
+        list(archive.archive_runs(self.this_month))
+        self.assertFalse(Run.objects.exists())
+        analytics.refresh_rollups()
+        self.assertEqual(RunRollup.objects.count(), 3)
+        self.assertEqual(self.venue_month().attended, 4)
+
+        analytics.refresh_rollups(full=True)
+        self.assertEqual(self.venue_month().signups, 5)
+
+    def test_charts(self):
+        """Test the chart data for complete months, venues and cohorts."""
+        month = analytics.monthly_turnout()[-1]
+        self.assertEqual(month['month'], self.last_month)
+        self.assertEqual((month['attended'], month['bar']), (5, 100))
+        self.assertAlmostEqual(month['fill_rate'], 6 / 18)
+        venues = analytics.venue_summary()
+        self.assertEqual([row['venue'] for row in venues], ['Victoria Park', 'Canal'])
+        self.assertAlmostEqual(venues[0]['no_show_rate'], 1 / 5)
+        retention = analytics.cohort_retention()
+        self.assertEqual(retention[-2]['cohort'], self.last_month)
+        self.assertEqual(retention[-2]['size'], 3)
+        self.assertEqual(retention[-2]['cells'][0]['rate'], 1)
+
+    def test_admin_analytics_page(self):
+        """Test that the admin analytics page renders its charts from the rollups."""
+        User.objects.create_superuser(username='admin', email='admin@example.com', password='pass')
+        self.client.login(username='admin', password='pass')
+        response = self.client.get(reverse('admin:runs_venuemonthrollup_changelist'))
+        self.assertContains(response, 'Monthly turnout')
+        self.assertContains(response, 'Victoria Park')
+        self.assertContains(response, 'width: 100%')
+
+    def test_refresh_rollups_command(self):
+        """Test the refresh_rollups management command."""
+        out = StringIO()
+        call_command('refresh_rollups', '--full', stdout=out)
+        self.assertIn('Refreshed 3 run rollups, 2 venue months and 1 cohort months', out.getvalue())
+
+
+class MemberCacheTest(TestCase):
+    """Test cases for the cached member bundle and cached sessions."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        UserProfile.objects.create(
+            user=self.user, emergency_contact_name='Ray', emergency_contact_phone='07700 900002',
+        )
+        self.run = Run.objects.create(
+            date=timezone.localdate() + timedelta(days=2), time=time(9, 0), meeting_place='Gate',
+            venue='Victoria Park', length_km=5.0, max_capacity=10,
+        )
+
+    def test_bundle_served_from_cache(self):
+        """Test that the user, profile and sign-up IDs load once, then from the cache."""
+        SignUp.objects.create(user=self.user, run=self.run)
+        member_cache.get_member(self.user.pk)
+        with self.assertNumQueries(0):
+            user = member_cache.get_member(self.user.pk)
+            self.assertEqual(user.profile.emergency_contact_name, 'Ray')
+            self.assertEqual(member_cache.signup_run_ids(user), [self.run.pk])
+
+    def test_changes_invalidate_bundle(self):
+        """Test that saving the user, profile or a sign-up drops the cached bundle."""
+        member_cache.get_member(self.user.pk)
+        signup = SignUp.objects.create(user=self.user, run=self.run)
+        self.assertEqual(member_cache.get_member(self.user.pk).signup_run_ids, [self.run.pk])
+
+        self.user.profile.emergency_contact_name = 'Rae'
+        self.user.profile.save()
+        self.assertEqual(member_cache.get_member(self.user.pk).profile.emergency_contact_name, 'Rae')
+
+        self.user.first_name = 'Tess'
+        self.user.save()
+        self.assertEqual(member_cache.get_member(self.user.pk).first_name, 'Tess')
+
+        signup.delete()
+        self.assertEqual(member_cache.get_member(self.user.pk).signup_run_ids, [])
+
+    def test_ballot_draw_invalidates_winners(self):
+        """Test that sign-ups bulk-created by a ballot draw reach the cached bundle."""
+        run = Run.objects.create(
+            date=timezone.localdate() + timedelta(days=9), time=time(9, 0), meeting_place='Gate',
+            venue='Ballot Venue', length_km=5.0, max_capacity=10, allocation=Run.BALLOT,
+            ballot_closes_at=timezone.now() - timedelta(hours=1),
+        )
+        BallotEntry.objects.create(run=run, user=self.user)
+        member_cache.get_member(self.user.pk)
+        ballots.draw(run, seed='x')
+        self.assertEqual(member_cache.get_member(self.user.pk).signup_run_ids, [run.pk])
+
+    def test_inactive_users_are_not_authenticated(self):
+        """Test that the backend still refuses deactivated users from the cache."""
+        backend = EmailOrUsernameBackend()
+        self.assertEqual(backend.get_user(self.user.pk), self.user)
+        self.user.is_active = False
+        self.user.save()
+        self.assertIsNone(backend.get_user(self.user.pk))
+        self.assertIsNone(backend.get_user(999))
+
+    def test_steady_state_pages_make_no_auth_queries(self):
+        """Test that a logged-in member's repeat page views skip session, user and profile queries."""
+        SignUp.objects.create(user=self.user, run=self.run)
+        self.client.login(username='testuser', password='testpass')
+        self.client.get(reverse('run_list'))
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('run_list'))
+        self.assertContains(response, reverse('run_cancel', args=[self.run.pk]))
+        tables = ('"django_session"', '"auth_user"', '"runs_userprofile"', '"runs_signup"."run_id" FROM')
+        self.assertFalse([q['sql'] for q in ctx.captured_queries if any(t in q['sql'] for t in tables)])
+
+
+class WaitingRoomTest(TestCase):
+    """Test cases for the waiting room in front of scheduled sign-up openings."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.run = Run.objects.create(
+            date=timezone.localdate() + timedelta(days=30), time=time(9, 0), meeting_place='Gate',
+            venue='Big Race', length_km=10.0, max_capacity=100,
+            opens_at=timezone.now() + timedelta(minutes=5), admission_rate=2,
+        )
+        self.client.login(username='testuser', password='testpass')
+
+    def open_now(self, seconds_ago=0):
+        self.run.opens_at = timezone.now() - timedelta(seconds=seconds_ago)
+        self.run.save()
+
+    def test_early_arrivals_queue(self):
+        """Test that sign-ups before opening go to the waiting room, not the database."""
+        response = self.client.get(reverse('run_signup', args=[self.run.pk]))
+        self.assertRedirects(response, reverse('waiting_room', args=[self.run.pk]))
+        response = self.client.get(reverse('waiting_room', args=[self.run.pk]))
+        self.assertContains(response, "You're in the queue")
+        self.assertEqual(response.context['status']['position'], 1)
+        self.assertFalse(SignUp.objects.exists())
+        self.assertEqual(services.sign_up(self.user, self.run), services.NOT_OPEN)
+
+    def test_positions_follow_arrival_and_survive_refresh(self):
+        """Test that members are queued in arrival order and keep their place on reload."""
+        self.client.get(reverse('waiting_room', args=[self.run.pk]))
+        other = Client()
+        other.force_login(User.objects.create_user(username='second'))
+        response = other.get(reverse('waiting_room', args=[self.run.pk]))
+        self.assertEqual(response.context['status']['position'], 2)
+        response = self.client.get(reverse('waiting_room', args=[self.run.pk]))
+        self.assertEqual(response.context['status']['position'], 1)
+
+    def test_polling_never_touches_database(self):
+        """Test that the status endpoint is served from the session and cache."""
+        self.client.get(reverse('waiting_room', args=[self.run.pk]))
+        self.client.get(reverse('waiting_room_status', args=[self.run.pk]))
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('waiting_room_status', args=[self.run.pk]))
+        body = response.json()
+        self.assertEqual((body['position'], body['ahead'], body['admitted']), (1, 0, False))
+        self.assertGreater(body['wait_seconds'], 200)
+        self.assertIn('no-store', response['Cache-Control'])
+
+    def test_admission_rate(self):
+        """Test that positions are let through at the run's admission rate."""
+        room = waiting_room.get_room(self.run.pk)
+        opens_at = room['opens_at']
+        self.assertFalse(waiting_room.is_admitted(room, 1, now=opens_at - timedelta(seconds=1)))
+        at_one_second = opens_at + timedelta(seconds=1)
+        self.assertEqual(
+            [waiting_room.is_admitted(room, p, now=at_one_second) for p in (1, 2, 3, 4)],
+            [True, True, True, False],
+        )
+        self.assertEqual(waiting_room.status(room, self.run.pk, 6, now=at_one_second)['ahead'], 2)
+        self.assertFalse(waiting_room.is_active(room, now=opens_at + waiting_room.ROOM_OPEN_FOR))
+
+    def test_admitted_member_signs_up(self):
+        """Test that a member whose turn has come goes through to the real sign-up."""
+        self.open_now(seconds_ago=10)
+        response = self.client.get(reverse('waiting_room', args=[self.run.pk]))
+        self.assertRedirects(response, reverse('run_signup', args=[self.run.pk]), fetch_redirect_response=False)
+        self.client.get(reverse('run_signup', args=[self.run.pk]))
+        self.assertTrue(SignUp.objects.filter(user=self.user, run=self.run).exists())
+
+    def test_tokens_are_bound_to_member_and_run(self):
+        """Test that a queue token can't be reused by another member or for another run."""
+        room = waiting_room.get_room(self.run.pk)
+        token = waiting_room._issue(room, self.run.pk, self.user.pk)
+        self.assertEqual(waiting_room._position(token, room, self.run.pk, self.user.pk), 1)
+        self.assertIsNone(waiting_room._position(token, room, self.run.pk, self.user.pk + 1))
+        self.assertIsNone(waiting_room._position(token, room, self.run.pk + 1, self.user.pk))
+        self.assertIsNone(waiting_room._position(token + 'x', room, self.run.pk, self.user.pk))
+        # A new opening time starts a fresh queue.
+        moved = dict(room, opens_at=room['opens_at'] + timedelta(hours=1))
+        self.assertIsNone(waiting_room._position(token, moved, self.run.pk, self.user.pk))
+        token = waiting_room._issue(moved, self.run.pk, self.user.pk)
+        self.assertEqual(waiting_room._position(token, moved, self.run.pk, self.user.pk), 1)
+
+    def test_early_joins_last_until_the_room_closes(self):
+        """Test that the counter and token cookie last until closing, however early members join."""
+        room = dict(waiting_room.get_room(self.run.pk), opens_at=timezone.now() + timedelta(hours=5))
+        with mock.patch.object(waiting_room.cache, 'add', wraps=waiting_room.cache.add) as add:
+            waiting_room._issue(room, self.run.pk, self.user.pk)
+        self.assertGreater(add.call_args.kwargs['timeout'], (5 * 60 + 30) * 60 - 5)
+
+        response = self.client.get(reverse('waiting_room', args=[self.run.pk]))
+        cookie = response.cookies[f'{waiting_room.TOKEN_COOKIE_PREFIX}{self.run.pk}']
+        self.assertTrue(cookie['httponly'])
+        closes_in = (waiting_room.closes_at(waiting_room.get_room(self.run.pk)) - timezone.now()).total_seconds()
+        self.assertAlmostEqual(cookie['max-age'], closes_in, delta=5)
+
+    def test_joining_never_touches_database(self):
+        """Test that joining the queue keeps the token in a cookie rather than writing the session."""
+        self.client.get(reverse('run_list'))
+        waiting_room.get_room(self.run.pk)
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('waiting_room', args=[self.run.pk]))
+        self.assertEqual(response.context['status']['position'], 1)
+
+    def test_full_run_stops_the_queue(self):
+        """Test that the queue is told once the run fills up."""
+        self.run.max_capacity = 1
+        self.open_now(seconds_ago=10)
+        SignUp.objects.create(user=User.objects.create_user(username='quick'), run=self.run)
+        self.client.get(reverse('waiting_room', args=[self.run.pk]))
+        self.client.get(reverse('run_signup', args=[self.run.pk]))
+        self.assertTrue(waiting_room.status(waiting_room.get_room(self.run.pk), self.run.pk, 1)['full'])
+
+    def test_batch_api_respects_queue(self):
+        """Test that offline sign-up replays can't jump the queue."""
+        response = self.client.post(
+            reverse('run_actions_batch'),
+            json.dumps({'actions': [{'id': 1, 'action': 'signup', 'run_id': self.run.pk}]}),
+            content_type='application/json',
+        )
+        self.assertEqual(response.json()['results'][0]['status'], services.IN_WAITING_ROOM)
+
+    def test_runs_without_opening_time_skip_the_room(self):
+        """Test that ordinary runs sign up directly and their room lookup is cached."""
+        self.run.opens_at = None
+        self.run.save()
+        self.assertIsNone(waiting_room.get_room(self.run.pk))
+        with self.assertNumQueries(0):
+            self.assertIsNone(waiting_room.get_room(self.run.pk))
+        response = self.client.get(reverse('waiting_room', args=[self.run.pk]))
+        self.assertRedirects(response, reverse('run_signup', args=[self.run.pk]), fetch_redirect_response=False)
+
+
+class SignUpEventTest(TestCase):
+    """Test cases for the sign-up event log and run timelines."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.other = User.objects.create_user(username='other')
+        self.run = Run.objects.create(
+            date=timezone.localdate() + timedelta(days=7), time=time(9, 0), meeting_place='Gate',
+            venue='Park', length_km=5.0, max_capacity=2,
+        )
+
+    def changes(self):
+        return list(SignUpEvent.objects.filter(run_id=self.run.pk).values_list('user_id', 'change'))
+
+    def test_sign_ups_and_cancellations_are_logged(self):
+        """Test that each sign-up and cancellation appends one event."""
+        services.sign_up(self.user, self.run)
+        services.sign_up(self.other, self.run)
+        services.cancel(self.user, self.run)
+        self.assertEqual(self.changes(), [(self.user.pk, 1), (self.other.pk, 1), (self.user.pk, -1)])
+        self.assertEqual([point['signups'] for point in events.timeline(self.run.pk)], [1, 2, 1])
+
+    def test_bulk_paths_are_logged(self):
+        """Test that queryset deletes and ballot draws are logged too."""
+        SignUp.objects.create(user=self.user, run=self.run)
+        SignUp.objects.filter(run=self.run).delete()
+        self.run.allocation = Run.BALLOT
+        self.run.save()
+        BallotEntry.objects.create(user=self.other, run=self.run)
+        ballots.draw(self.run, seed='x')
+        self.assertEqual(self.changes(), [(self.user.pk, 1), (self.user.pk, -1), (self.other.pk, 1)])
+
+    def test_archiving_is_not_a_cancellation(self):
+        """Test that archived runs keep their timeline without gaining cancellations."""
+        self.run.date = timezone.localdate() - timedelta(days=400)
+        self.run.save()
+        SignUp.objects.create(user=self.user, run=self.run)
+        list(archive.archive_runs(archive.archive_horizon(365)))
+        self.assertTrue(ArchivedRun.objects.filter(pk=self.run.pk).exists())
+        self.assertEqual(self.changes(), [(self.user.pk, 1)])
+
+    def test_events_are_append_only(self):
+        """Test that a logged event can't be edited."""
+        SignUp.objects.create(user=self.user, run=self.run)
+        event = SignUpEvent.objects.get()
+        event.change = SignUpEvent.CANCELLED
+        with self.assertRaises(ValueError):
+            event.save()
+
+    def test_timeline_api_streams_from_log(self):
+        """Test that the timeline API streams points and reads only the event log."""
+        SignUp.objects.create(user=self.user, run=self.run)
+        SignUp.objects.create(user=self.other, run=self.run)
+        url = reverse('run_timeline', args=[self.run.pk])
+        self.client.login(username='testuser', password='testpass')
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+        self.user.user_permissions.add(Permission.objects.get(codename='view_signupevent'))
+        member_cache.invalidate(self.user.pk)
+        response = self.client.get(url)
+        self.assertTrue(response.streaming)
+        with CaptureQueriesContext(connection) as ctx:
+            body = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(body['run'], self.run.pk)
+        self.assertEqual([(p['user'], p['signups']) for p in body['points']], [(self.user.pk, 1), (self.other.pk, 2)])
+        self.assertFalse(any('"runs_signup"' in q['sql'] or '"runs_run"' in q['sql'] for q in ctx.captured_queries))
+
+    def test_unknown_run_has_empty_timeline(self):
+        """Test that a run with no events streams an empty series."""
+        self.assertEqual(json.loads(''.join(events.timeline_json(999))), {'run': 999, 'points': []})
+
+
+class RetentionTest(TestCase):
+    """Test cases for the data retention purge."""
+
+    def setUp(self):
+        self.long_ago = timezone.now() - timedelta(days=1000)
+        self.horizon = retention.retention_horizon(730)
+        self.old_run = ArchivedRun.objects.create(
+            id=9001, date=self.long_ago.date(), time=time(9, 0), meeting_place='Gate', venue='Park',
+            length_km=5, max_capacity=10,
+        )
+        self.active = User.objects.create_user(username='active')
+
+    def stale_member(self, username, **fields):
+        user = User.objects.create_user(username=username, email=f'{username}@example.com', **fields)
+        User.objects.filter(pk=user.pk).update(date_joined=self.long_ago, last_login=self.long_ago)
+        UserProfile.objects.create(user=user, emergency_contact_name='Kin', emergency_contact_phone='123')
+        ArchivedSignUp.objects.create(
+            id=user.pk, user=user, run=self.old_run, signed_up_at=self.long_ago, attended=True,
+        )
+        return user
+
+    def test_inactive_members(self):
+        """Test that only members idle since the horizon, and not staff, are selected."""
+        stale = self.stale_member('stale')
+        self.stale_member('boss', is_staff=True)
+        runner = self.stale_member('runner')
+        run = Run.objects.create(
+            date=timezone.localdate() + timedelta(days=3), time=time(9, 0), meeting_place='Gate',
+            venue='Park', length_km=5, max_capacity=10,
+        )
+        SignUp.objects.create(user=runner, run=run)
+        self.assertEqual(list(retention.inactive_members(self.horizon)), [stale])
+
+    def test_purge_members_in_batches(self):
+        """Test that inactive members are deleted a batch at a time with their data."""
+        stale = [self.stale_member(f'stale{i}') for i in range(3)]
+        SignUpEvent.objects.create(run_id=self.old_run.pk, user_id=stale[0].pk, change=SignUpEvent.SIGNED_UP)
+        batches = list(retention.purge_members(self.horizon, batch_size=2))
+        self.assertEqual(batches, [(2, 2), (1, 1)])
+        self.assertFalse(User.objects.filter(pk__in=[u.pk for u in stale]).exists())
+        self.assertFalse(UserProfile.objects.exists())
+        self.assertFalse(ArchivedSignUp.objects.exists())
+        self.assertIsNone(SignUpEvent.objects.get().user_id)
+        self.assertTrue(User.objects.filter(pk=self.active.pk).exists())
+
+    def test_purging_past_signups_is_not_a_cancellation(self):
+        """Test that a purged member's live sign-ups aren't logged as cancellations."""
+        stale = self.stale_member('stale')
+        run = Run.objects.create(
+            date=self.long_ago.date(), time=time(9, 0), meeting_place='Gate', venue='Park',
+            length_km=5, max_capacity=10,
+        )
+        SignUp.objects.create(user=stale, run=run)
+        SignUp.objects.filter(user=stale).update(signed_up_at=self.long_ago)
+        with mock.patch('runs.signals.place_freed') as place_freed, self.captureOnCommitCallbacks(execute=True):
+            list(retention.purge_members(self.horizon))
+        self.assertFalse(SignUp.objects.exists())
+        self.assertFalse(SignUpEvent.objects.filter(change=SignUpEvent.CANCELLED).exists())
+        place_freed.assert_not_called()
+
+    def test_anonymise_members(self):
+        """Test that anonymising strips personal details but keeps run history."""
+        stale = self.stale_member('stale')
+        self.assertEqual(list(retention.purge_members(self.horizon, anonymise=True)), [(1, 0)])
+        stale.refresh_from_db()
+        self.assertEqual(stale.username, f'{retention.ANONYMISED_PREFIX}{stale.pk}')
+        self.assertEqual((stale.email, stale.is_active, stale.has_usable_password()), ('', False, False))
+        self.assertFalse(UserProfile.objects.filter(user=stale).exists())
+        self.assertTrue(ArchivedSignUp.objects.filter(user=stale).exists())
+        self.assertEqual(list(retention.purge_members(self.horizon, anonymise=True)), [])
+
+    def test_purge_signups(self):
+        """Test that old archived sign-ups go and old events lose their member."""
+        self.stale_member('stale')
+        recent_run = ArchivedRun.objects.create(
+            id=9002, date=timezone.localdate() - timedelta(days=400), time=time(9, 0), meeting_place='Gate',
+            venue='Park', length_km=5, max_capacity=10,
+        )
+        ArchivedSignUp.objects.create(id=1, user=self.active, run=recent_run, signed_up_at=timezone.now())
+        SignUpEvent.objects.create(run_id=self.old_run.pk, user_id=self.active.pk, change=1, at=self.long_ago)
+        SignUpEvent.objects.create(run_id=recent_run.pk, user_id=self.active.pk, change=1)
+        batches = list(retention.purge_signups(self.horizon, batch_size=1))
+        self.assertEqual(batches, [(1, 1)])
+        self.assertEqual(list(ArchivedSignUp.objects.values_list('run_id', flat=True)), [recent_run.pk])
+        self.assertEqual(list(SignUpEvent.objects.values_list('user_id', flat=True)), [None, self.active.pk])
+
+    def test_event_purges_use_indexes(self):
+        """Test that clearing members from the event log doesn't scan the whole log."""
+        by_member = SignUpEvent.objects.filter(user_id__in=[self.active.pk]).explain()
+        self.assertIn('USING INDEX signupevent_user_idx', by_member)
+        old = SignUpEvent.objects.filter(at__lt=self.horizon, user_id__isnull=False).order_by('at', 'pk')
+        self.assertIn('USING INDEX signupevent_named_at_idx', old.explain())
+
+    def test_command_dry_run(self):
+        """Test that a dry run reports counts and changes nothing."""
+        self.stale_member('stale')
+        out = StringIO()
+        call_command('purge_old_data', '--dry-run', stdout=out)
+        self.assertIn('Would delete 1 members', out.getvalue())
+        self.assertEqual(User.objects.count(), 2)
+
+        out = StringIO()
+        call_command('purge_old_data', '--signup-days', '730', stdout=out)
+        self.assertIn('Deleted 1 inactive members; deleted 1 sign-ups', out.getvalue())
+        self.assertEqual(User.objects.count(), 1)
+
+
+class WarmUpTest(TestCase):
+    """Test cases for the fast-start warm-up and lazily loaded admin URLs."""
+
+    def test_warm_up(self):
+        """Test that warm-up loads the URLconf and templates and reports each step."""
+        from django.template import engines
+        from .warmup import WARM_TEMPLATES, warm_up
+
+        timings = warm_up()
+        self.assertEqual(set(timings), {'urls', 'templates', 'static', 'database'})
+        loader = engines['django'].engine.template_loaders[0]
+        self.assertTrue(all(any(key.startswith(name) for key in loader.get_template_cache) for name in WARM_TEMPLATES))
+        self.assertNotIn('database', warm_up(database=False))
+
+    def test_lazy_admin_urls(self):
+        """Test that the admin URLconf registers the ModelAdmins when first read."""
+        from mrc_runs.urls import LazyAdminURLConf
+
+        with mock.patch('django.contrib.admin.autodiscover') as autodiscover:
+            conf = LazyAdminURLConf()
+            autodiscover.assert_not_called()
+            names = {pattern.pattern.describe() for pattern in conf.urlpatterns}
+        autodiscover.assert_called_once()
+        self.assertIn("'runs/run/'", names)
+        self.assertEqual(reverse('admin:runs_run_changelist'), '/admin/runs/run/')
+
+
+class ConditionalGetTest(TestCase):
+    """Test cases for ETags on the run list and rosters, and response compression."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.run = Run.objects.create(
+            date=timezone.localdate() + timedelta(days=7), time=time(9, 0), meeting_place='Gate',
+            venue='Park', length_km=5.0, max_capacity=10,
+        )
+        self.url = reverse('run_list')
+
+    def revalidate(self, url=None, etag=None, **headers):
+        return self.client.get(url or self.url, HTTP_IF_NONE_MATCH=etag, **headers)
+
+    def test_unchanged_run_list_is_not_modified(self):
+        """Test that refreshing an unchanged run list gets 304, and a change gets the page."""
+        etag = self.client.get(self.url)['ETag']
+        self.assertIn('no-cache', self.client.get(self.url)['Cache-Control'])
+        response = self.revalidate(etag=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+        SignUp.objects.create(user=self.user, run=self.run)
+        response = self.revalidate(etag=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_watermark_catches_deletes_and_the_clock(self):
+        """Test that deleted runs and passed opening times change the watermark."""
+        now = timezone.now()
+        Run.objects.filter(pk=self.run.pk).update(opens_at=now + timedelta(minutes=5))
+        Run.objects.create(
+            date=self.run.date, time=time(6, 0), meeting_place='Gate', venue='Hill', length_km=8, max_capacity=5,
+        )
+        before = conditional.runs_watermark(now)
+        self.assertEqual(conditional.runs_watermark(now), before)
+        self.assertNotEqual(conditional.runs_watermark(now + timedelta(minutes=10)), before)
+        # The newest run going leaves an older run's updated_at as the newest.
+        Run.objects.filter(venue='Hill').delete()
+        self.assertNotEqual(conditional.runs_watermark(now), before)
+
+    def test_member_etags(self):
+        """Test that members get their own ETags and a cheap 304."""
+        anonymous_etag = self.client.get(self.url)['ETag']
+        self.client.login(username='testuser', password='testpass')
+        member_cache.get_member(self.user.pk)
+        response = self.client.get(self.url)
+        self.assertNotEqual(response['ETag'], anonymous_etag)
+        self.assertIn('private', response['Cache-Control'])
+        with self.assertNumQueries(1):
+            self.assertEqual(self.revalidate(etag=response['ETag']).status_code, 304)
+
+    def test_ballot_entry_changes_member_etag(self):
+        """Test that entering a ballot, which doesn't touch the run, still changes the member's page."""
+        self.run.allocation = Run.BALLOT
+        self.run.save()
+        self.client.login(username='testuser', password='testpass')
+        etag = self.client.get(self.url)['ETag']
+        BallotEntry.objects.create(user=self.user, run=self.run)
+        self.assertEqual(self.revalidate(etag=etag).status_code, 200)
+
+    def test_flash_messages_are_never_not_modified(self):
+        """Test that a page with a flash message waiting is always rendered."""
+        self.client.login(username='testuser', password='testpass')
+        etag = self.client.get(self.url)['ETag']
+        self.client.post(reverse('run_notify', args=[self.run.pk]))
+        response = self.revalidate(etag=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header('ETag'))
+
+    async def test_async_run_list(self):
+        """Test that the async run list answers conditional requests too."""
+        def make_request(**headers):
+            request = AsyncRequestFactory().get(self.url, headers=headers)
+            request.META['CSRF_COOKIE'] = 'a' * 32
+            request.session = SessionStore()
+            request._messages = FallbackStorage(request)
+            request.user = SimpleLazyObject(AnonymousUser)
+            return request
+
+        etag = (await views.arun_list(make_request()))['ETag']
+        self.assertEqual((await views.arun_list(make_request(if_none_match=etag))).status_code, 304)
+
+    def test_roster_validators(self):
+        """Test that rosters carry ETag and Last-Modified from the run and revalidate on changes."""
+        leader = User.objects.create_user(username='leader', password='pass')
+        leader.user_permissions.add(Permission.objects.get(codename='view_roster'))
+        self.client.login(username='leader', password='pass')
+        url = reverse('run_roster', args=[self.run.pk])
+        response = self.client.get(url)
+        self.assertTrue(response.has_header('Last-Modified'))
+        self.assertEqual(self.revalidate(url, response['ETag']).status_code, 304)
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+        UserProfile.objects.create(user=self.user, emergency_contact_name='Kin', emergency_contact_phone='1')
+        SignUp.objects.create(user=self.user, run=self.run)
+        self.assertEqual(self.revalidate(url, response['ETag']).status_code, 200)
+
+    def test_compression(self):
+        """Test that HTML is compressed with brotli when accepted, else gzip, and ETags still match."""
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertIn('MRC', gzip.decompress(response.content).decode())
+        self.assertTrue(response['ETag'].startswith('W/'))
+        self.assertEqual(self.revalidate(etag=response['ETag'], HTTP_ACCEPT_ENCODING='gzip').status_code, 304)
+
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip, deflate, br')
+        expected = 'br' if middleware.brotli else 'gzip'
+        self.assertEqual(response['Content-Encoding'], expected)
+        self.assertFalse(self.client.get(self.url).has_header('Content-Encoding'))
+
+        image = HttpResponse(b'\x89PNG' * 100, content_type='image/png')
+        request = RequestFactory().get('/logo.png', HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertFalse(middleware.CompressionMiddleware(lambda request: image)(request).has_header('Content-Encoding'))
+
+    def test_member_pages_echoing_input_are_not_compressed(self):
+        """Test that member pages are compressed unless their request carries text to echo (BREACH)."""
+        self.client.login(username='testuser', password='testpass')
+        for encoding in ('gzip', 'gzip, deflate, br'):
+            response = self.client.get(self.url, HTTP_ACCEPT_ENCODING=encoding)
+            self.assertEqual(response.status_code, 200)
+            self.assertIn(response['Content-Encoding'], encoding)
+
+            response = self.client.get(self.url, {'q': 'Park'}, HTTP_ACCEPT_ENCODING=encoding)
+            self.assertEqual(response.status_code, 200)
+            self.assertFalse(response.has_header('Content-Encoding'))
+
+        def private(request):
+            response = HttpResponse(b'<p>Emergency contact</p>' * 50, content_type='text/html')
+            response['Cache-Control'] = 'private'
+            return response
+
+        for path, query, compressed in (('/', {'q': 'x'}, False), ('/', {}, True), ('/admin/', {}, False)):
+            request = RequestFactory().get(path, query, HTTP_ACCEPT_ENCODING='gzip, br')
+            request.user = AnonymousUser()
+            request.resolver_match = resolve(path)
+            response = middleware.CompressionMiddleware(private)(request)
+            self.assertEqual(response.has_header('Content-Encoding'), compressed, (path, query))
+
+
+class RunBulkEditTest(TestCase):
+    """Test cases for the bulk capacity, venue and copy actions on runs."""
+
+    def setUp(self):
+        cache.clear()
+        self.users = [User.objects.create_user(username=f'runner{i}', password='pass') for i in range(3)]
+        self.park = Venue.objects.create(name='Park')
+        start = timezone.localdate() + timedelta(days=7)
+        self.runs = [
+            Run.objects.create(
+                date=start + timedelta(days=7 * i), time=time(9, 0), meeting_place='Gate',
+                location=self.park, length_km=5.0, max_capacity=5,
+            )
+            for i in range(3)
+        ]
+        for user in self.users[:2]:
+            SignUp.objects.create(user=user, run=self.runs[0])
+        Run.objects.update(updated_at=timezone.now() - timedelta(days=1))
+        self.selection = Run.objects.filter(pk__in=[run.pk for run in self.runs])
+
+    def test_capacity_below_signups_is_rejected(self):
+        """Test that one run with too many sign-ups stops the whole change, checked in one query."""
+        with CaptureQueriesContext(connection) as queries:
+            with self.assertRaisesMessage(ValidationError, 'below the current sign-ups'):
+                bulk_edit.set_capacity(self.selection, 1)
+        self.assertEqual(sum(query['sql'].startswith('SELECT') for query in queries), 1)
+        self.assertEqual(set(Run.objects.values_list('max_capacity', flat=True)), {5})
+
+        with self.assertRaises(ValidationError):
+            bulk_edit.set_capacity(self.selection, -4, relative=True)
+
+    def test_capacity_change(self):
+        """Test setting and changing capacity, which bumps updated_at and fills the new places."""
+        watcher = self.users[2]
+        self.runs[1].max_capacity = 0
+        self.runs[1].save()
+        SpotAlert.objects.create(user=watcher, run=self.runs[1])
+        before = timezone.now()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(bulk_edit.set_capacity(self.selection, 2, relative=True), 3)
+        self.assertEqual(
+            list(Run.objects.order_by('date').values_list('max_capacity', flat=True)), [7, 2, 7],
+        )
+        self.assertFalse(Run.objects.filter(updated_at__lt=before).exists())
+        self.assertTrue(Notification.objects.filter(user=watcher, run=self.runs[1]).exists())
+
+        bulk_edit.set_capacity(self.selection, 2)
+        self.assertEqual(set(Run.objects.values_list('max_capacity', flat=True)), {2})
+
+    def test_move_to_venue(self):
+        """Test that moving runs sets the location and venue name, so search finds them there."""
+        hill = Venue.objects.create(name='Hill')
+        self.assertEqual(bulk_edit.move_to_venue(self.selection.exclude(pk=self.runs[2].pk), hill), 2)
+        self.assertEqual(
+            list(Run.objects.order_by('date').values_list('venue', flat=True)), ['Hill', 'Hill', 'Park'],
+        )
+        self.assertEqual(Run.objects.filter(location=hill, updated_at__date=timezone.localdate()).count(), 2)
+        self.assertEqual(len(search.search_runs(Run.objects.all(), 'Hill')), 2)
+
+    def test_clone_runs(self):
+        """Test that copies are shifted, empty and undrawn, and that clashing copies are refused."""
+        ballot = self.runs[2]
+        ballot.allocation = Run.BALLOT
+        ballot.opens_at = timezone.now() + timedelta(days=10)
+        ballot.ballot_closes_at = timezone.now() + timedelta(days=12)
+        ballot.ballot_drawn_at = timezone.now()
+        ballot.ballot_seed = 'seed'
+        ballot.save()
+        with self.assertNumQueries(3):
+            clones = bulk_edit.clone_runs(self.selection, 28)
+        self.assertEqual(Run.objects.count(), 6)
+        self.assertEqual([clone.date for clone in clones], [run.date + timedelta(days=28) for run in self.runs])
+        self.assertFalse(SignUp.objects.filter(run__in=clones).exists())
+        clone = Run.objects.get(pk=clones[2].pk)
+        self.assertEqual((clone.location, clone.max_capacity, clone.allocation), (self.park, 5, Run.BALLOT))
+        self.assertEqual(clone.opens_at, ballot.opens_at + timedelta(days=28))
+        self.assertEqual(clone.ballot_closes_at, ballot.ballot_closes_at + timedelta(days=28))
+        self.assertIsNone(clone.ballot_drawn_at)
+        self.assertEqual(clone.ballot_seed, '')
+
+        # A week later, two of the copies would land on runs that already exist.
+        with self.assertRaisesMessage(ValidationError, 'These runs already exist'):
+            bulk_edit.clone_runs(self.selection, 7)
+        self.assertEqual(Run.objects.count(), 6)
+
+    def test_admin_actions(self):
+        """Test the intermediate form page, applying a change, and a rejected change."""
+        User.objects.create_superuser(username='admin', email='admin@example.com', password='pass')
+        self.client.login(username='admin', password='pass')
+        url = reverse('admin:runs_run_changelist')
+        selected = {'action': 'change_capacity', helpers.ACTION_CHECKBOX_NAME: [run.pk for run in self.runs]}
+
+        response = self.client.post(url, selected)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Change capacity by')
+
+        response = self.client.post(url, {**selected, 'apply': '1', 'mode': 'set', 'capacity': '1'})
+        self.assertContains(response, 'below the current sign-ups')
+        self.assertEqual(set(Run.objects.values_list('max_capacity', flat=True)), {5})
+
+        response = self.client.post(url, {**selected, 'apply': '1', 'mode': 'change', 'capacity': '10'})
+        self.assertRedirects(response, url)
+        self.assertEqual(set(Run.objects.values_list('max_capacity', flat=True)), {15})
+
+        response = self.client.post(url, {**selected, 'action': 'clone_runs', 'apply': '1', 'weeks': '4'})
+        self.assertRedirects(response, url)
+        self.assertEqual(Run.objects.count(), 6)
+
+
+class GroupSignUpTest(TestCase):
+    """Test cases for signing a group of members up for a run at once."""
+
+    def setUp(self):
+        cache.clear()
+        self.members = [
+            User.objects.create_user(username=f'runner{i}', email=f'runner{i}@example.com', password='pass')
+            for i in range(5)
+        ]
+        self.run = Run.objects.create(
+            date=timezone.localdate() + timedelta(days=7), time=time(9, 0), meeting_place='Gate',
+            venue='Park', length_km=5.0, max_capacity=3,
+        )
+        SignUp.objects.create(user=self.members[0], run=self.run)
+        self.coach = User.objects.create_user(username='coach', password='pass')
+        self.coach.user_permissions.add(Permission.objects.get(codename='add_signup'))
+
+    def test_bulk_sign_up(self):
+        """Test that places go in order, existing and unknown members are reported, and side effects happen."""
+        stats.refresh(self.members[1].pk)
+        member_cache.get_member(self.members[1].pk)
+        Run.objects.filter(pk=self.run.pk).update(updated_at=timezone.now() - timedelta(days=1))
+        user_ids = [m.pk for m in self.members[:4]] + [9999]
+        results = services.bulk_sign_up(self.run.pk, user_ids)
+        self.assertEqual(list(results.values()), [
+            services.ALREADY_SIGNED_UP, services.SIGNED_UP, services.SIGNED_UP, services.RUN_FULL,
+            services.MEMBER_NOT_FOUND,
+        ])
+        self.assertEqual(SignUp.objects.filter(run=self.run).count(), 3)
+        self.assertEqual(SignUpEvent.objects.filter(run_id=self.run.pk, change=SignUpEvent.SIGNED_UP).count(), 3)
+        self.assertEqual(MemberStats.objects.get(user=self.members[1]).runs_signed_up, 1)
+        self.assertIn(self.run.pk, member_cache.get_member(self.members[1].pk).signup_run_ids)
+        self.assertEqual(Run.objects.get(pk=self.run.pk).updated_at.date(), timezone.localdate())
+        self.assertEqual(services.bulk_sign_up(9999, [self.members[4].pk]), {self.members[4].pk: services.RUN_NOT_FOUND})
+
+    def test_sign_up_meanwhile_counted_once(self):
+        """Test that a member added meanwhile is reported as already signed up and not counted again."""
+        real_filter = SpotHold.objects.filter
+
+        def added_meanwhile(*args, **kwargs):
+            SignUp.objects.bulk_create([SignUp(run=self.run, user=self.members[1])])
+            return real_filter(*args, **kwargs)
+
+        with mock.patch.object(SpotHold.objects, 'filter', side_effect=added_meanwhile):
+            results = services.bulk_sign_up(self.run.pk, [self.members[1].pk, self.members[2].pk])
+        self.assertEqual(results, {self.members[1].pk: services.ALREADY_SIGNED_UP, self.members[2].pk: services.SIGNED_UP})
+        self.assertEqual(
+            list(SignUpEvent.objects.filter(run_id=self.run.pk, change=SignUpEvent.SIGNED_UP).values_list('user_id', flat=True)),
+            [self.members[0].pk, self.members[2].pk],
+        )
+        self.assertFalse(MemberStats.objects.filter(user=self.members[1], runs_signed_up__gt=0).exists())
+
+    def test_sign_up_locks_run(self):
+        """Test that a single sign-up locks the run, as group sign-ups and holds do."""
+        with mock.patch.object(Run.objects, 'select_for_update', wraps=Run.objects.select_for_update) as lock:
+            self.assertEqual(services.sign_up(self.members[1], self.run), services.SIGNED_UP)
+        lock.assert_called_once_with()
+
+    def test_queries_independent_of_group_size(self):
+        """Test that a group costs the same queries however many members it has."""
+        other = Run.objects.create(
+            date=self.run.date, time=time(18, 0), meeting_place='Gate', venue='Hill', length_km=5.0, max_capacity=50,
+        )
+        with CaptureQueriesContext(connection) as small:
+            services.bulk_sign_up(self.run.pk, [self.members[1].pk])
+        with CaptureQueriesContext(connection) as large:
+            services.bulk_sign_up(other.pk, [m.pk for m in self.members])
+        self.assertEqual(len(large), len(small))
+
+    def test_find_members(self):
+        """Test that members are found by ID, username or email address."""
+        found = services.find_members([str(self.members[1].pk), 'runner2', 'runner3@example.com', 'nobody', ''])
+        self.assertEqual(found, {
+            str(self.members[1].pk): self.members[1].pk, 'runner2': self.members[2].pk,
+            'runner3@example.com': self.members[3].pk,
+        })
+
+    def test_api(self):
+        """Test the group sign-up API's permissions, validation and per-member results."""
+        url = reverse('run_group_signup_api', args=[self.run.pk])
+        body = json.dumps({'members': ['runner1', self.members[2].pk, 'runner0', 'nobody', 'runner3']})
+        self.assertEqual(self.client.post(url, body, content_type='application/json').status_code, 401)
+        self.client.login(username='runner1', password='pass')
+        self.assertEqual(self.client.post(url, body, content_type='application/json').status_code, 403)
+
+        self.client.login(username='coach', password='pass')
+        self.assertEqual(self.client.post(url, '{}', content_type='application/json').status_code, 400)
+        response = self.client.post(url, body, content_type='application/json')
+        self.assertEqual(response.json()['results'], [
+            {'member': 'runner1', 'status': services.SIGNED_UP},
+            {'member': str(self.members[2].pk), 'status': services.SIGNED_UP},
+            {'member': 'runner0', 'status': services.ALREADY_SIGNED_UP},
+            {'member': 'nobody', 'status': services.MEMBER_NOT_FOUND},
+            {'member': 'runner3', 'status': services.RUN_FULL},
+        ])
+
+    def test_view(self):
+        """Test the coaches' group sign-up page."""
+        url = reverse('run_group_signup', args=[self.run.pk])
+        self.client.login(username='runner1', password='pass')
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+        self.client.login(username='coach', password='pass')
+        self.assertContains(self.client.get(url), '1/3')
+        response = self.client.post(url, {'members': 'runner1\nrunner2@example.com\n\nrunner3'})
+        self.assertContains(response, '3/3')
+        self.assertContains(response, 'No place left')
+        self.assertEqual(SignUp.objects.filter(run=self.run).count(), 3)
+
+    def test_admin_action(self):
+        """Test signing members up from the user admin."""
+        User.objects.create_superuser(username='admin', email='admin@example.com', password='pass')
+        self.client.login(username='admin', password='pass')
+        url = reverse('admin:auth_user_changelist')
+        selected = {'action': 'sign_up_for_run', helpers.ACTION_CHECKBOX_NAME: [m.pk for m in self.members[:3]]}
+        self.assertContains(self.client.post(url, selected), 'Sign up for run')
+
+        response = self.client.post(url, {**selected, 'apply': '1', 'run': self.run.pk}, follow=True)
+        self.assertContains(response, 'Signed up 2 members')
+        self.assertContains(response, '1 were already signed up')
+        self.assertEqual(SignUp.objects.filter(run=self.run).count(), 3)
+
+
+class BackupTest(TransactionTestCase):
+    """Test cases for the online backup and restore commands."""
+
+    def setUp(self):
+        cache.clear()
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.run = Run.objects.create(
+            date=timezone.localdate() + timedelta(days=7), time=time(9, 0), meeting_place='Gate',
+            venue='Park', length_km=5.0, max_capacity=10,
+        )
+        SignUp.objects.create(user=self.user, run=self.run)
+
+    def path(self, name):
+        return os.path.join(self.tmpdir, name)
+
+    def change_everything(self):
+        SignUp.objects.all().delete()
+        Run.objects.create(
+            date=self.run.date, time=time(18, 0), meeting_place='Gate', venue='Hill', length_km=8, max_capacity=5,
+        )
+        User.objects.create_user(username='newcomer', password='pass')
+
+    def assert_restored(self):
+        self.assertEqual(list(Run.objects.values_list('venue', flat=True)), ['Park'])
+        self.assertTrue(SignUp.objects.filter(user=self.user, run=self.run).exists())
+        self.assertFalse(User.objects.filter(username='newcomer').exists())
+        self.assertEqual(len(search.search_runs(Run.objects.all(), 'Park')), 1)
+
+    def test_sqlite_backup_and_restore(self):
+        """Test a stepped, compressed file backup that is checked, and restored in full."""
+        copied = []
+        restarts = backup.backup_sqlite(self.path('db.sqlite3.gz'), pages=1, progress=lambda n, total: copied.append(n))
+        self.assertEqual(restarts, 0)
+        self.assertGreater(len(copied), 1)
+        with open(self.path('db.sqlite3.gz'), 'rb') as f:
+            self.assertEqual(f.read(2), backup.GZIP_MAGIC)
+        self.assertEqual(backup.backup_format(self.path('db.sqlite3.gz')), 'sqlite')
+        self.assertEqual(os.listdir(self.tmpdir), ['db.sqlite3.gz'])
+
+        self.change_everything()
+        out = StringIO()
+        call_command('restore_db', self.path('db.sqlite3.gz'), '--no-input', stdout=out)
+        self.assertIn('Restored the database file', out.getvalue())
+        self.assert_restored()
+
+    def test_json_export_and_restore(self):
+        """Test the logical export used for PostgreSQL, round-tripped through restore_db."""
+        out = StringIO()
+        call_command('backup_db', self.path('export.jsonl.gz'), '--format', 'json', stdout=out)
+        self.assertIn('integrity checked', out.getvalue())
+        counts = backup.check_export(self.path('export.jsonl.gz'))
+        self.assertEqual((counts['runs.run'], counts['runs.signup'], counts['auth.user']), (1, 1, 1))
+
+        self.change_everything()
+        call_command('restore_db', self.path('export.jsonl.gz'), '--no-input', stdout=StringIO())
+        self.assert_restored()
+        # Sequences carry on after the restored rows.
+        self.assertGreater(Run.objects.create(
+            date=self.run.date, time=time(7, 0), meeting_place='Gate', venue='Hill', length_km=8, max_capacity=5,
+        ).pk, self.run.pk)
+
+    def test_damaged_backups_are_refused(self):
+        """Test that a corrupt file is never restored, and a truncated export fails its check."""
+        with open(self.path('bad.sqlite3'), 'wb') as f:
+            f.write(backup.SQLITE_MAGIC + b'\0' * 100)
+        with self.assertRaisesMessage(CommandError, 'failed its check'):
+            call_command('restore_db', self.path('bad.sqlite3'), '--no-input')
+        self.assertEqual(Run.objects.count(), 1)
+
+        backup.export_rows(self.path('export.jsonl'))
+        with open(self.path('export.jsonl'), 'a') as f:
+            f.write('{"truncated": \n')
+        with self.assertRaises(backup.BackupError):
+            backup.import_rows(self.path('export.jsonl'))
+        self.assertEqual(Run.objects.count(), 1)
+
+
+class SpotHoldTest(TestCase):
+    """Test cases for holding a place while a member confirms their sign-up."""
+
+    def setUp(self):
+        cache.clear()
+        self.members = [User.objects.create_user(username=f'runner{i}', password='pass') for i in range(3)]
+        self.run = Run.objects.create(
+            date=timezone.localdate() + timedelta(days=7), time=time(9, 0), meeting_place='Gate',
+            venue='Park', length_km=5.0, max_capacity=2,
+        )
+        SignUp.objects.create(user=self.members[0], run=self.run)
+
+    def lapse(self, member):
+        SpotHold.objects.filter(user=member).update(expires_at=timezone.now() - timedelta(seconds=1))
+
+    def test_hold_counts_against_capacity(self):
+        """Test that an active hold takes a place everywhere places are counted."""
+        status, expires_at = services.hold_spot(self.members[1], self.run)
+        self.assertEqual(status, services.HELD)
+        self.assertAlmostEqual(
+            (expires_at - timezone.now()).total_seconds(), settings.SPOT_HOLD_SECONDS, delta=5,
+        )
+        run = Run.objects.get(pk=self.run.pk)
+        self.assertTrue(run.is_full())
+        self.assertEqual(run.available_spots(), 0)
+        annotated = Run.objects.with_signup_counts().get(pk=self.run.pk)
+        self.assertEqual((annotated.signup_count, annotated.hold_count), (1, 1))
+        self.assertFalse(facets.filter_runs(Run.objects.with_signup_counts(), {'spaces': ['yes']}).exists())
+        self.assertEqual(services.sign_up(self.members[2], run), services.RUN_FULL)
+        self.assertEqual(services.hold_spot(self.members[2], run), (services.RUN_FULL, None))
+        self.assertEqual(services.bulk_sign_up(run.pk, [self.members[2].pk]), {self.members[2].pk: services.RUN_FULL})
+
+    def test_hold_bumps_updated_at(self):
+        """Test that taking a hold changes the run list's watermark."""
+        Run.objects.filter(pk=self.run.pk).update(updated_at=timezone.now() - timedelta(days=1))
+        services.hold_spot(self.members[1], self.run)
+        self.assertEqual(Run.objects.get(pk=self.run.pk).updated_at.date(), timezone.localdate())
+
+    def test_confirm_hold(self):
+        """Test that confirming turns the hold into a sign-up on a run the hold has filled."""
+        services.hold_spot(self.members[1], self.run)
+        self.assertEqual(services.confirm_hold(self.members[1], self.run), services.SIGNED_UP)
+        self.assertTrue(SignUp.objects.filter(user=self.members[1], run=self.run).exists())
+        self.assertFalse(SpotHold.objects.exists())
+        self.assertEqual(services.hold_spot(self.members[1], self.run), (services.ALREADY_SIGNED_UP, None))
+
+    def test_sign_up_uses_own_hold(self):
+        """Test that the ordinary sign-up paths give a holding member their held place."""
+        services.hold_spot(self.members[1], self.run)
+        self.assertEqual(services.sign_up(self.members[1], Run.objects.get(pk=self.run.pk)), services.SIGNED_UP)
+        self.assertFalse(SpotHold.objects.exists())
+
+        SignUp.objects.filter(user=self.members[1]).delete()
+        services.hold_spot(self.members[1], self.run)
+        results = services.bulk_sign_up(self.run.pk, [self.members[1].pk, self.members[2].pk])
+        self.assertEqual(results, {self.members[1].pk: services.SIGNED_UP, self.members[2].pk: services.RUN_FULL})
+        self.assertFalse(SpotHold.objects.exists())
+
+    def test_sign_up_with_places_left_uses_own_hold(self):
+        """Test that signing up on a run with places left takes the held place, not another one."""
+        self.run.max_capacity = 3
+        self.run.save()
+        services.hold_spot(self.members[1], self.run)
+        self.assertEqual(services.sign_up(self.members[1], Run.objects.get(pk=self.run.pk)), services.SIGNED_UP)
+        self.assertFalse(SpotHold.objects.exists())
+        self.assertEqual(Run.objects.get(pk=self.run.pk).available_spots(), 1)
+
+    def test_run_list_sign_up_takes_hold(self):
+        """Test that the run list's Sign Up button carries the hold URL for its script."""
+        self.client.login(username='runner1', password='pass')
+        self.assertContains(self.client.get(reverse('run_list')), f'data-hold-url="{reverse("run_hold", args=[self.run.pk])}"')
+
+    def test_run_list_while_holding_last_place(self):
+        """Test that a member holding the last place still sees it as theirs to confirm."""
+        services.hold_spot(self.members[1], self.run)
+        self.client.login(username='runner1', password='pass')
+        response = self.client.get(reverse('run_list'))
+        self.assertContains(response, '1/2')
+        self.assertContains(response, f'data-held-until="{SpotHold.objects.get().expires_at.isoformat()}">Confirm</a>')
+        self.assertNotContains(response, 'Notify me')
+
+        self.client.login(username='runner2', password='pass')
+        response = self.client.get(reverse('run_list'))
+        self.assertContains(response, 'FULL')
+        self.assertNotContains(response, 'data-held-until')
+
+    def test_hold_again_extends(self):
+        """Test that holding again extends the member's hold rather than taking another place."""
+        services.hold_spot(self.members[1], self.run)
+        SpotHold.objects.update(expires_at=timezone.now() + timedelta(seconds=5))
+        status, expires_at = services.hold_spot(self.members[1], self.run)
+        self.assertEqual(status, services.HELD)
+        self.assertEqual(SpotHold.objects.get().expires_at, expires_at)
+
+    def test_expired_hold_frees_place(self):
+        """Test that a lapsed hold stops counting at once and is cleared by the next hold."""
+        services.hold_spot(self.members[1], self.run)
+        self.lapse(self.members[1])
+        self.assertFalse(Run.objects.get(pk=self.run.pk).is_full())
+        self.assertEqual(services.hold_spot(self.members[2], self.run)[0], services.HELD)
+        self.assertEqual(list(SpotHold.objects.values_list('user', flat=True)), [self.members[2].pk])
+        # Confirming after the hold lapsed falls back to an ordinary sign-up.
+        self.assertEqual(services.confirm_hold(self.members[1], self.run), services.RUN_FULL)
+
+    def test_release_hold(self):
+        """Test that giving a hold back frees the place and offers it to waiting members."""
+        services.hold_spot(self.members[1], self.run)
+        with mock.patch('runs.services.place_freed') as place_freed, self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(services.release_hold(self.members[1], self.run), services.RELEASED)
+        place_freed.assert_called_once_with(self.run.pk)
+        self.assertEqual(services.release_hold(self.members[1], self.run), services.NOT_HELD)
+        self.assertFalse(Run.objects.get(pk=self.run.pk).is_full())
+
+    def test_release_expired_holds_command(self):
+        """Test that the sweep deletes only lapsed holds and offers their places."""
+        services.hold_spot(self.members[1], self.run)
+        services.hold_spot(self.members[0], Run.objects.create(
+            date=self.run.date, time=time(18, 0), meeting_place='Gate', venue='Hill', length_km=5.0, max_capacity=5,
+        ))
+        self.lapse(self.members[1])
+
+        out = StringIO()
+        call_command('release_expired_holds', '--dry-run', stdout=out)
+        self.assertIn('Would release 1 lapsed holds', out.getvalue())
+        self.assertEqual(SpotHold.objects.count(), 2)
+
+        out = StringIO()
+        with mock.patch('runs.services.place_freed') as place_freed, self.captureOnCommitCallbacks(execute=True):
+            call_command('release_expired_holds', stdout=out)
+        self.assertIn('Released 1 lapsed holds', out.getvalue())
+        place_freed.assert_called_once_with(self.run.pk)
+        self.assertEqual(list(SpotHold.objects.values_list('user', flat=True)), [self.members[0].pk])
+
+    def test_asign_up_counts_holds(self):
+        """Test that the async sign-up respects other members' holds and uses the member's own."""
+        services.hold_spot(self.members[1], self.run)
+        self.assertEqual(async_to_sync(services.asign_up)(self.members[2], self.run), services.RUN_FULL)
+        self.assertEqual(async_to_sync(services.asign_up)(self.members[1], self.run), services.SIGNED_UP)
+
+    def test_hold_api(self):
+        """Test holding, confirming and releasing through the JSON API."""
+        url = reverse('run_hold', args=[self.run.pk])
+        self.assertEqual(self.client.post(url).status_code, 401)
+        self.client.login(username='runner1', password='pass')
+        data = self.client.post(url).json()
+        self.assertEqual(data['status'], services.HELD)
+        self.assertIsNotNone(data['expires_at'])
+        self.assertEqual(self.client.delete(url).json(), {'status': services.RELEASED, 'expires_at': None})
+        self.assertEqual(self.client.get(url).status_code, 405)
+
+        self.client.post(url)
+        response = self.client.post(reverse('run_hold_confirm', args=[self.run.pk]))
+        self.assertEqual(response.json(), {'status': services.SIGNED_UP})
+        self.assertTrue(SignUp.objects.filter(user=self.members[1], run=self.run).exists())
+        self.assertEqual(self.client.post(reverse('run_hold', args=[9999])).status_code, 404)
+
+
+class RosterTest(TestCase):
+    """Test cases for run leaders' cached rosters."""
+
+    def setUp(self):
+        cache.clear()
+        self.leader = User.objects.create_user(username='leader', password='pass')
+        self.leader.user_permissions.add(Permission.objects.get(codename='view_roster'))
+        self.member = User.objects.create_user(
+            username='runner', password='pass', first_name='Rita', last_name='Runner',
+        )
+        UserProfile.objects.create(
+            user=self.member, phone_number='07700 900001',
+            emergency_contact_name='Ray Runner', emergency_contact_phone='07700 900002',
+        )
+        self.run = Run.objects.create(
+            date=timezone.localdate() + timedelta(days=2), time=time(9, 0), meeting_place='Bandstand',
+            venue='Victoria Park', length_km=5.0, max_capacity=10,
+        )
+        SignUp.objects.create(user=self.member, run=self.run)
+        SignUp.objects.create(user=User.objects.create_user(username='noprofile'), run=self.run)
+        self.url = reverse('run_roster', args=[self.run.pk])
+
+    def login_leader(self):
+        self.client.login(username='leader', password='pass')
+        member_cache.get_member(self.leader.pk)
+
+    def signup_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.url)
+        return response, sum('"runs_signup"' in q['sql'] for q in ctx.captured_queries)
+
+    def test_menu_link_follows_roster_permission(self):
+        """Test that the Rosters link shows for leaders with the permission, staff or not, and no one else."""
+        roster_link = f'href="{reverse("roster_list")}"'
+        self.login_leader()
+        self.assertContains(self.client.get(reverse('run_list')), roster_link)
+
+        staff = User.objects.create_user(username='staff', password='pass', is_staff=True)
+        self.client.login(username='staff', password='pass')
+        self.assertNotContains(self.client.get(reverse('run_list')), roster_link)
+
+        # Granting the permission drops the member's cached bundle and changes the run list's ETag.
+        etag = self.client.get(reverse('run_list'))['ETag']
+        staff.user_permissions.add(Permission.objects.get(codename='view_roster'))
+        response = self.client.get(reverse('run_list'), HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, roster_link)
+
+    def test_requires_roster_permission(self):
+        """Test that only leaders can see rosters."""
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 302)
+        self.client.login(username='runner', password='pass')
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+        self.assertEqual(self.client.get(reverse('roster_list')).status_code, 403)
+
+    def test_roster_lists_runners_and_contacts(self):
+        """Test that the roster shows each runner's emergency contact, from one sign-up query."""
+        self.login_leader()
+        response, queries = self.signup_queries()
+        self.assertEqual(queries, 1)
+        self.assertContains(response, 'Rita Runner')
+        self.assertContains(response, 'href="tel:07700 900002"')
+        self.assertContains(response, 'None on file')
+        self.assertIn('private', response['Cache-Control'])
+
+    def test_roster_cached_until_signups_change(self):
+        """Test that the roster is rebuilt only after its sign-ups or contacts change."""
+        self.login_leader()
+        self.signup_queries()
+        response, queries = self.signup_queries()
+        self.assertEqual(queries, 0)
+
+        late = User.objects.create_user(username='late', first_name='Lola', last_name='Late')
+        SignUp.objects.create(user=late, run=self.run)
+        response, queries = self.signup_queries()
+        self.assertEqual(queries, 1)
+        self.assertContains(response, 'Lola Late')
+
+        profile = self.member.profile
+        profile.emergency_contact_phone = '07700 900003'
+        profile.save()
+        response, queries = self.signup_queries()
+        self.assertEqual(queries, 1)
+        self.assertContains(response, '07700 900003')
+
+    def test_roster_list_hands_urls_to_service_worker(self):
+        """Test that the leaders' page lists the coming week's rosters for precaching."""
+        Run.objects.create(
+            date=timezone.localdate() + timedelta(days=30), time=time(9, 0), meeting_place='Gate',
+            venue='Far Future', length_km=5.0, max_capacity=10,
+        )
+        self.client.login(username='leader', password='pass')
+        response = self.client.get(reverse('roster_list'))
+        self.assertEqual(response.context['roster_urls'], [self.url])
+        self.assertContains(response, 'id="rosterUrls"')
+        self.assertNotContains(response, 'Far Future')
+
+        worker = self.client.get(reverse('service_worker')).content.decode()
+        self.assertIn("'precache-rosters'", worker)
+        self.assertIn("ROSTER_CACHE", worker)
+
+
+class SearchTest(TestCase):
+    """Test cases for indexed run and member search."""
+
+    def setUp(self):
+        self.park = Run.objects.create(
+            date=date(2025, 12, 20), time=time(9, 0), meeting_place='Bandstand',
+            venue='Victoria Park', length_km=5.0, max_capacity=10,
+        )
+        self.canal = Run.objects.create(
+            date=date(2025, 12, 21), time=time(18, 30), meeting_place='Lock 7',
+            venue="Regent's Canal", length_km=10.0, max_capacity=10,
+        )
+        self.alice = User.objects.create_user(
+            username='alice', email='alice@example.com', password='pass', first_name='Alice', last_name='Smith',
+        )
+        UserProfile.objects.create(
+            user=self.alice, emergency_contact_name='Bob Smith', emergency_contact_phone='07700900123',
+        )
+        self.carol = User.objects.create_user(username='carol', email='carol@runners.org', password='pass')
+
+    def run_ids(self, term):
+        return set(search.matching_run_ids(term).values_list('pk', flat=True))
+
+    def user_ids(self, term):
+        return set(search.matching_user_ids(term).values_list('pk', flat=True))
+
+    def test_runs_match_substrings_case_insensitively(self):
+        """Test that run search behaves like the admin's icontains."""
+        self.assertEqual(self.run_ids('toria'), {self.park.pk})
+        self.assertEqual(self.run_ids('BANDSTAND'), {self.park.pk})
+        self.assertEqual(self.run_ids("regent's"), {self.canal.pk})
+        self.assertEqual(self.run_ids('park band'), {self.park.pk})
+        self.assertEqual(self.run_ids('park canal'), set())
+
+    def test_short_terms_fall_back_to_icontains(self):
+        """Test that terms shorter than a trigram still match."""
+        self.assertEqual(self.run_ids('7'), {self.canal.pk})
+        self.assertEqual(self.run_ids('canal 7'), {self.canal.pk})
+
+    def test_index_follows_saves_and_deletes(self):
+        """Test that the index is kept in sync as runs change, including bulk updates."""
+        self.park.venue = 'Hackney Marshes'
+        self.park.save()
+        self.assertEqual(self.run_ids('victoria'), set())
+        self.assertEqual(self.run_ids('marshes'), {self.park.pk})
+
+        Run.objects.filter(pk=self.canal.pk).update(meeting_place='Boathouse')
+        self.assertEqual(self.run_ids('boathouse'), {self.canal.pk})
+
+        self.canal.delete()
+        self.assertEqual(self.run_ids('boathouse'), set())
+
+    def test_members_match_name_email_and_emergency_contact(self):
+        """Test that member search covers user and profile fields."""
+        self.assertEqual(self.user_ids('smith'), {self.alice.pk})
+        self.assertEqual(self.user_ids('runners.org'), {self.carol.pk})
+        self.assertEqual(self.user_ids('0790'), set())
+        self.assertEqual(self.user_ids('900123'), {self.alice.pk})
+
+        self.alice.profile.emergency_contact_name = 'Dave Jones'
+        self.alice.profile.save()
+        self.assertEqual(self.user_ids('jones'), {self.alice.pk})
+        self.assertEqual(self.user_ids('bob'), set())
+
+    def test_short_member_terms_union_each_table(self):
+        """Test that icontains member search matches each table on its own and combines them with UNION."""
+        UserProfile.objects.create(user=self.carol, phone_number='0123 456')
+        self.assertEqual(self.user_ids('12'), {self.alice.pk, self.carol.pk})
+        self.assertEqual(self.user_ids('ca 12'), {self.carol.pk})
+        sql = str(search.matching_user_ids('12').query)
+        self.assertIn('UNION', sql)
+        self.assertNotIn('JOIN', sql)
+
+    @skipUnless(connection.vendor == 'postgresql', 'trigram indexes are only created on PostgreSQL')
+    def test_postgres_member_search_uses_indexes(self):
+        """Test that EXPLAIN shows member search reading the trigram indexes rather than scanning."""
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            for term in ('smith', '900123'):
+                sql, params = User.objects.filter(pk__in=search.matching_user_ids(term)).query.sql_with_params()
+                cursor.execute(f'EXPLAIN {sql}', params)
+                plan = '\n'.join(row[0] for row in cursor.fetchall())
+                self.assertNotIn('Seq Scan', plan)
+                self.assertIn('_trgm', plan)
+
+    def test_rebuild_command(self):
+        """Test that the index can be rebuilt from the live tables."""
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {search.RUN_INDEX}')
+        self.assertEqual(self.run_ids('victoria'), set())
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(self.run_ids('victoria'), {self.park.pk})
+
+    def test_run_search_uses_the_index(self):
+        """Test that searching runs queries the FTS table instead of scanning with LIKE."""
+        with CaptureQueriesContext(connection) as ctx:
+            list(search.search_runs(Run.objects.all(), 'victoria'))
+        sql = ctx.captured_queries[0]['sql']
+        self.assertIn('MATCH', sql)
+        self.assertNotIn('LIKE', sql)
+
+    def test_admin_search(self):
+        """Test that the admin changelists search through the indexes."""
+        User.objects.create_superuser(username='admin', email='admin@example.com', password='pass')
+        SignUp.objects.create(user=self.alice, run=self.canal)
+        SignUp.objects.create(user=self.carol, run=self.park)
+        self.client.login(username='admin', password='pass')
+
+        response = self.client.get('/admin/runs/run/', {'q': 'canal'})
+        self.assertEqual(list(response.context['cl'].result_list), [self.canal])
+
+        response = self.client.get('/admin/runs/signup/', {'q': 'smith'})
+        self.assertEqual(list(response.context['cl'].result_list), [SignUp.objects.get(user=self.alice)])
+
+        response = self.client.get('/admin/auth/user/', {'q': 'runners'})
+        self.assertEqual(list(response.context['cl'].result_list), [self.carol])
+
+    def test_run_list_search_box(self):
+        """Test that members can search the run list."""
+        response = self.client.get(reverse('run_list'), {'q': 'park'})
+        self.assertContains(response, 'Victoria Park')
+        self.assertNotContains(response, "Regent&#x27;s Canal")
+
+        response = self.client.get(reverse('run_list'), {'q': 'nowhere'})
+        self.assertContains(response, 'No runs match')
+
+
+class VenueTest(TestCase):
+    """Test cases for venues and the near-me lookup."""
+
+    def setUp(self):
+        venues.invalidate_grid()
+        self.park = Venue.objects.create(name='Victoria Park', latitude=51.5362, longitude=-0.0410)
+        self.heath = Venue.objects.create(name='Hampstead Heath', latitude=51.5608, longitude=-0.1631)
+        self.brighton = Venue.objects.create(name='Brighton Seafront', latitude=50.8198, longitude=-0.1367)
+        self.tomorrow = timezone.localdate() + timedelta(days=1)
+        for venue in (self.park, self.heath, self.brighton):
+            Run.objects.create(
+                date=self.tomorrow, time=time(9, 0), meeting_place='Gate',
+                location=venue, length_km=5.0, max_capacity=10,
+            )
+
+    def test_run_takes_venue_name_from_location(self):
+        """Test that the venue name follows the location, including renames."""
+        run = Run.objects.get(location=self.park)
+        self.assertEqual(run.venue, 'Victoria Park')
+        self.park.name = 'Victoria Park (East)'
+        self.park.save()
+        run.refresh_from_db()
+        self.assertEqual(run.venue, 'Victoria Park (East)')
+
+    def test_run_requires_location_or_venue(self):
+        """Test that a run needs a location or a venue name."""
+        run = Run(date=self.tomorrow, time=time(9, 0), meeting_place='Gate', length_km=5.0, max_capacity=10)
+        with self.assertRaises(ValidationError):
+            run.full_clean()
+
+    def test_haversine_and_bounding_box(self):
+        """Test the distance and bounding box helpers."""
+        self.assertAlmostEqual(venues.haversine_km(51.5362, -0.0410, 51.5608, -0.1631), 8.87, places=2)
+        min_lat, max_lat, min_lon, max_lon = venues.bounding_box(51.5, -0.1, 10)
+        self.assertAlmostEqual(max_lat - min_lat, 20 / 111.32)
+        self.assertGreater(max_lon - min_lon, max_lat - min_lat)
+
+    def test_grid_only_returns_nearby_cells(self):
+        """Test that the grid skips venues outside the query's cells."""
+        grid = venues.venue_grid()
+        candidates = grid.candidates(*venues.bounding_box(51.54, -0.10, 10))
+        self.assertIn(self.park.pk, candidates)
+        self.assertNotIn(self.brighton.pk, candidates)
+
+    def test_runs_near_orders_by_distance_and_skips_past_runs(self):
+        """Test the near-me lookup."""
+        Run.objects.create(
+            date=self.tomorrow - timedelta(days=7), time=time(9, 0), meeting_place='Gate',
+            location=self.park, length_km=5.0, max_capacity=10,
+        )
+        runs = venues.runs_near(51.5400, -0.0500, radius_km=15)
+        self.assertEqual([run.location for run in runs], [self.park, self.heath])
+        self.assertLess(runs[0].distance_km, 1)
+        self.assertEqual(venues.runs_near(51.5400, -0.0500, radius_km=5)[0].location, self.park)
+        self.assertEqual(len(venues.runs_near(51.5400, -0.0500, radius_km=5)), 1)
+
+    def test_grid_rebuilt_when_venue_moves(self):
+        """Test that saving a venue refreshes the grid."""
+        venues.runs_near(51.54, -0.05, radius_km=15)
+        self.brighton.latitude, self.brighton.longitude = 51.5450, -0.0550
+        self.brighton.save()
+        self.assertIn(self.brighton, [run.location for run in venues.runs_near(51.54, -0.05, radius_km=15)])
+
+    def test_runs_near_endpoint(self):
+        """Test the near-me JSON endpoint and its validation."""
+        response = self.client.get(reverse('runs_near'), {'lat': 51.54, 'lon': -0.05, 'radius': 15})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()['runs']
+        self.assertEqual([run['venue'] for run in data], ['Victoria Park', 'Hampstead Heath'])
+        self.assertEqual(data[0]['available_spots'], 10)
+
+        self.assertEqual(self.client.get(reverse('runs_near'), {'lat': 'x', 'lon': 0}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('runs_near'), {'lat': 95, 'lon': 0}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('runs_near'), {'lat': 51, 'lon': 0, 'radius': 5000}).status_code, 400)
+
+    def test_dedupe_migration_merges_spellings(self):
+        """Test that the data migration folds variant venue spellings into one venue."""
+        migration = importlib.import_module('runs.migrations.0008_dedupe_venues')
+        for name in ['Regent’s Canal', "Regent's Canal", "regents  canal.", "Regent's Canal", 'Lea Valley']:
+            Run.objects.create(date=self.tomorrow, time=time(9, 0), meeting_place='Lock', venue=name,
+                               length_km=5.0, max_capacity=10)
+
+        migration.create_venues(django_apps, None)
+
+        canal = Venue.objects.get(name="Regent's Canal")
+        self.assertEqual(canal.runs.count(), 4)
+        self.assertFalse(Venue.objects.filter(name__icontains='regents').exists())
+        self.assertFalse(Run.objects.filter(location__isnull=True).exists())
+        self.assertTrue(Venue.objects.filter(name='Lea Valley').exists())
+
+
+class RunFacetTest(TestCase):
+    """Test cases for faceted run filtering."""
+
+    def setUp(self):
+        # 2025-12-06 is a Saturday.
+        self.sat_morning_5k = Run.objects.create(
+            date=date(2025, 12, 6), time=time(9, 0), meeting_place='Gate',
+            venue='Park', length_km=5.0, max_capacity=1,
+        )
+        self.sun_morning_10k = Run.objects.create(
+            date=date(2025, 12, 7), time=time(8, 30), meeting_place='Gate',
+            venue='Heath', length_km=10.0, max_capacity=10,
+        )
+        self.wed_evening_3k = Run.objects.create(
+            date=date(2025, 12, 10), time=time(18, 30), meeting_place='Track',
+            venue='Stadium', length_km=3.0, max_capacity=10,
+        )
+        self.sat_half = Run.objects.create(
+            date=date(2025, 12, 13), time=time(9, 0), meeting_place='Start',
+            venue='Riverside', length_km=21.1, max_capacity=10,
+        )
+        SignUp.objects.create(user=User.objects.create_user(username='runner'), run=self.sat_morning_5k)
+
+    def filtered(self, selected, **dates):
+        return list(facets.filter_runs(Run.objects.with_signup_counts(), selected, **dates))
+
+    def counts(self, selected, **dates):
+        result = facets.facet_counts(Run.objects.with_signup_counts(), selected, **dates)
+        return {facet: {c['value']: c['count'] for c in choices} for facet, choices in result.items()}
+
+    def test_filters_combine_or_within_and_across_facets(self):
+        """Test that choices in a facet are OR'd and facets are AND'd."""
+        self.assertEqual(self.filtered({'day': ['sat', 'sun']}),
+                         [self.sat_morning_5k, self.sun_morning_10k, self.sat_half])
+        self.assertEqual(self.filtered({'day': ['sat'], 'distance': ['half-plus']}), [self.sat_half])
+        self.assertEqual(self.filtered({'time': ['evening']}), [self.wed_evening_3k])
+        self.assertEqual(self.filtered({'spaces': ['yes'], 'day': ['sat']}), [self.sat_half])
+        self.assertEqual(self.filtered({}, date_from=date(2025, 12, 7), date_to=date(2025, 12, 10)),
+                         [self.sun_morning_10k, self.wed_evening_3k])
+
+    def test_counts_ignore_their_own_facet(self):
+        """Test that a facet's counts apply every filter except its own."""
+        counts = self.counts({'day': ['sat']})
+        # Day counts are unaffected by the day selection...
+        self.assertEqual(counts['day']['sat'], 2)
+        self.assertEqual(counts['day']['sun'], 1)
+        self.assertEqual(counts['day']['wed'], 1)
+        # ...but the other facets count Saturday runs only.
+        self.assertEqual(counts['distance'], {'under-5': 0, '5-10': 1, '10-21': 0, 'half-plus': 1})
+        self.assertEqual(counts['spaces'], {'yes': 1})
+        self.assertEqual(counts['time'], {'morning': 2, 'afternoon': 0, 'evening': 0})
+
+    def test_counts_use_one_query_per_selected_facet(self):
+        """Test that facet counts are computed by a bounded number of aggregate queries."""
+        with self.assertNumQueries(1):
+            self.counts({})
+        with self.assertNumQueries(3):
+            self.counts({'day': ['sat'], 'time': ['morning']})
+
+    def test_query_plans_use_composite_indexes(self):
+        """Test that ordering, date ranges, distance bands and venue lookups are index-driven."""
+        self.assertIn('USING INDEX run_date_time_idx', Run.objects.all().explain())
+        self.assertIn(
+            'USING INDEX run_date_time_idx',
+            self.filtered_queryset({}, date_from=date(2025, 12, 1)).explain(),
+        )
+        self.assertIn('USING INDEX run_length_date_idx', self.filtered_queryset({'distance': ['5-10']}).explain())
+        self.assertIn(
+            'USING INDEX run_location_date_idx',
+            Run.objects.filter(location_id=1, date__gte=date(2025, 12, 1)).explain(),
+        )
+
+    def test_annotated_runs_keep_date_order(self):
+        """Test that sign-up count annotation does not lose the default ordering."""
+        early = Run.objects.create(
+            date=date(2025, 12, 1), time=time(7, 0), meeting_place='Gate',
+            venue='Early', length_km=4.0, max_capacity=10,
+        )
+        self.assertEqual(list(Run.objects.with_signup_counts())[0], early)
+        self.assertEqual(self.filtered({'distance': ['under-5']}), [early, self.wed_evening_3k])
+
+    def filtered_queryset(self, selected, **dates):
+        return facets.filter_runs(Run.objects.with_signup_counts(), selected, **dates)
+
+    def test_run_list_shows_facets(self):
+        """Test the facet filters on the run list."""
+        response = self.client.get(reverse('run_list'), {'day': 'sat', 'spaces': 'yes'})
+        self.assertContains(response, 'Riverside')
+        self.assertNotContains(response, 'Stadium')
+        self.assertContains(response, 'value="sat" id="facet-day-sat" checked')
+
+    def test_filter_api(self):
+        """Test the JSON filter API."""
+        response = self.client.get(reverse('run_filter_api'), {'distance': ['under-5', '5-10']})
+        data = response.json()
+        self.assertEqual([run['venue'] for run in data['runs']], ['Park', 'Stadium'])
+        days = {c['value']: c['count'] for c in data['facets']['day']}
+        self.assertEqual(days['sat'], 1)
+
+        response = self.client.get(reverse('run_filter_api'), {'day': 'someday'})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get(reverse('run_filter_api'), {'date_from': '2025-12-10', 'date_to': '2025-12-01'})
+        self.assertEqual(response.status_code, 400)
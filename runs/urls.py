@@ -1,9 +1,30 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
+if settings.ASYNC_VIEWS:
+    run_list, run_signup, run_cancel = views.arun_list, views.arun_signup, views.arun_cancel
+else:
+    run_list, run_signup, run_cancel = views.run_list, views.run_signup, views.run_cancel
+
 urlpatterns = [
-    path('', views.run_list, name='run_list'),
-    path('signup/<int:run_id>/', views.run_signup, name='run_signup'),
-    path('cancel/<int:run_id>/', views.run_cancel, name='run_cancel'),
+    path('', run_list, name='run_list'),
+    path('signup/<int:run_id>/', run_signup, name='run_signup'),
+    path('cancel/<int:run_id>/', run_cancel, name='run_cancel'),
+    path('notify/<int:run_id>/', views.run_notify, name='run_notify'),
+    path('waiting/<int:run_id>/', views.waiting_room_view, name='waiting_room'),
+    path('api/waiting/<int:run_id>/', views.waiting_room_status, name='waiting_room_status'),
+    path('history/', views.run_history, name='run_history'),
+    path('roster/<int:run_id>/', views.run_roster, name='run_roster'),
+    path('rosters/', views.roster_list, name='roster_list'),
+    path('group-signup/<int:run_id>/', views.run_group_signup, name='run_group_signup'),
     path('register/', views.register, name='register'),
+    path('api/runs/', views.run_filter_api, name='run_filter_api'),
+    path('api/runs/near/', views.runs_near, name='runs_near'),
+    path('api/runs/<int:run_id>/timeline/', views.run_timeline, name='run_timeline'),
+    path('api/runs/<int:run_id>/signups/', views.run_group_signup_api, name='run_group_signup_api'),
+    path('api/runs/<int:run_id>/hold/', views.run_hold, name='run_hold'),
+    path('api/runs/<int:run_id>/hold/confirm/', views.run_hold_confirm, name='run_hold_confirm'),
+    path('api/actions/batch/', views.run_actions_batch, name='run_actions_batch'),
+    path('sw.js', views.service_worker, name='service_worker'),
 ]
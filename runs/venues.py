@@ -0,0 +1,126 @@
+"""
+Finding upcoming runs near a point.
+
+Venues are bucketed into an in-memory grid of roughly ``CELL_KM`` squares, so
+a radius query only looks at venues in the cells its bounding box overlaps.
+The runs at those venues are then fetched with the bounding box repeated in
+SQL (served by ``venue_bbox_idx``), and exact great-circle distances are
+computed only for what is left.
+
+The grid is per process. It is rebuilt when a venue is saved or deleted in
+this process, and at least every ``INDEX_TTL`` seconds to pick up changes
+made by other processes.
+"""
+import math
+import threading
+import time
+from collections import defaultdict
+
+from django.utils import timezone
+
+from .models import Run, Venue
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE_LAT = 111.32
+
+# Grid cell size. Members search a few km to a few tens of km.
+CELL_KM = 10
+CELL_DEGREES = CELL_KM / KM_PER_DEGREE_LAT
+
+INDEX_TTL = 300
+
+MAX_RADIUS_KM = 200
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Return the great-circle distance between two points in kilometres."""
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = (math.sin((lat2 - lat1) / 2) ** 2
+         + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def bounding_box(lat, lon, radius_km):
+    """Return ``(min_lat, max_lat, min_lon, max_lon)`` enclosing a circle."""
+    dlat = radius_km / KM_PER_DEGREE_LAT
+    # Longitude degrees shrink towards the poles; clamp to avoid dividing by ~0.
+    dlon = radius_km / (KM_PER_DEGREE_LAT * max(math.cos(math.radians(lat)), 0.01))
+    return lat - dlat, lat + dlat, max(lon - dlon, -180.0), min(lon + dlon, 180.0)
+
+
+def _cell(lat, lon):
+    return math.floor(lat / CELL_DEGREES), math.floor(lon / CELL_DEGREES)
+
+
+class VenueGrid:
+    """A uniform grid of venue coordinates for radius queries."""
+
+    def __init__(self, venues):
+        self.cells = defaultdict(list)
+        for pk, lat, lon in venues:
+            self.cells[_cell(lat, lon)].append((pk, lat, lon))
+
+    def candidates(self, min_lat, max_lat, min_lon, max_lon):
+        """Return the IDs of venues in grid cells overlapping a bounding box."""
+        (row_lo, col_lo), (row_hi, col_hi) = _cell(min_lat, min_lon), _cell(max_lat, max_lon)
+        return [
+            pk
+            for row in range(row_lo, row_hi + 1)
+            for col in range(col_lo, col_hi + 1)
+            for pk, lat, lon in self.cells.get((row, col), ())
+        ]
+
+
+_grid = None
+_grid_built_at = 0.0
+_grid_lock = threading.Lock()
+
+
+def invalidate_grid():
+    """Drop this process's venue grid; it is rebuilt on next use."""
+    global _grid
+    _grid = None
+
+
+def venue_grid():
+    """Return this process's venue grid, building it if needed."""
+    global _grid, _grid_built_at
+    with _grid_lock:
+        if _grid is None or time.monotonic() - _grid_built_at > INDEX_TTL:
+            _grid = VenueGrid(
+                Venue.objects.filter(latitude__isnull=False, longitude__isnull=False)
+                .values_list('pk', 'latitude', 'longitude')
+            )
+            _grid_built_at = time.monotonic()
+        return _grid
+
+
+def runs_near(lat, lon, radius_km, limit=20):
+    """
+    Return upcoming runs within ``radius_km`` of a point, nearest first.
+
+    Each run gets a ``distance_km`` attribute and the usual sign-up count
+    annotation.
+    """
+    min_lat, max_lat, min_lon, max_lon = box = bounding_box(lat, lon, radius_km)
+    venue_ids = venue_grid().candidates(*box)
+    if not venue_ids:
+        return []
+
+    runs = (
+        Run.objects.with_signup_counts()
+        .select_related('location')
+        .filter(
+            location_id__in=venue_ids,
+            location__latitude__range=(min_lat, max_lat),
+            location__longitude__range=(min_lon, max_lon),
+            date__gte=timezone.localdate(),
+        )
+    )
+    nearby = []
+    for run in runs:
+        run.distance_km = haversine_km(lat, lon, run.location.latitude, run.location.longitude)
+        if run.distance_km <= radius_km:
+            nearby.append(run)
+    nearby.sort(key=lambda run: (run.distance_km, run.date, run.time))
+    return nearby[:limit]
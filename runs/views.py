@@ -1,47 +1,130 @@
+import asyncio
+import csv
+import hashlib
+import json
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.contrib.staticfiles.storage import staticfiles_storage
 from django.shortcuts import render, redirect, get_object_or_404
-from django.contrib.auth.decorators import login_required
+from django.contrib.auth.decorators import login_required, permission_required
+from django.contrib.auth.views import redirect_to_login
 from django.contrib.auth import login, authenticate
 from django.contrib import messages
-from django.core.exceptions import ValidationError
-from .models import Run, SignUp
-from .forms import RegistrationForm
+from django.utils import timezone
+from django.utils.cache import patch_cache_control
+from django.views.decorators.cache import cache_control
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.views.decorators.http import require_http_methods, require_POST
+from . import archive, conditional, events, facets, member_cache, search, services, stats, venues, waiting_room
+from .models import BallotEntry, Run, SignUp, SpotAlert
+from .forms import GroupSignUpForm, RegistrationForm, RunFilterForm
+from .routers import pin_to_primary, replica_reads
+
 
+def _show_own_holds(runs, holds):
+    """Mark the runs the member holds a place on, and count that place as theirs rather than taken."""
+    for run in runs:
+        run.held_until = holds.get(run.pk)
+        if run.held_until:
+            run.hold_count -= 1
 
+
+@replica_reads
+@conditional.conditional_page(conditional.run_list_validators)
 def run_list(request):
     """View to list all runs."""
-    runs = Run.objects.all()
+    query = request.GET.get('q', '').strip()
+    filter_form = RunFilterForm(request.GET)
+    selected, (date_from, date_to) = filter_form.selected(), filter_form.date_range()
+    matching = search.search_runs(Run.objects.with_signup_counts(), query)
+    runs = list(facets.filter_runs(matching, selected, date_from, date_to))
+    facet_choices = facets.facet_counts(matching, selected, date_from, date_to)
     user_signups = []
+    user_ballot_entries = []
     
     if request.user.is_authenticated:
-        user_signups = SignUp.objects.filter(user=request.user).values_list('run_id', flat=True)
+        user_signups = member_cache.signup_run_ids(request.user)
+        if any(run.allocation == Run.BALLOT for run in runs):
+            user_ballot_entries = BallotEntry.objects.filter(user=request.user).values_list('run_id', flat=True)
+        if any(run.hold_count for run in runs):
+            _show_own_holds(runs, dict(services.held_places(request.user)))
     
-    return render(request, 'runs/run_list.html', {
+    response = render(request, 'runs/run_list.html', {
         'runs': runs,
         'user_signups': list(user_signups),
+        'user_ballot_entries': list(user_ballot_entries),
+        'query': query,
+        'filter_form': filter_form,
+        'facets': facet_choices,
     })
+    if messages.get_messages(request):
+        # Flash messages are one-off; keep the service worker from caching them.
+        patch_cache_control(response, no_store=True)
+    return response
+
+
+def _signup_message(request, run, status):
+    """Report the outcome of a sign-up to the member."""
+    if status == services.ALREADY_SIGNED_UP:
+        messages.warning(request, 'You are already signed up for this run.')
+    elif status == services.RUN_FULL:
+        messages.error(request, 'This run is full. No more sign-ups allowed.')
+    elif status == services.BALLOT_ENTERED:
+        messages.success(request, f'You are in the ballot for {run.venue} on {run.date}. Places are drawn when it closes.')
+    elif status == services.ALREADY_ENTERED:
+        messages.warning(request, 'You have already entered the ballot for this run.')
+    elif status == services.BALLOT_CLOSED:
+        messages.error(request, 'The ballot for this run has closed.')
+    elif status == services.NOT_OPEN:
+        messages.info(request, f'Sign-ups for {run.venue} on {run.date} have not opened yet.')
+    else:
+        pin_to_primary(request)
+        messages.success(request, f'Successfully signed up for {run.venue} on {run.date}!')
+
+
+def _cancel_message(request, run, status):
+    """Report the outcome of a cancellation to the member."""
+    if status == services.CANCELLED:
+        pin_to_primary(request)
+        messages.success(request, f'Successfully cancelled your sign-up for {run.venue} on {run.date}.')
+    elif status == services.BALLOT_WITHDRAWN:
+        messages.success(request, f'You have withdrawn from the ballot for {run.venue} on {run.date}.')
+    else:
+        messages.warning(request, 'You were not signed up for this run.')
+
+
+def _held_in_waiting_room(request, run_id):
+    """Check whether the run's waiting room is queueing and this member's turn hasn't come."""
+    room = waiting_room.get_room(run_id)
+    return waiting_room.is_active(room) and not waiting_room.is_admitted(
+        room, waiting_room.position(request, room, run_id)
+    )
+
+
+def _report_full(run_id, status):
+    if status == services.RUN_FULL:
+        waiting_room.mark_full(run_id)
 
 
 @login_required
 def run_signup(request, run_id):
     """View to sign up for a run."""
+    if _held_in_waiting_room(request, run_id):
+        return redirect('waiting_room', run_id=run_id)
     run = get_object_or_404(Run, pk=run_id)
-    
-    # Check if user is already signed up
-    if SignUp.objects.filter(user=request.user, run=run).exists():
-        messages.warning(request, 'You are already signed up for this run.')
-        return redirect('run_list')
-    
-    # Check if run is full
-    if run.is_full():
-        messages.error(request, 'This run is full. No more sign-ups allowed.')
-        return redirect('run_list')
-    
-    try:
-        SignUp.objects.create(user=request.user, run=run)
-        messages.success(request, f'Successfully signed up for {run.venue} on {run.date}!')
-    except ValidationError as e:
-        messages.error(request, str(e))
-    
+
+    status = services.sign_up(request.user, run)
+    _report_full(run_id, status)
+    _signup_message(request, run, status)
+
     return redirect('run_list')
 
 
@@ -50,16 +133,504 @@ def run_cancel(request, run_id):
     """View to cancel a sign-up for a run."""
     run = get_object_or_404(Run, pk=run_id)
 
+    status = services.cancel(request.user, run)
+    _cancel_message(request, run, status)
+
+    return redirect('run_list')
+
+
+@login_required
+@require_POST
+def run_notify(request, run_id):
+    """View to ask to be emailed when a place opens up on a full run."""
+    run = get_object_or_404(Run, pk=run_id)
+
+    if SignUp.objects.filter(user=request.user, run=run).exists():
+        messages.warning(request, 'You are already signed up for this run.')
+    elif run.ballot_pending() or not run.is_full():
+        messages.info(request, 'This run has places available - sign up now!')
+    else:
+        SpotAlert.objects.get_or_create(user=request.user, run=run)
+        messages.success(request, f"We'll email you if a place opens up for {run.venue} on {run.date}.")
+
+    return redirect('run_list')
+
+
+# Async versions of the run views, routed instead of the sync ones when
+# ASYNC_VIEWS is on (the default under mrc_runs/asgi.py). Django 4.2 has no
+# request.auser() and login_required is sync-only, so the lazy request.user
+# is resolved off the event loop first.
+
+async def _aresolve_user(request):
+    """Load ``request.user`` without blocking the event loop."""
+    await sync_to_async(lambda: request.user.is_authenticated)()
+    return request.user
+
+
+async def _aget_run_or_404(run_id):
     try:
-        signup = SignUp.objects.get(user=request.user, run=run)
-        signup.delete()
-        messages.success(request, f'Successfully cancelled your sign-up for {run.venue} on {run.date}.')
-    except SignUp.DoesNotExist:
-        messages.warning(request, 'You were not signed up for this run.')
+        return await Run.objects.aget(pk=run_id)
+    except Run.DoesNotExist:
+        raise Http404('No Run matches the given query.')
+
+
+@replica_reads
+@conditional.conditional_page(conditional.run_list_validators)
+async def arun_list(request):
+    """Async version of ``run_list``."""
+    user = await _aresolve_user(request)
+    query = request.GET.get('q', '').strip()
+    filter_form = RunFilterForm(request.GET)
+    selected, (date_from, date_to) = filter_form.selected(), filter_form.date_range()
+    matching = search.search_runs(Run.objects.with_signup_counts(), query)
+
+    async def load_runs():
+        return [run async for run in facets.filter_runs(matching, selected, date_from, date_to)]
+
+    async def load_user_signups():
+        if not user.is_authenticated:
+            return []
+        if hasattr(user, 'signup_run_ids'):
+            # Loaded with the cached member bundle.
+            return user.signup_run_ids
+        return [run_id async for run_id in SignUp.objects.filter(user=user).values_list('run_id', flat=True)]
+
+    runs, user_signups, facet_choices = await asyncio.gather(
+        load_runs(), load_user_signups(), facets.afacet_counts(matching, selected, date_from, date_to),
+    )
+    user_ballot_entries = []
+    if user.is_authenticated and any(run.allocation == Run.BALLOT for run in runs):
+        user_ballot_entries = [
+            run_id async for run_id in BallotEntry.objects.filter(user=user).values_list('run_id', flat=True)
+        ]
+    if user.is_authenticated and any(run.hold_count for run in runs):
+        _show_own_holds(runs, {run_id: expires_at async for run_id, expires_at in services.held_places(user)})
+
+    response = render(request, 'runs/run_list.html', {
+        'runs': runs,
+        'user_signups': user_signups,
+        'user_ballot_entries': user_ballot_entries,
+        'query': query,
+        'filter_form': filter_form,
+        'facets': facet_choices,
+    })
+    if messages.get_messages(request):
+        patch_cache_control(response, no_store=True)
+    return response
+
+
+async def arun_signup(request, run_id):
+    """Async version of ``run_signup``."""
+    user = await _aresolve_user(request)
+    if not user.is_authenticated:
+        return redirect_to_login(request.get_full_path())
+
+    if await sync_to_async(_held_in_waiting_room)(request, run_id):
+        return redirect('waiting_room', run_id=run_id)
+    run = await _aget_run_or_404(run_id)
+    status = await services.asign_up(user, run)
+    await sync_to_async(_report_full)(run_id, status)
+    _signup_message(request, run, status)
+
+    return redirect('run_list')
+
+
+async def arun_cancel(request, run_id):
+    """Async version of ``run_cancel``."""
+    user = await _aresolve_user(request)
+    if not user.is_authenticated:
+        return redirect_to_login(request.get_full_path())
+
+    run = await _aget_run_or_404(run_id)
+    status = await services.acancel(user, run)
+    _cancel_message(request, run, status)
 
     return redirect('run_list')
 
 
+@replica_reads
+def run_filter_api(request):
+    """
+    Return the runs matching the facet filters as JSON, with per-facet counts.
+
+    Takes the same parameters as the run list: ``q``, ``date_from``,
+    ``date_to`` and repeatable ``distance``, ``day``, ``time`` and ``spaces``.
+    """
+    filter_form = RunFilterForm(request.GET)
+    if not filter_form.is_valid():
+        return JsonResponse({'errors': filter_form.errors}, status=400)
+    selected, (date_from, date_to) = filter_form.selected(), filter_form.date_range()
+    matching = search.search_runs(Run.objects.with_signup_counts(), request.GET.get('q', '').strip())
+
+    return JsonResponse({
+        'runs': [
+            {
+                'id': run.id,
+                'date': run.date,
+                'time': run.time,
+                'venue': run.venue,
+                'meeting_place': run.meeting_place,
+                'length_km': run.length_km,
+                'available_spots': run.available_spots(),
+            }
+            for run in facets.filter_runs(matching, selected, date_from, date_to)
+        ],
+        'facets': facets.facet_counts(matching, selected, date_from, date_to),
+    })
+
+
+@replica_reads
+def runs_near(request):
+    """
+    Return upcoming runs near ``?lat=&lon=`` as JSON, nearest first.
+
+    ``radius`` (km, default 10) and ``limit`` (default 20) are optional.
+    """
+    try:
+        lat = float(request.GET['lat'])
+        lon = float(request.GET['lon'])
+        radius = float(request.GET.get('radius', 10))
+        limit = int(request.GET.get('limit', 20))
+    except (KeyError, ValueError):
+        return JsonResponse({'error': 'Expected numeric "lat" and "lon" parameters.'}, status=400)
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        return JsonResponse({'error': '"lat" or "lon" is out of range.'}, status=400)
+    if not 0 < radius <= venues.MAX_RADIUS_KM or not 0 < limit <= 100:
+        return JsonResponse(
+            {'error': f'"radius" must be up to {venues.MAX_RADIUS_KM} km and "limit" up to 100.'}, status=400
+        )
+
+    return JsonResponse({'runs': [
+        {
+            'id': run.id,
+            'date': run.date,
+            'time': run.time,
+            'venue': run.venue,
+            'meeting_place': run.meeting_place,
+            'length_km': run.length_km,
+            'distance_km': round(run.distance_km, 1),
+            'available_spots': run.available_spots(),
+            'signup_url': reverse('run_signup', args=[run.id]),
+        }
+        for run in venues.runs_near(lat, lon, radius, limit)
+    ]})
+
+
+# Upper bound on queued actions applied per batch request.
+MAX_BATCH_ACTIONS = 50
+
+BATCH_ACTIONS = {
+    'signup': services.sign_up,
+    'cancel': services.cancel,
+}
+
+
+@require_POST
+def run_actions_batch(request):
+    """
+    Apply a batch of queued sign-up/cancel actions in one transaction.
+
+    Used by the service worker to replay actions made while offline. Expects
+    ``{"actions": [{"id": ..., "action": "signup"|"cancel", "run_id": ...}]}``
+    and returns ``{"results": [{"id": ..., "status": ...}]}`` in the same
+    order. Each action runs in its own savepoint, so one failure does not undo
+    the others.
+    """
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Authentication required.'}, status=401)
+
+    try:
+        actions = json.loads(request.body)['actions']
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({'error': 'Expected a JSON object with an "actions" list.'}, status=400)
+    if not isinstance(actions, list) or len(actions) > MAX_BATCH_ACTIONS:
+        return JsonResponse(
+            {'error': f'"actions" must be a list of at most {MAX_BATCH_ACTIONS} items.'}, status=400
+        )
+
+    run_ids = {a.get('run_id') for a in actions if isinstance(a, dict) and isinstance(a.get('run_id'), int)}
+    runs = Run.objects.in_bulk(run_ids)
+
+    results = []
+    with transaction.atomic():
+        for action in actions:
+            if not isinstance(action, dict):
+                results.append({'id': None, 'status': services.INVALID_ACTION})
+                continue
+            handler = BATCH_ACTIONS.get(action.get('action'))
+            run = runs.get(action.get('run_id'))
+            if handler is None:
+                status = services.INVALID_ACTION
+            elif run is None:
+                status = services.RUN_NOT_FOUND
+            elif handler is services.sign_up and _held_in_waiting_room(request, run.pk):
+                status = services.IN_WAITING_ROOM
+            else:
+                try:
+                    with transaction.atomic():
+                        status = handler(request.user, run)
+                except IntegrityError:
+                    status = services.ALREADY_SIGNED_UP
+            results.append({'id': action.get('id'), 'status': status})
+
+    if any(r['status'] in (services.SIGNED_UP, services.CANCELLED) for r in results):
+        pin_to_primary(request)
+    return JsonResponse({'results': results})
+
+
+# How group sign-up results read on the page.
+GROUP_SIGNUP_LABELS = {
+    services.SIGNED_UP: 'Signed up',
+    services.ALREADY_SIGNED_UP: 'Already signed up',
+    services.RUN_FULL: 'No place left',
+    services.MEMBER_NOT_FOUND: 'No such member',
+    services.RUN_NOT_FOUND: 'No such run',
+}
+
+
+def _group_sign_up(run_id, identifiers):
+    """Sign members up by ID, username or email; return ``[{'member', 'status'}]`` in order."""
+    identifiers = [str(i).strip() for i in identifiers if str(i).strip()]
+    found = services.find_members(identifiers)
+    statuses = services.bulk_sign_up(run_id, found.values())
+    return [
+        {'member': i, 'status': statuses[found[i]] if i in found else services.MEMBER_NOT_FOUND}
+        for i in identifiers
+    ]
+
+
+@login_required
+@permission_required('runs.add_signup', raise_exception=True)
+def run_group_signup(request, run_id):
+    """Page for coaches to sign a training group up for a run in one go."""
+    run = get_object_or_404(Run.objects.with_signup_counts(), pk=run_id)
+    results = None
+    form = GroupSignUpForm(request.POST or None)
+    if form.is_valid():
+        results = _group_sign_up(run.pk, form.cleaned_data['members'])
+        for result in results:
+            result['label'] = GROUP_SIGNUP_LABELS.get(result['status'], result['status'])
+        if any(result['status'] == services.SIGNED_UP for result in results):
+            pin_to_primary(request)
+        run = Run.objects.with_signup_counts().get(pk=run.pk)
+    return render(request, 'runs/group_signup.html', {'run': run, 'form': form, 'results': results})
+
+
+@require_POST
+def run_group_signup_api(request, run_id):
+    """
+    Sign a group of members up for a run, for coaches and admins.
+
+    Expects ``{"members": [...]}`` of member IDs, usernames or email
+    addresses and returns ``{"results": [{"member": ..., "status": ...}]}``
+    in the same order. Places go to members in that order until the run is
+    full; one capacity check covers the whole group.
+    """
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Authentication required.'}, status=401)
+    if not request.user.has_perm('runs.add_signup'):
+        return JsonResponse({'error': 'Permission denied.'}, status=403)
+
+    try:
+        members = json.loads(request.body)['members']
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({'error': 'Expected a JSON object with a "members" list.'}, status=400)
+    if not isinstance(members, list) or len(members) > GroupSignUpForm.MAX_MEMBERS:
+        return JsonResponse(
+            {'error': f'"members" must be a list of at most {GroupSignUpForm.MAX_MEMBERS} items.'}, status=400
+        )
+
+    results = _group_sign_up(run_id, members)
+    if any(r['status'] == services.SIGNED_UP for r in results):
+        pin_to_primary(request)
+    return JsonResponse({'results': results})
+
+
+@require_http_methods(['POST', 'DELETE'])
+def run_hold(request, run_id):
+    """
+    Hold a place on a run while the member confirms (POST), or give it back (DELETE).
+
+    Returns ``{"status": ..., "expires_at": ...}``; ``expires_at`` is set
+    only while a place is held. Holding again extends the hold.
+    """
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Authentication required.'}, status=401)
+    run = Run.objects.filter(pk=run_id).first()
+    if run is None:
+        return JsonResponse({'status': services.RUN_NOT_FOUND, 'expires_at': None}, status=404)
+
+    expires_at = None
+    if request.method == 'DELETE':
+        status = services.release_hold(request.user, run)
+    elif _held_in_waiting_room(request, run_id):
+        status = services.IN_WAITING_ROOM
+    else:
+        status, expires_at = services.hold_spot(request.user, run)
+        _report_full(run_id, status)
+    return JsonResponse({'status': status, 'expires_at': expires_at})
+
+
+@require_POST
+def run_hold_confirm(request, run_id):
+    """Turn the member's held place into a sign-up; returns ``{"status": ...}``."""
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Authentication required.'}, status=401)
+    run = Run.objects.filter(pk=run_id).first()
+    if run is None:
+        return JsonResponse({'status': services.RUN_NOT_FOUND}, status=404)
+
+    status = services.confirm_hold(request.user, run)
+    _report_full(run_id, status)
+    if status == services.SIGNED_UP:
+        pin_to_primary(request)
+    return JsonResponse({'status': status})
+
+
+@login_required
+def waiting_room_view(request, run_id):
+    """Queue page for a run whose sign-ups open at a set time; polls until the member's turn."""
+    room = waiting_room.get_room(run_id)
+    if not waiting_room.is_active(room):
+        return redirect('run_signup', run_id=run_id)
+    position, token = waiting_room.join(request, room, run_id)
+    if waiting_room.is_admitted(room, position):
+        response = redirect('run_signup', run_id=run_id)
+    else:
+        response = render(request, 'runs/waiting_room.html', {
+            'room': room,
+            'run_id': run_id,
+            'status': waiting_room.status(room, run_id, position),
+        })
+    if token:
+        waiting_room.set_token(response, room, run_id, token)
+    patch_cache_control(response, no_store=True)
+    return response
+
+
+def waiting_room_status(request, run_id):
+    """
+    Return the member's place in a run's waiting room as JSON.
+
+    Polled by the waiting room page; answered from the queue token cookie
+    and the cache without touching the database.
+    """
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Authentication required.'}, status=401)
+    room = waiting_room.get_room(run_id)
+    if not waiting_room.is_active(room):
+        # The rush is over (or there never was a room): go straight to sign-up.
+        response = JsonResponse({'admitted': True, 'full': False})
+    else:
+        position = waiting_room.position(request, room, run_id)
+        if position is None:
+            return JsonResponse({'error': 'Not in the queue for this run.'}, status=400)
+        response = JsonResponse(waiting_room.status(room, run_id, position))
+    patch_cache_control(response, no_store=True)
+    return response
+
+
+# Rows of past runs shown on My Runs; the CSV export has the full history.
+HISTORY_PAGE_ROWS = 50
+
+
+@login_required
+@replica_reads
+def run_history(request):
+    """View showing the member's stats, upcoming runs and run history, including archived runs."""
+    history = archive.member_history(request.user)
+
+    if request.GET.get('format') == 'csv':
+        response = HttpResponse(content_type='text/csv')
+        response['Content-Disposition'] = 'attachment; filename="mrc-run-history.csv"'
+        writer = csv.writer(response)
+        writer.writerow(['Date', 'Time', 'Venue', 'Meeting place', 'Distance (km)', 'Signed up', 'Attended'])
+        for row in history:
+            writer.writerow([
+                row['run__date'], row['run__time'], row['run__venue'], row['run__meeting_place'],
+                row['run__length_km'], row['signed_up_at'].isoformat(), 'yes' if row['attended'] else 'no',
+            ])
+        return response
+
+    today = timezone.localdate()
+    upcoming = (
+        SignUp.objects.filter(user=request.user, run__date__gte=today)
+        .select_related('run').order_by('run__date', 'run__time')
+    )
+    return render(request, 'runs/run_history.html', {
+        'history': archive.member_history(request.user, before=today)[:HISTORY_PAGE_ROWS],
+        'history_rows': HISTORY_PAGE_ROWS,
+        'upcoming': upcoming,
+        'stats': stats.get_stats(request.user),
+    })
+
+
+# Rosters are keyed on Run.updated_at, so a stale one is never served; the
+# timeout only bounds how long superseded copies linger.
+ROSTER_CACHE_TIMEOUT = 60 * 60 * 24
+
+# How far ahead the rosters page lists (and the service worker precaches) runs.
+ROSTER_DAYS = 7
+
+
+@login_required
+@permission_required('runs.view_roster', raise_exception=True)
+@conditional.conditional_page(conditional.roster_validators)
+def run_roster(request, run_id):
+    """Printable roster of a run's sign-ups and emergency contacts, for run leaders."""
+    run = get_object_or_404(Run, pk=run_id)
+    key = f'runs:roster:{run.pk}:{run.updated_at.timestamp()}'
+    html = cache.get(key)
+    if html is None:
+        signups = (
+            SignUp.objects.filter(run=run)
+            .select_related('user__profile')
+            .order_by('user__first_name', 'user__last_name', 'user__username')
+        )
+        html = render_to_string('runs/run_roster.html', {
+            'run': run,
+            'signups': signups,
+            'generated_at': timezone.now(),
+        })
+        cache.set(key, html, ROSTER_CACHE_TIMEOUT)
+    response = HttpResponse(html)
+    # Personal data: only the leader's own browser (and service worker) may keep it.
+    patch_cache_control(response, private=True)
+    return response
+
+
+@login_required
+@permission_required('runs.view_roster', raise_exception=True)
+def roster_list(request):
+    """View listing the coming week's runs for leaders, whose rosters are saved for offline use."""
+    today = timezone.localdate()
+    runs = list(
+        Run.objects.with_signup_counts()
+        .filter(date__gte=today, date__lte=today + timedelta(days=ROSTER_DAYS))
+    )
+    response = render(request, 'runs/roster_list.html', {
+        'runs': runs,
+        'roster_urls': [reverse('run_roster', args=[run.pk]) for run in runs],
+        'roster_days': ROSTER_DAYS,
+    })
+    patch_cache_control(response, private=True)
+    return response
+
+
+@login_required
+@permission_required('runs.view_signupevent', raise_exception=True)
+def run_timeline(request, run_id):
+    """
+    Stream a run's sign-up count over time as JSON, replayed from the event log.
+
+    Works for live, archived and deleted runs alike; see ``events.timeline``
+    for the shape of each point.
+    """
+    response = StreamingHttpResponse(events.timeline_json(run_id), content_type='application/json')
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
 def register(request):
     """View for user registration."""
     if request.user.is_authenticated:
@@ -85,3 +656,43 @@ def register(request):
         form = RegistrationForm()
 
     return render(request, 'registration/register.html', {'form': form})
+
+
+# Fingerprinted assets every page needs; precached by the service worker.
+PRECACHE_ASSETS = [
+    'vendor/bootstrap/bootstrap.min.css',
+    'vendor/bootstrap/bootstrap.bundle.min.js',
+    'css/site.css',
+    'icons/icons.svg',
+    'manifest.json',
+]
+
+
+def _asset_version():
+    """Return a version string that changes whenever the static assets do."""
+    manifest_hash = getattr(staticfiles_storage, 'manifest_hash', '')
+    if manifest_hash:
+        return manifest_hash
+    # Development storage has no manifest; hash the precached files instead.
+    digest = hashlib.md5(usedforsecurity=False)
+    for name in PRECACHE_ASSETS:
+        path = finders.find(name)
+        if path:
+            with open(path, 'rb') as f:
+                digest.update(f.read())
+    return digest.hexdigest()[:12]
+
+
+@cache_control(no_cache=True)
+def service_worker(request):
+    """Serve the service worker from the site root so its scope covers every page."""
+    response = render(request, 'runs/sw.js', {
+        'version': _asset_version(),
+        'static_prefix': '/' + settings.STATIC_URL.lstrip('/'),
+        'precache_urls': [staticfiles_storage.url(name) for name in PRECACHE_ASSETS],
+        'batch_url': reverse('run_actions_batch'),
+        'batch_size': MAX_BATCH_ACTIONS,
+    }, content_type='application/javascript')
+    response['Service-Worker-Allowed'] = '/'
+    return response
+
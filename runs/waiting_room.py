@@ -0,0 +1,168 @@
+"""
+Virtual waiting room for runs whose sign-ups open at a set time.
+
+From before ``Run.opens_at`` until ``ROOM_OPEN_FOR`` after it, ``run_signup``
+only lets through members holding an admitted queue token. Everyone else is
+sent to the waiting room page, which issues a token and polls
+``waiting_room_status`` until it is their turn.
+
+- Tokens are signed ``(run, user, opening time, position)`` tuples kept in
+  a cookie per run, so joining never writes the session (and with it the
+  database). Positions come from ``cache.incr``, in arrival order.
+  Reloading keeps the token already held, so refreshing never loses a
+  member their place. Tokens and the position counter both last until the
+  room closes, however early a member joins, and a new opening time starts
+  a fresh queue.
+- Position ``p`` is admitted ``(p - 1) / admission_rate`` seconds after
+  opening. Admission is plain arithmetic: no shared state to update, and
+  only the admitted reach the database.
+- The room's settings are cached, so polling and turning away early
+  arrivals never touch the database either.
+
+Positions must be shared between server processes, so multi-process
+deployments need a shared cache (see ``REDIS_URL``).
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.utils import timezone
+
+from .models import Run
+
+# How long after opening the room keeps queueing; after that sign-ups are direct.
+ROOM_OPEN_FOR = timedelta(minutes=30)
+
+ROOM_CACHE_TIMEOUT = 60
+TOKEN_SALT = 'runs.waiting_room'
+TOKEN_COOKIE_PREFIX = 'waiting_room_'
+
+# How long a "run is full" report is shown to the queue before re-checking.
+FULL_TIMEOUT = 30
+
+
+def _room_key(run_id):
+    return f'runs:waiting-room:{run_id}'
+
+
+def get_room(run_id):
+    """
+    Return the room settings of a run with an opening time, or None.
+
+    Served from the cache, with the run details the waiting room page shows:
+    ``{'opens_at', 'rate', 'venue', 'date', 'time'}``.
+    """
+    key = _room_key(run_id)
+    room = cache.get(key)
+    if room is None:
+        row = (
+            Run.objects.filter(pk=run_id, opens_at__isnull=False)
+            .values('opens_at', 'admission_rate', 'venue', 'date', 'time').first()
+        )
+        if row:
+            row['rate'] = max(row.pop('admission_rate'), 1)
+        # Cache runs without a room too (as False), so they cost nothing either.
+        room = row or False
+        cache.set(key, room, ROOM_CACHE_TIMEOUT)
+    return room or None
+
+
+def forget(run_id):
+    """Drop a run's cached room settings and full flag, e.g. after it is edited."""
+    cache.delete_many([_room_key(run_id), f'{_room_key(run_id)}:full'])
+
+
+def closes_at(room):
+    """Return when sign-ups for this room stop going through the queue."""
+    return room['opens_at'] + ROOM_OPEN_FOR
+
+
+def is_active(room, now=None):
+    """Check whether sign-ups for this room still go through the queue."""
+    return room is not None and (now or timezone.now()) < closes_at(room)
+
+
+def admitted_at(room, position):
+    """Return when the member at ``position`` (from 1) is let through."""
+    return room['opens_at'] + timedelta(seconds=(position - 1) / room['rate'])
+
+
+def _seconds_left(room, now=None):
+    return max(0, int((closes_at(room) - (now or timezone.now())).total_seconds()))
+
+
+def _issue(room, run_id, user_id):
+    opens_at = room['opens_at'].timestamp()
+    # One counter per opening time. It lasts until the room closes (plus the
+    # time its cached settings may linger), so positions are never reused.
+    counter = f'{_room_key(run_id)}:issued:{opens_at}'
+    cache.add(counter, 0, timeout=_seconds_left(room) + ROOM_CACHE_TIMEOUT)
+    position = cache.incr(counter)
+    return signing.dumps([run_id, user_id, opens_at, position], salt=TOKEN_SALT, compress=True)
+
+
+def _position(token, room, run_id, user_id):
+    # No max_age: a token is good for as long as its room is open, and is
+    # bound to the opening time it was issued for.
+    try:
+        token_run, token_user, opens_at, position = signing.loads(token, salt=TOKEN_SALT)
+    except (signing.BadSignature, TypeError, ValueError):
+        return None
+    if (token_run, token_user, opens_at) != (run_id, user_id, room['opens_at'].timestamp()):
+        return None
+    return position
+
+
+def position(request, room, run_id):
+    """Return the member's queue position for a run from their token cookie, or None."""
+    token = request.COOKIES.get(f'{TOKEN_COOKIE_PREFIX}{run_id}')
+    return _position(token, room, run_id, request.user.pk) if token else None
+
+
+def join(request, room, run_id):
+    """
+    Give the member a place in the queue, keeping any they already hold.
+
+    Returns ``(position, token)``; ``token`` is None unless a new one was
+    issued, which ``set_token`` must then put on the response.
+    """
+    current = position(request, room, run_id)
+    if current is not None:
+        return current, None
+    token = _issue(room, run_id, request.user.pk)
+    return _position(token, room, run_id, request.user.pk), token
+
+
+def set_token(response, room, run_id, token):
+    """Keep a newly issued queue token in a cookie until the room closes."""
+    response.set_cookie(
+        f'{TOKEN_COOKIE_PREFIX}{run_id}', token, max_age=_seconds_left(room),
+        secure=settings.SESSION_COOKIE_SECURE, httponly=True, samesite='Lax',
+    )
+
+
+def is_admitted(room, position, now=None):
+    """Check whether the member at ``position`` may go through to sign up."""
+    return position is not None and (now or timezone.now()) >= admitted_at(room, position)
+
+
+def mark_full(run_id):
+    """Tell the queue the run has filled, so waiting members stop polling."""
+    cache.set(f'{_room_key(run_id)}:full', True, FULL_TIMEOUT)
+
+
+def status(room, run_id, position, now=None):
+    """Return the member's place in the queue as a JSON-ready dict."""
+    now = now or timezone.now()
+    wait = max(0.0, (admitted_at(room, position) - now).total_seconds())
+    elapsed = (now - room['opens_at']).total_seconds()
+    let_through = int(elapsed * room['rate']) + 1 if elapsed >= 0 else 0
+    return {
+        'position': position,
+        'ahead': max(0, position - 1 - let_through),
+        'admitted': wait == 0,
+        'wait_seconds': round(wait),
+        'opens_at': room['opens_at'].isoformat(),
+        'full': bool(cache.get(f'{_room_key(run_id)}:full')),
+    }
@@ -0,0 +1,53 @@
+"""
+Boot-time warm-up for scale-to-zero deployments.
+
+With ``MRC_FAST_START=1``, ``mrc_runs/wsgi.py`` and ``mrc_runs/asgi.py`` call
+``warm_up`` as each worker starts, so the first member after an idle period
+doesn't pay for importing the URLconf and views, compiling templates,
+reading the static files manifest or opening a database connection.
+
+The database connection is only worth opening when ``CONN_MAX_AGE`` keeps it
+past the first request, and it belongs to the thread that opened it, so it
+helps sync WSGI workers only. Don't combine it with ``gunicorn --preload``:
+workers forked from the master would share its connection.
+"""
+import time
+
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.db import connections
+from django.template.loader import get_template
+from django.urls import reverse
+
+# Templates behind the pages members land on first, parents and includes too.
+WARM_TEMPLATES = [
+    'runs/base.html',
+    'runs/run_list.html',
+    'runs/includes/facet.html',
+    'registration/login.html',
+]
+
+
+def warm_up(database=True):
+    """
+    Load and cache everything the first request would otherwise pay for.
+
+    Returns how long each step took, in ms, keyed by step.
+    """
+    timings = {}
+
+    def step(name, func):
+        start = time.perf_counter()
+        func()
+        timings[name] = (time.perf_counter() - start) * 1000
+
+    # Imports the URLconf and every view module, and builds the reverse lookup.
+    step('urls', lambda: reverse('run_list'))
+    step('templates', lambda: [get_template(name) for name in WARM_TEMPLATES])
+    # The manifest is read when the storage is first used.
+    step('static', lambda: staticfiles_storage.base_url)
+    if database:
+        step('database', lambda: [
+            connection.ensure_connection() for connection in connections.all()
+            if connection.settings_dict['CONN_MAX_AGE']
+        ])
+    return timings